@@ -0,0 +1,156 @@
+"""
+In-memory stand-in for a boto3 DynamoDB ``Table``.
+
+It implements just the calls the functions make, with the same request and
+response shapes. Each call sleeps for ``latency`` seconds to simulate the
+network round trip to DynamoDB Local. The sleep happens outside the lock, so
+concurrent callers overlap the way they would against a real server.
+"""
+
+import copy
+import re
+import threading
+import time
+from decimal import Decimal
+
+from boto3.dynamodb.types import TypeSerializer
+from botocore.exceptions import ClientError
+
+_serializer = TypeSerializer()
+
+
+def _condition_failed(operation, item=None):
+    response = {
+        'Error': {
+            'Code': 'ConditionalCheckFailedException',
+            'Message': 'The conditional request failed'
+        }
+    }
+    if item is not None:
+        response['Item'] = {key: _serializer.serialize(value) for key, value in item.items()}
+    return ClientError(response, operation)
+
+
+class FakeTable:
+    def __init__(self, name='url_mappings', latency=0.0, key=('hash',)):
+        self.name = name
+        self.latency = latency
+        self.key = key
+        self.items = {}
+        self.lock = threading.Lock()
+        self.calls = 0
+
+    def _round_trip(self):
+        with self.lock:
+            self.calls += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+    def _key(self, item):
+        return item['hash'] if self.key == ('hash',) else tuple(item[name] for name in self.key)
+
+    def get_item(self, Key, **kwargs):
+        self._round_trip()
+        with self.lock:
+            item = self.items.get(self._key(Key))
+            return {'Item': copy.deepcopy(item)} if item is not None else {}
+
+    def put_item(self, Item, ConditionExpression=None, ReturnValuesOnConditionCheckFailure=None, **kwargs):
+        self._round_trip()
+        item = {key: Decimal(value) if isinstance(value, int) else value for key, value in Item.items()}
+        with self.lock:
+            existing = self.items.get(self._key(Item))
+            if ConditionExpression and ConditionExpression.startswith('attribute_not_exists') and existing is not None:
+                raise _condition_failed(
+                    'PutItem',
+                    existing if ReturnValuesOnConditionCheckFailure == 'ALL_OLD' else None
+                )
+            self.items[self._key(Item)] = item
+        return {}
+
+    def update_item(self, Key, UpdateExpression, ExpressionAttributeValues=None,
+                    ExpressionAttributeNames=None, ConditionExpression=None, ReturnValues=None, **kwargs):
+        """
+        Supports ``SET a = :v``, ``SET a = a + :v``, ``ADD a :v`` and
+        ``REMOVE a`` clauses, and conditions made of ``attribute_exists``,
+        ``attribute_not_exists`` and comparisons joined with ``AND``
+        """
+        self._round_trip()
+        values = ExpressionAttributeValues or {}
+        names = ExpressionAttributeNames or {}
+        actions = _parse_update(UpdateExpression, names, values)
+        with self.lock:
+            item = self.items.get(self._key(Key))
+            if ConditionExpression and not _condition_holds(ConditionExpression, item or {}, names, values):
+                raise _condition_failed('UpdateItem')
+            if item is None:
+                item = dict(Key)
+                self.items[self._key(Key)] = item
+            updated = {}
+            for action, name, value in actions:
+                if action == 'REMOVE':
+                    item.pop(name, None)
+                    continue
+                if action == 'ADD':
+                    value = item.get(name, Decimal(0)) + Decimal(value)
+                elif isinstance(value, tuple):
+                    source, increment = value
+                    value = item.get(source, Decimal(0)) + Decimal(increment)
+                item[name] = value
+                updated[name] = value
+            return {'Attributes': copy.deepcopy(updated)} if ReturnValues == 'UPDATED_NEW' else {}
+
+
+def _name(token, names):
+    return names.get(token, token)
+
+
+def _parse_update(expression, names, values):
+    """Split an update expression into (action, attribute, value) tuples."""
+    actions = []
+    clauses = re.split(r'\b(SET|REMOVE|ADD)\s+', expression.strip())
+    for keyword, body in zip(clauses[1::2], clauses[2::2]):
+        for part in (part.strip() for part in body.split(',')):
+            if not part:
+                continue
+            if keyword == 'REMOVE':
+                actions.append(('REMOVE', _name(part, names), None))
+            elif keyword == 'ADD':
+                name, placeholder = part.split()
+                actions.append(('ADD', _name(name, names), values[placeholder]))
+            else:
+                name, value = (side.strip() for side in part.split('=', 1))
+                match = re.match(r'([#\w]+)\s*\+\s*(:\w+)$', value)
+                if match:
+                    value = (_name(match.group(1), names), values[match.group(2)])
+                else:
+                    value = values[value]
+                actions.append(('SET', _name(name, names), value))
+    return actions
+
+
+_COMPARISONS = {
+    '<': lambda a, b: a < b,
+    '<=': lambda a, b: a <= b,
+    '>': lambda a, b: a > b,
+    '>=': lambda a, b: a >= b,
+    '=': lambda a, b: a == b,
+    '<>': lambda a, b: a != b,
+}
+
+
+def _condition_holds(expression, item, names, values):
+    for term in (term.strip() for term in re.split(r'\s+AND\s+', expression)):
+        match = re.match(r'(attribute_exists|attribute_not_exists)\(\s*([#\w]+)\s*\)$', term)
+        if match:
+            exists = _name(match.group(2), names) in item
+            if exists != (match.group(1) == 'attribute_exists'):
+                return False
+            continue
+        match = re.match(r'([#\w]+)\s*(<=|>=|<>|<|>|=)\s*(:\w+)$', term)
+        if not match:
+            raise ValueError(f'Unsupported condition: {term}')
+        name = _name(match.group(1), names)
+        if name not in item or not _COMPARISONS[match.group(2)](item[name], values[match.group(3)]):
+            return False
+    return True
@@ -0,0 +1,66 @@
+"""
+Helpers shared by the benchmark scripts: locating and loading the function
+handlers from the source tree and swapping in the in-memory table.
+"""
+
+import importlib.util
+import os
+import statistics
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+OPENFAAS_DIR = os.path.join(ROOT, 'openfaas')
+
+
+def load_module(relative_path, name):
+    """Import a file from the repo under a unique module name"""
+    if OPENFAAS_DIR not in sys.path:
+        sys.path.insert(0, OPENFAAS_DIR)
+    path = os.path.join(ROOT, relative_path)
+    spec = importlib.util.spec_from_file_location(name, path)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+def load_handler(function_name):
+    """Import openfaas/<function_name>/handler.py (its directory goes on sys.path for sibling modules)"""
+    function_dir = os.path.join(OPENFAAS_DIR, function_name)
+    if function_dir not in sys.path:
+        sys.path.insert(1, function_dir)
+    return load_module(
+        os.path.join('openfaas', function_name, 'handler.py'),
+        function_name.replace('-', '_') + '_handler'
+    )
+
+
+def install_fake_table(table):
+    """
+    Make common.dynamo hand out ``table`` instead of a real DynamoDB table;
+    the click rollup table gets its own in-memory table with the same latency
+    """
+    if OPENFAAS_DIR not in sys.path:
+        sys.path.insert(0, OPENFAAS_DIR)
+    from common import dynamo
+    from fake_dynamo import FakeTable
+    rollup_table = FakeTable(dynamo.rollup_table_name(), latency=table.latency, key=('hash', 'bucket'))
+    dynamo.get_table = lambda name=None: rollup_table if name == dynamo.rollup_table_name() else table
+    return table
+
+
+def summarize(latencies, elapsed):
+    """req/s and latency percentiles (milliseconds) for one run"""
+    ordered = sorted(latencies)
+
+    def pct(p):
+        return ordered[min(len(ordered) - 1, int(len(ordered) * p))] * 1000
+
+    return {
+        "requests": len(ordered),
+        "req_per_s": len(ordered) / elapsed if elapsed else 0.0,
+        "mean_ms": statistics.fmean(ordered) * 1000 if ordered else 0.0,
+        "p50_ms": pct(0.50) if ordered else 0.0,
+        "p95_ms": pct(0.95) if ordered else 0.0,
+        "p99_ms": pct(0.99) if ordered else 0.0
+    }
@@ -0,0 +1,368 @@
+#!/usr/bin/env python3
+"""
+Offline load test of the whole request path.
+
+Starts shorten-url, redirect-url and qrcode-wrapper (their server.py) and
+redirect-handler.py as separate local processes (see serve.py) against an
+offline store. It then drives each with N concurrent keep-alive clients.
+Link popularity follows a Zipf distribution, so a few hot links take most of
+the traffic, as they do when a link goes viral.
+
+Scenarios:
+    shorten           POST {"url": ...} to shorten-url; a Zipf-popular URL,
+                      or a fresh one for --new-ratio of requests
+    redirect-url      POST <hash> to redirect-url's server.py (expects a redirect)
+    redirect-handler  GET /<hash> on redirect-handler.py, which calls
+                      redirect-url through its /function/redirect-url mount
+    qrcode            GET /?text=<short url> on qrcode-wrapper
+
+For each scenario and concurrency level it reports req/s, mean/p50/p95/p99
+latency, errors, and the RSS (current and peak, from /proc) of every server
+process. Results are saved as JSON with the git commit, so runs can be
+compared across commits:
+
+    python3 benchmarks/load_test.py --concurrency 1,16,64 --requests 5000
+    python3 benchmarks/load_test.py --store sqlite --output after.json --compare before.json
+
+Needs the functions' requirements (flask, boto3, requests, qrcode[pil])
+installed; nothing talks to a real DynamoDB or the network.
+"""
+
+import argparse
+import bisect
+import http.client
+import itertools
+import json
+import os
+import platform
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from harness import ROOT, summarize
+from serve import bench_links, seed_items
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+SCENARIOS = ('shorten', 'redirect-url', 'redirect-handler', 'qrcode')
+# Which server processes each scenario exercises
+SCENARIO_PROCESSES = {
+    'shorten': ('shorten-url',),
+    'redirect-url': ('redirect-url',),
+    'redirect-handler': ('redirect-handler', 'redirect-url'),
+    'qrcode': ('qrcode-wrapper',)
+}
+SHORT_DOMAIN = 'https://url.example'
+# Any REDIRECT_STATUS the servers may be configured with
+REDIRECTS = (301, 302, 307, 308)
+
+
+class ZipfSampler:
+    """Draws link indexes 0..n-1 with P(rank k) proportional to 1 / k^s"""
+
+    def __init__(self, n, s, seed):
+        self.rng = random.Random(seed)
+        self.cumulative = list(itertools.accumulate(1.0 / (rank ** s) for rank in range(1, n + 1)))
+        self.total = self.cumulative[-1]
+        self.lock = threading.Lock()
+
+    def sample(self):
+        with self.lock:
+            point = self.rng.random() * self.total
+        return bisect.bisect_left(self.cumulative, point)
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def wait_for_port(port, process, timeout=30.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            return False
+        try:
+            with socket.create_connection(('127.0.0.1', port), timeout=0.5):
+                return True
+        except OSError:
+            time.sleep(0.1)
+    return False
+
+
+def rss_kib(pid):
+    """(current, peak) resident set size in KiB from /proc; (None, None) elsewhere"""
+    values = {}
+    try:
+        with open(f'/proc/{pid}/status') as f:
+            for line in f:
+                key, _, value = line.partition(':')
+                if key in ('VmRSS', 'VmHWM'):
+                    values[key] = int(value.split()[0])
+    except OSError:
+        pass
+    return values.get('VmRSS'), values.get('VmHWM')
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class Cluster:
+    """The server processes under test"""
+
+    def __init__(self, args, workdir):
+        self.args = args
+        self.workdir = workdir
+        self.processes = {}
+        self.ports = {}
+
+    def env(self):
+        env = dict(os.environ)
+        env.update({
+            'LOG_LEVEL': 'WARN',
+            'CLICK_COUNT_MODE': self.args.click_mode,
+            'SHORT_DOMAIN': SHORT_DOMAIN,
+            'SERVER_MODE': 'flask',
+            'QR_CACHE_DIR': '',
+            'REDIRECT_LOOKUP_MODE': self.args.lookup_mode,
+            'REDIRECT_FILTER': 'off',
+            'REDIRECT_HOT_LINKS_PATH': os.path.join(self.workdir, 'hot-links.json'),
+            'PYTHONUNBUFFERED': '1'
+        })
+        if self.args.store == 'sqlite':
+            env.update({'STORAGE_BACKEND': 'sqlite', 'SQLITE_PATH': os.path.join(self.workdir, 'bench.db')})
+        if 'redirect-url' in self.ports:
+            env['OPENFAAS_GATEWAY'] = f"http://127.0.0.1:{self.ports['redirect-url']}"
+        return env
+
+    def seed_sqlite(self):
+        sys.path.insert(0, os.path.join(ROOT, 'openfaas'))
+        from common.storage.sqlite import SQLiteStore
+        store = SQLiteStore(path=os.path.join(self.workdir, 'bench.db'))
+        store.batch_put(seed_items(bench_links(self.args.links, self.args.seed)))
+
+    def start(self, component):
+        port = free_port()
+        self.ports[component] = port
+        log_path = os.path.join(self.workdir, f'{component}.log')
+        command = [
+            sys.executable, os.path.join(BENCH_DIR, 'serve.py'), component,
+            '--port', str(port), '--store', self.args.store, '--links', str(self.args.links),
+            '--seed', str(self.args.seed), '--latency-ms', str(self.args.latency_ms)
+        ]
+        with open(log_path, 'w') as log:
+            process = subprocess.Popen(command, env=self.env(), stdout=log, stderr=subprocess.STDOUT)
+        self.processes[component] = process
+        if not wait_for_port(port, process):
+            raise RuntimeError(f"{component} did not start; see {log_path}")
+
+    def start_all(self, components):
+        if self.args.store == 'sqlite':
+            self.seed_sqlite()
+        # redirect-url first: redirect-handler needs its port
+        for component in sorted(components, key=lambda c: c != 'redirect-url'):
+            self.start(component)
+
+    def rss(self, components):
+        usage = {}
+        for component in components:
+            current, peak = rss_kib(self.processes[component].pid)
+            usage[component] = {"rss_kib": current, "peak_rss_kib": peak}
+        return usage
+
+    def stop(self):
+        for process in self.processes.values():
+            process.terminate()
+        for process in self.processes.values():
+            try:
+                process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+
+
+class Client:
+    """One keep-alive HTTP connection per worker thread"""
+
+    def __init__(self, port):
+        self.port = port
+        self.local = threading.local()
+
+    def request(self, method, path, body=None, headers=None):
+        for attempt in range(2):
+            conn = getattr(self.local, 'conn', None)
+            if conn is None:
+                conn = self.local.conn = http.client.HTTPConnection('127.0.0.1', self.port, timeout=30)
+            try:
+                conn.request(method, path, body=body, headers=headers or {})
+                response = conn.getresponse()
+                response.read()
+                return response.status
+            except (http.client.HTTPException, OSError):
+                # The server closed an idle connection; reconnect once
+                conn.close()
+                self.local.conn = None
+                if attempt:
+                    raise
+
+
+def build_requests(scenario, args, links, sampler, ports):
+    """Return (port, make_request) where make_request(i) -> (method, path, body, headers, expected statuses)"""
+    rng = random.Random(args.seed + 1)
+    rng_lock = threading.Lock()
+    fresh_ids = itertools.count()
+
+    def popular():
+        return links[sampler.sample()]
+
+    if scenario == 'shorten':
+        def make(i):
+            with rng_lock:
+                fresh = rng.random() < args.new_ratio
+            url = f"https://example.com/new/{args.seed}/{next(fresh_ids)}" if fresh else popular()[1]
+            return 'POST', '/', json.dumps({"url": url}), {'Content-Type': 'application/json'}, (200,)
+        return ports['shorten-url'], make
+    if scenario == 'redirect-url':
+        def make(i):
+            return 'POST', '/', popular()[0], {'Content-Type': 'text/plain'}, REDIRECTS
+        return ports['redirect-url'], make
+    if scenario == 'redirect-handler':
+        def make(i):
+            return 'GET', f'/{popular()[0]}', None, {}, REDIRECTS
+        return ports['redirect-handler'], make
+    if scenario == 'qrcode':
+        def make(i):
+            url_hash = popular()[0]
+            return 'GET', f'/?text={SHORT_DOMAIN}/{url_hash}', None, {}, (200,)
+        return ports['qrcode-wrapper'], make
+    raise ValueError(scenario)
+
+
+def run_scenario(scenario, concurrency, args, links, cluster):
+    sampler = ZipfSampler(len(links), args.zipf, args.seed)
+    port, make = build_requests(scenario, args, links, sampler, cluster.ports)
+    client = Client(port)
+    errors = {}
+    errors_lock = threading.Lock()
+
+    def one(i):
+        method, path, body, headers, expected = make(i)
+        start = time.perf_counter()
+        try:
+            status = client.request(method, path, body, headers)
+        except Exception as e:
+            status = type(e).__name__
+        elapsed = time.perf_counter() - start
+        if status not in expected:
+            with errors_lock:
+                errors[str(status)] = errors.get(str(status), 0) + 1
+        return elapsed
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(one, range(args.warmup)))
+        start = time.perf_counter()
+        latencies = list(pool.map(one, range(args.warmup, args.warmup + args.requests)))
+        elapsed = time.perf_counter() - start
+
+    result = summarize(latencies, elapsed)
+    result.update({
+        "scenario": scenario,
+        "concurrency": concurrency,
+        "errors": sum(errors.values()),
+        "error_statuses": errors,
+        "processes": cluster.rss(SCENARIO_PROCESSES[scenario])
+    })
+    return result
+
+
+def compare(results, baseline_path):
+    with open(baseline_path) as f:
+        baseline = {(r['scenario'], r['concurrency']): r for r in json.load(f)['results']}
+    print(f"\nvs {baseline_path}")
+    print(f"{'scenario':<17} {'conc':>5} {'req/s':>12} {'p99 ms':>12}")
+    for r in results:
+        base = baseline.get((r['scenario'], r['concurrency']))
+        if base is None:
+            continue
+
+        def delta(key):
+            return (r[key] - base[key]) / base[key] * 100 if base[key] else 0.0
+
+        print(f"{r['scenario']:<17} {r['concurrency']:>5} {delta('req_per_s'):>+11.1f}% {delta('p99_ms'):>+11.1f}%")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scenarios', default=','.join(SCENARIOS))
+    parser.add_argument('--concurrency', default='1,16,64', help='comma-separated client counts')
+    parser.add_argument('--requests', type=int, default=2000, help='measured requests per scenario and level')
+    parser.add_argument('--warmup', type=int, default=200)
+    parser.add_argument('--links', type=int, default=10000, help='pre-seeded short links')
+    parser.add_argument('--zipf', type=float, default=1.1, help='Zipf exponent of link popularity')
+    parser.add_argument('--new-ratio', type=float, default=0.2, help='shorten requests for never-seen URLs')
+    parser.add_argument('--store', choices=('fake', 'sqlite'), default='fake')
+    parser.add_argument('--latency-ms', type=float, default=1.0, help='simulated DynamoDB round trip (fake store)')
+    parser.add_argument('--click-mode', choices=('sync', 'batched'), default='batched')
+    parser.add_argument('--lookup-mode', choices=('gateway', 'direct'), default='gateway')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--output', help='results file (default: benchmarks/results/<time>-<commit>.json)')
+    parser.add_argument('--compare', help='earlier results file to print deltas against')
+    args = parser.parse_args()
+
+    scenarios = [s for s in args.scenarios.split(',') if s]
+    unknown = set(scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(sorted(unknown))}")
+    components = sorted({c for s in scenarios for c in SCENARIO_PROCESSES[s]})
+    links = bench_links(args.links, args.seed)
+
+    results = []
+    with tempfile.TemporaryDirectory(prefix='urlshortener-bench-') as workdir:
+        cluster = Cluster(args, workdir)
+        try:
+            cluster.start_all(components)
+            for scenario in scenarios:
+                for concurrency in [int(c) for c in args.concurrency.split(',')]:
+                    result = run_scenario(scenario, concurrency, args, links, cluster)
+                    results.append(result)
+                    rss = ' '.join(f"{name}={usage['rss_kib'] or 0}KiB" for name, usage in result['processes'].items())
+                    print(f"{scenario:<17} c={concurrency:<4} {result['req_per_s']:>9.0f} req/s  "
+                          f"p50 {result['p50_ms']:.2f}  p95 {result['p95_ms']:.2f}  p99 {result['p99_ms']:.2f} ms  "
+                          f"errors {result['errors']}  {rss}", flush=True)
+        finally:
+            cluster.stop()
+
+    commit = git_commit()
+    report = {
+        "commit": commit,
+        "timestamp": datetime.utcnow().isoformat(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "args": vars(args),
+        "results": results
+    }
+    output = args.output or os.path.join(
+        BENCH_DIR, 'results', f"{datetime.utcnow().strftime('%Y%m%dT%H%M%S')}-{commit or 'nogit'}.json"
+    )
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"Saved {output}")
+
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == '__main__':
+    main()
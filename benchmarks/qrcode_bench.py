@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+Latency and bytes on the wire for the qrcode-wrapper response modes:
+
+- hex-png: classic handle() JSON envelope with the PNG hex-encoded, plus the
+  json.loads + bytes.fromhex a consumer has to do to get the image back
+- png:     respond() returning raw PNG bytes
+- svg:     respond(format=svg), no PIL rasterization
+
+The cache is disabled so every request renders. "gzip" is the size after
+Caddy's `encode gzip`.
+
+    python3 benchmarks/qrcode_bench.py --requests 300
+"""
+
+import argparse
+import gzip
+import json
+import time
+
+from harness import load_handler, summarize
+
+
+def hex_png(handler, text):
+    envelope = handler.handle(text, query="")
+    image = bytes.fromhex(json.loads(envelope)["body"])
+    return envelope.encode(), image
+
+
+def raw_png(handler, text):
+    _, _, body = handler.respond(text, {})
+    return body, body
+
+
+def svg(handler, text):
+    _, _, body = handler.respond(text, {"format": "svg"})
+    return body, body
+
+
+MODES = (("hex-png", hex_png), ("png", raw_png), ("svg", svg))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--requests', type=int, default=300)
+    parser.add_argument('--json', action='store_true', help='print results as JSON')
+    args = parser.parse_args()
+
+    handler = load_handler('qrcode-wrapper')
+    handler.cache = handler.QRCache(max_entries=0)
+    handler.log = lambda *a, **k: None
+    texts = [f"https://url.masondrake.dev/{i:08x}" for i in range(args.requests)]
+
+    results = []
+    for name, run in MODES:
+        latencies = []
+        wire = 0
+        wire_gzip = 0
+        start = time.perf_counter()
+        for text in texts:
+            t0 = time.perf_counter()
+            payload, _ = run(handler, text)
+            latencies.append(time.perf_counter() - t0)
+            wire += len(payload)
+            wire_gzip += len(gzip.compress(payload))
+        result = summarize(latencies, time.perf_counter() - start)
+        result.update({
+            "mode": name,
+            "bytes": wire / len(texts),
+            "gzip_bytes": wire_gzip / len(texts)
+        })
+        results.append(result)
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    print(f"{'mode':<8} {'req/s':>8} {'p50 ms':>8} {'p99 ms':>8} {'bytes':>8} {'gzip':>8}")
+    for r in results:
+        print(f"{r['mode']:<8} {r['req_per_s']:>8.0f} {r['p50_ms']:>8.2f} {r['p99_ms']:>8.2f} "
+              f"{r['bytes']:>8.0f} {r['gzip_bytes']:>8.0f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+Run one component of the request path against an offline store, for
+load_test.py. Each component runs in its own process so its RSS can be
+measured on its own.
+
+    python3 benchmarks/serve.py redirect-url --port 18081 --store fake --links 10000
+
+Components:
+    shorten-url, redirect-url, qrcode-wrapper   the function's server.py (Flask,
+                                                threaded werkzeug server); also
+                                                mounted under /function/<name>
+                                                like the OpenFaaS gateway does
+    redirect-handler                            redirect-handler.py; set
+                                                OPENFAAS_GATEWAY to a redirect-url
+                                                instance started by this script
+
+Stores:
+    fake    an in-process FakeTable per process, seeded with the same
+            deterministic links in every process (--latency-ms simulates the
+            DynamoDB round trip)
+    sqlite  the SQLite backend; STORAGE_BACKEND/SQLITE_PATH come from the
+            environment and load_test.py seeds the shared file
+"""
+
+import argparse
+import os
+import sys
+
+from harness import OPENFAAS_DIR, ROOT, install_fake_table, load_module
+from fake_dynamo import FakeTable
+
+FUNCTIONS = ('shorten-url', 'redirect-url', 'qrcode-wrapper')
+
+
+def bench_links(count, seed):
+    """The benchmark's (hash, url) pairs; identical in every process for a given seed"""
+    import hashlib
+    links = []
+    for i in range(count):
+        url = f"https://example.com/bench/{seed}/{i}"
+        links.append((hashlib.sha256(url.encode()).hexdigest()[:8], url))
+    return links
+
+
+def seed_items(links):
+    return [
+        {'hash': url_hash, 'original_url': url, 'created_at': '2026-01-01T00:00:00', 'click_count': 0}
+        for url_hash, url in links
+    ]
+
+
+def install_store(args):
+    if args.store == 'fake':
+        table = install_fake_table(FakeTable(latency=args.latency_ms / 1000))
+        for item in seed_items(bench_links(args.links, args.seed)):
+            table.put_item(Item=item)
+
+
+def gateway_paths(app, name):
+    """Serve /function/<name>[/...] like the OpenFaaS gateway: the function sees the rest, or /"""
+    prefix = f'/function/{name}'
+
+    def wsgi(environ, start_response):
+        path = environ.get('PATH_INFO', '')
+        if path == prefix or path.startswith(prefix + '/'):
+            environ['PATH_INFO'] = path[len(prefix):] or '/'
+        return app(environ, start_response)
+
+    return wsgi
+
+
+def serve_function(name, port):
+    from werkzeug.serving import make_server
+
+    sys.path.insert(1, os.path.join(OPENFAAS_DIR, name))
+    server = load_module(os.path.join('openfaas', name, 'server.py'), 'server')
+    make_server('127.0.0.1', port, gateway_paths(server.app, name), threaded=True).serve_forever()
+
+
+def serve_redirect_handler(port):
+    module = load_module('redirect-handler.py', 'redirect_handler')
+    module.run_server(port)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('component', choices=FUNCTIONS + ('redirect-handler',))
+    parser.add_argument('--port', type=int, required=True)
+    parser.add_argument('--store', choices=('fake', 'sqlite'), default='fake')
+    parser.add_argument('--links', type=int, default=10000)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--latency-ms', type=float, default=0.0)
+    args = parser.parse_args()
+
+    os.chdir(ROOT)
+    install_store(args)
+    if args.component == 'redirect-handler':
+        serve_redirect_handler(args.port)
+    else:
+        serve_function(args.component, args.port)
+
+
+if __name__ == '__main__':
+    main()
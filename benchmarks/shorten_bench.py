@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""
+Shorten throughput before/after the single-round-trip conditional create.
+
+"legacy" is the original get_item + put_item sequence from shorten-url.
+"conditional" is handler.create_mapping() on the DynamoDB store. Both run against the in-memory
+table with a simulated round-trip latency, with N concurrent clients
+shortening a mix of new and already-shortened URLs.
+
+    python3 benchmarks/shorten_bench.py --clients 1,8,32 --requests 2000 --latency-ms 2
+"""
+
+import argparse
+import hashlib
+import json
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from harness import load_handler, summarize
+from fake_dynamo import FakeTable
+
+
+def legacy_create(table, original_url):
+    """The pre-conditional-write create path, kept for comparison"""
+    url_hash = hashlib.sha256(original_url.encode()).hexdigest()[:8]
+    response = table.get_item(Key={'hash': url_hash})
+    if 'Item' in response:
+        return url_hash, response['Item'], True
+    item = {
+        'hash': url_hash,
+        'original_url': original_url,
+        'created_at': datetime.utcnow().isoformat(),
+        'click_count': 0
+    }
+    table.put_item(Item=item)
+    return url_hash, item, False
+
+
+def run(create, clients, urls, seeded, latency):
+    table = FakeTable(latency=latency)
+    for url in seeded:
+        create(table, url)
+    table.calls = 0
+
+    def one(url):
+        start = time.perf_counter()
+        create(table, url)
+        return time.perf_counter() - start
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=clients) as pool:
+        latencies = list(pool.map(one, urls))
+    result = summarize(latencies, time.perf_counter() - start)
+    result["round_trips_per_request"] = table.calls / len(urls)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--clients', default='1,8,32', help='comma-separated concurrency levels')
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--latency-ms', type=float, default=2.0, help='simulated DynamoDB round trip')
+    parser.add_argument('--repeat-ratio', type=float, default=0.3, help='share of requests for already-shortened URLs')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--json', action='store_true', help='print results as JSON')
+    args = parser.parse_args()
+
+    handler = load_handler('shorten-url')
+    from common.storage.dynamodb import DynamoStore
+
+    def conditional_create(table, url):
+        return handler.create_mapping(DynamoStore(table=table), url)
+
+    rng = random.Random(args.seed)
+    seeded = [f"https://example.com/existing/{i}" for i in range(200)]
+    urls = [
+        rng.choice(seeded) if rng.random() < args.repeat_ratio else f"https://example.com/new/{i}"
+        for i in range(args.requests)
+    ]
+
+    results = []
+    for clients in [int(c) for c in args.clients.split(',')]:
+        for name, create in (('legacy', legacy_create), ('conditional', conditional_create)):
+            result = run(create, clients, urls, seeded, args.latency_ms / 1000)
+            result.update({"mode": name, "clients": clients})
+            results.append(result)
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    print(f"{'mode':<12} {'clients':>7} {'req/s':>10} {'p50 ms':>8} {'p99 ms':>8} {'RTs/req':>8}")
+    for r in results:
+        print(f"{r['mode']:<12} {r['clients']:>7} {r['req_per_s']:>10.0f} {r['p50_ms']:>8.2f} "
+              f"{r['p99_ms']:>8.2f} {r['round_trips_per_request']:>8.2f}")
+
+
+if __name__ == '__main__':
+    main()
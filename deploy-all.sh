@@ -55,6 +55,10 @@ echo ""
 echo "Step 1: Building Docker images..."
 echo "-----------------------------------"
 
+# Each function directory is its own build context; copy the shared
+# common/ package into them first
+./openfaas/sync-common.sh
+
 # Build shorten-url function
 echo "Building shorten-url..."
 docker build -t shorten-url:latest -f openfaas/shorten-url/Dockerfile openfaas/shorten-url
@@ -162,12 +166,18 @@ else
     echo "Installing redirect handler..."
     cp "$SCRIPT_DIR/redirect-handler.py" "$DEPLOY_DIR/"
     chmod +x "$DEPLOY_DIR/redirect-handler.py"
+    # Shared function code used by the direct-to-store lookup mode
+    cp -r "$SCRIPT_DIR/openfaas/common" "$DEPLOY_DIR/"
     
     # Install Python requests library if not present
     if ! python3 -c "import requests" &> /dev/null; then
         echo "Installing Python requests library..."
         apt-get install -y python3-requests
     fi
+    if ! python3 -c "import boto3" &> /dev/null; then
+        echo "Installing Python boto3 library..."
+        apt-get install -y python3-boto3
+    fi
     
     # Set ownership to www-data
     echo "Setting ownership to www-data..."
@@ -201,26 +211,8 @@ EOF
     
     # Install redirect handler systemd service
     echo "Installing redirect handler systemd service..."
-    cat > /etc/systemd/system/redirect-handler.service << 'EOF'
-[Unit]
-Description=URL Shortener Redirect Handler
-After=network.target
-
-[Service]
-Type=simple
-User=www-data
-Group=www-data
-WorkingDirectory=/var/www/urlshortener
-Environment="PYTHONUNBUFFERED=1"
-ExecStart=/usr/bin/python3 /var/www/urlshortener/redirect-handler.py 3001
-Restart=on-failure
-RestartSec=5
-StandardOutput=journal
-StandardError=journal
-
-[Install]
-WantedBy=multi-user.target
-EOF
+    # The unit file (with its tuning environment) is kept in the repo
+    cp "$SCRIPT_DIR/redirect-handler.service" /etc/systemd/system/redirect-handler.service
     
     # Reload systemd
     echo "Reloading systemd..."
@@ -278,7 +270,7 @@ if [ -n "$HASH" ]; then
     
     echo ""
     echo "3. Testing redirect-url (HTTP redirect)..."
-    if curl -s -I -X POST "$GATEWAY/function/redirect-url" -d "$HASH" | grep -q "301"; then
+    if curl -s -I -X POST "$GATEWAY/function/redirect-url" -d "$HASH" | grep -qE "^HTTP/[0-9.]+ 30[1278]"; then
         echo "   ✓ redirect-url HTTP redirect is working"
     else
         echo "   ✗ redirect-url HTTP redirect failed"
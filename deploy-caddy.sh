@@ -32,11 +32,22 @@ else
     echo "✓ Caddy is already installed: $(caddy version)"
 fi
 
+# The redirect cache needs the cache-handler module, which is not in the
+# stock build
+if ! caddy list-modules 2>/dev/null | grep -q "^http.handlers.cache$"; then
+    echo "Adding the cache-handler module to Caddy..."
+    caddy add-package github.com/caddyserver/cache-handler
+    echo "✓ cache-handler added"
+else
+    echo "✓ cache-handler module present"
+fi
+
 # Create Caddy directory if it doesn't exist
 echo "Setting up Caddy directories..."
 mkdir -p /etc/caddy
 mkdir -p /var/log/caddy
 chown -R caddy:caddy /var/log/caddy 2>/dev/null || chown -R www-data:www-data /var/log/caddy
+chmod 0755 /var/log/caddy
 
 echo "Backing up existing Caddyfile..."
 if [ -f "$CADDYFILE_DEST" ]; then
@@ -33,6 +33,10 @@ echo ""
 echo "Step 1: Building and tagging Docker images..."
 echo "-----------------------------------"
 
+# Each function directory is its own build context; copy the shared
+# common/ package into them first
+./openfaas/sync-common.sh
+
 # Build shorten-url function
 echo "Building shorten-url..."
 docker build -t shorten-url:latest -f openfaas/shorten-url/Dockerfile openfaas/shorten-url
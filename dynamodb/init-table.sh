@@ -9,10 +9,12 @@ echo "=========================================="
 ENDPOINT_URL="${DYNAMODB_ENDPOINT:-http://localhost:8000}"
 REGION="${AWS_REGION:-us-east-1}"
 TABLE_NAME="${DYNAMODB_TABLE:-url_mappings}"
+ROLLUP_TABLE_NAME="${DYNAMODB_ROLLUP_TABLE:-${TABLE_NAME}_rollups}"
 
 echo "Endpoint: $ENDPOINT_URL"
 echo "Region: $REGION"
 echo "Table Name: $TABLE_NAME"
+echo "Rollup Table Name: $ROLLUP_TABLE_NAME"
 echo ""
 
 # Wait for DynamoDB to be ready
@@ -39,6 +41,42 @@ fi
 
 echo ""
 
+# Create the click rollup table (hash + time bucket) if it is missing
+if ! aws dynamodb describe-table \
+    --endpoint-url "$ENDPOINT_URL" \
+    --table-name "$ROLLUP_TABLE_NAME" \
+    --region "$REGION" > /dev/null 2>&1; then
+  echo "Creating table '$ROLLUP_TABLE_NAME'..."
+  aws dynamodb create-table \
+    --endpoint-url "$ENDPOINT_URL" \
+    --table-name "$ROLLUP_TABLE_NAME" \
+    --attribute-definitions \
+      AttributeName=hash,AttributeType=S \
+      AttributeName=bucket,AttributeType=S \
+    --key-schema \
+      AttributeName=hash,KeyType=HASH \
+      AttributeName=bucket,KeyType=RANGE \
+    --billing-mode PAY_PER_REQUEST \
+    --region "$REGION" > /dev/null
+  aws dynamodb update-time-to-live \
+    --endpoint-url "$ENDPOINT_URL" \
+    --table-name "$ROLLUP_TABLE_NAME" \
+    --time-to-live-specification "Enabled=true,AttributeName=expires_at" \
+    --region "$REGION" > /dev/null
+  echo "Table '$ROLLUP_TABLE_NAME' created."
+  echo ""
+fi
+
+# Expired links (expires_at) are deleted by DynamoDB's TTL process where it
+# is supported; common.storage.sweep does the same everywhere else
+enable_link_ttl() {
+  aws dynamodb update-time-to-live \
+    --endpoint-url "$ENDPOINT_URL" \
+    --table-name "$TABLE_NAME" \
+    --time-to-live-specification "Enabled=true,AttributeName=expires_at" \
+    --region "$REGION" > /dev/null 2>&1 || true
+}
+
 # Check if table already exists
 echo "Checking if table '$TABLE_NAME' already exists..."
 if aws dynamodb describe-table \
@@ -46,6 +84,7 @@ if aws dynamodb describe-table \
     --table-name "$TABLE_NAME" \
     --region "$REGION" > /dev/null 2>&1; then
   echo "Table '$TABLE_NAME' already exists. Skipping creation."
+  enable_link_ttl
   echo ""
   echo "To recreate the table, first delete it with:"
   echo "  aws dynamodb delete-table --endpoint-url $ENDPOINT_URL --table-name $TABLE_NAME --region $REGION"
@@ -64,6 +103,8 @@ aws dynamodb create-table \
   --billing-mode PAY_PER_REQUEST \
   --region "$REGION"
 
+enable_link_ttl
+
 echo ""
 echo "=========================================="
 echo "Table Creation Complete!"
@@ -84,7 +125,7 @@ echo "Table '$TABLE_NAME' has been successfully created!"
 echo ""
 echo "Table Schema:"
 echo "  Primary Key: hash (String)"
-echo "  Attributes: hash, original_url, created_at, click_count"
+echo "  Attributes: hash, original_url, created_at, click_count, expires_at (optional, TTL)"
 echo ""
 echo "You can now test the table with:"
 echo ""
@@ -4,10 +4,27 @@ import { useEffect, useState } from 'react'
 import { useParams } from 'next/navigation'
 import Link from 'next/link'
 
+interface ClickBucket {
+    bucket: string
+    clicks: number
+}
+
+// Precomputed rollups returned by redirect-url with ?format=json
+interface ClickStats {
+    minutes: ClickBucket[]
+    hours: ClickBucket[]
+    days: ClickBucket[]
+    last_hour: number
+    last_24h: number
+    last_30d: number
+}
+
 interface RedirectData {
     hash: string
     original_url: string
     statusCode: number
+    clickCount?: number
+    clicks?: ClickStats
     error?: string
 }
 
@@ -40,7 +57,9 @@ export default function HashPage() {
             setData({
               hash,
               original_url: result.original_url,
-              statusCode: result.statusCode || 200
+              statusCode: result.statusCode || 200,
+              clickCount: result.click_count,
+              clicks: result.clicks
             })
           } else if (result.error) {
             setData({
@@ -124,6 +143,8 @@ export default function HashPage() {
         )
     }
 
+    const hourlyPeak = Math.max(1, ...(data?.clicks?.hours ?? []).map((hour) => hour.clicks))
+
     return (
         <main className="min-h-screen bg-gradient-to-br from-indigo-500 via-purple-500 to-pink-500 flex items-center justify-center">
             <div className="bg-white rounded-3xl shadow-2xl p-12 max-w-2xl w-full mx-4">
@@ -159,6 +180,36 @@ export default function HashPage() {
                         </div>
                     </div>
 
+                    {/* Click Stats */}
+                    {data?.clicks && (
+                        <div className="mb-8">
+                            <div className="grid grid-cols-4 gap-3 mb-4">
+                                {[
+                                    ['Total', data.clickCount ?? 0],
+                                    ['Last hour', data.clicks.last_hour],
+                                    ['Last 24h', data.clicks.last_24h],
+                                    ['Last 30 days', data.clicks.last_30d]
+                                ].map(([label, value]) => (
+                                    <div key={label} className="bg-gray-50 rounded-xl p-3">
+                                        <p className="text-xs text-gray-500">{label}</p>
+                                        <p className="text-xl font-bold text-gray-800">{value}</p>
+                                    </div>
+                                ))}
+                            </div>
+                            <p className="text-sm text-gray-500 mb-2">Clicks per hour (UTC)</p>
+                            <div className="flex items-end gap-1 h-20 bg-gray-50 rounded-xl p-2">
+                                {data.clicks.hours.map(({ bucket, clicks }) => (
+                                    <div
+                                        key={bucket}
+                                        title={`${bucket}:00 — ${clicks} clicks`}
+                                        className="flex-1 bg-indigo-400 rounded-t"
+                                        style={{ height: `${(clicks / hourlyPeak) * 100}%` }}
+                                    />
+                                ))}
+                            </div>
+                        </div>
+                    )}
+
                     {/* Info Message */}
                     <div className="mb-8">
                         <p className="text-gray-600">
@@ -26,13 +26,8 @@ export default function ResultDisplay({ result }: ResultDisplayProps) {
             try {
                 const apiGateway = process.env.NEXT_PUBLIC_API_GATEWAY || 'https://faas.masondrake.dev'
                 const qrcodeFunction = `${apiGateway}/function/qrcode-wrapper`
-                const response = await fetch(qrcodeFunction, {
-                    method: 'POST',
-                    body: result.short_url,
-                    headers: {
-                        'Content-Type': 'text/plain',
-                    },
-                })
+                // GET so the browser can reuse the cached image (ETag/Cache-Control)
+                const response = await fetch(`${qrcodeFunction}?text=${encodeURIComponent(result.short_url)}`)
 
                 if (response.ok) {
                     const blob = await response.blob()
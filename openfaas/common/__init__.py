@@ -0,0 +1,6 @@
+"""
+Code shared by the OpenFaaS functions.
+
+Each function image copies this package next to its handler.py, so it is
+imported as ``from common import ...``.
+"""
@@ -0,0 +1,165 @@
+"""
+Bloom filter over short-URL hashes, optionally backed by a memory-mapped file.
+
+redirect-handler.py keeps one of these for every hash in url_mappings so a
+definite miss can be answered with a local 404 instead of a gateway,
+function and DynamoDB round trip. Bloom filters have no false negatives,
+so only hashes that might exist reach the store.
+
+Sizing follows the usual formulas for ``capacity`` items at ``fp_rate``:
+
+    bits   = -capacity * ln(fp_rate) / ln(2)^2
+    hashes = bits / capacity * ln(2)
+
+capped at ``max_bytes``; a capped filter still works but its false-positive
+rate is higher than asked for (see stats()).
+
+File layout: a fixed header (magic, bit count, hash count, item count,
+capacity, watermark) followed by the bit array. The watermark is the
+created_at of the newest item added by a scan, so a restarted handler only
+has to catch up on items created after it.
+"""
+
+import math
+import mmap
+import os
+import struct
+import threading
+from hashlib import blake2b
+
+MAGIC = b'URLBLM01'
+# magic, num_bits, num_hashes, count, capacity, watermark (NUL-padded ISO timestamp)
+HEADER = struct.Struct('<8sQIQQ32s')
+
+
+def optimal_size(capacity, fp_rate, max_bytes):
+    """Return (num_bits, num_hashes) for ``capacity`` items within ``max_bytes``"""
+    capacity = max(1, capacity)
+    num_bits = int(math.ceil(-capacity * math.log(fp_rate) / (math.log(2) ** 2)))
+    num_bits = max(64, min(num_bits, max_bytes * 8))
+    num_bits = (num_bits + 7) // 8 * 8
+    num_hashes = max(1, int(round(num_bits / capacity * math.log(2))))
+    return num_bits, num_hashes
+
+
+class BloomFilter:
+    def __init__(self, num_bits, num_hashes, capacity, bits=None, mapped_file=None):
+        self.num_bits = num_bits
+        self.num_hashes = num_hashes
+        self.capacity = capacity
+        self.bits = bits if bits is not None else bytearray(num_bits // 8)
+        self.mapped_file = mapped_file
+        self.count = 0
+        self.watermark = ''
+        self.lock = threading.Lock()
+
+    @classmethod
+    def create(cls, capacity, fp_rate, max_bytes, path=None):
+        """
+        Build an empty filter. With ``path`` the bit array lives in a new
+        memory-mapped file (written atomically by save()).
+        """
+        num_bits, num_hashes = optimal_size(capacity, fp_rate, max_bytes)
+        bloom = cls(num_bits, num_hashes, capacity)
+        if path:
+            bloom.mapped_file = path
+        return bloom
+
+    @classmethod
+    def load(cls, path):
+        """Map a filter saved by save(); returns None if missing or invalid"""
+        try:
+            f = open(path, 'r+b')
+        except FileNotFoundError:
+            return None
+        with f:
+            header = f.read(HEADER.size)
+            if len(header) != HEADER.size:
+                return None
+            magic, num_bits, num_hashes, count, capacity, watermark = HEADER.unpack(header)
+            if magic != MAGIC or os.fstat(f.fileno()).st_size != HEADER.size + num_bits // 8:
+                return None
+            # The mapping stays valid after the file object is closed
+            mapped = mmap.mmap(f.fileno(), 0)
+        bits = memoryview(mapped)[HEADER.size:]
+        bloom = cls(num_bits, num_hashes, capacity, bits=bits, mapped_file=path)
+        bloom.mapping = mapped
+        bloom.count = count
+        bloom.watermark = watermark.rstrip(b'\0').decode()
+        return bloom
+
+    def _positions(self, key):
+        # Kirsch-Mitzenmacher double hashing from one 128-bit digest
+        digest = blake2b(key.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        return [(h1 + i * h2) % self.num_bits for i in range(self.num_hashes)]
+
+    def add(self, key):
+        positions = self._positions(key)
+        bits = self.bits
+        with self.lock:
+            new = False
+            for position in positions:
+                byte, mask = position >> 3, 1 << (position & 7)
+                if not bits[byte] & mask:
+                    bits[byte] |= mask
+                    new = True
+            if new:
+                self.count += 1
+
+    def update(self, keys, watermark=None):
+        for key in keys:
+            self.add(key)
+        if watermark:
+            with self.lock:
+                if watermark > self.watermark:
+                    self.watermark = watermark
+
+    def __contains__(self, key):
+        bits = self.bits
+        for position in self._positions(key):
+            if not bits[position >> 3] & (1 << (position & 7)):
+                return False
+        return True
+
+    def header(self):
+        return HEADER.pack(MAGIC, self.num_bits, self.num_hashes, self.count, self.capacity,
+                           self.watermark.encode()[:32])
+
+    def save(self, path=None):
+        """
+        Persist to ``path`` (default: the file this filter was loaded from).
+        A mapped filter just updates its header and flushes dirty pages;
+        otherwise the file is written to a temp name and renamed into place.
+        """
+        path = path or self.mapped_file
+        if not path:
+            return
+        with self.lock:
+            mapping = getattr(self, 'mapping', None)
+            if mapping is not None and path == self.mapped_file:
+                mapping[:HEADER.size] = self.header()
+                mapping.flush()
+                return
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            tmp_path = f"{path}.tmp"
+            with open(tmp_path, 'wb') as f:
+                f.write(self.header())
+                f.write(self.bits)
+            os.replace(tmp_path, path)
+
+    def estimated_fp_rate(self):
+        """False-positive rate at the current fill"""
+        return (1 - math.exp(-self.num_hashes * self.count / self.num_bits)) ** self.num_hashes
+
+    def stats(self):
+        return {
+            "items": self.count,
+            "capacity": self.capacity,
+            "bytes": self.num_bits // 8,
+            "hashes": self.num_hashes,
+            "watermark": self.watermark,
+            "estimated_fp_rate": self.estimated_fp_rate(),
+            "file": self.mapped_file
+        }
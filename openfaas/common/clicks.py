@@ -0,0 +1,148 @@
+"""
+Write-behind click counter for the redirect path.
+
+Redirects add increments to an in-memory map keyed by hash. A background
+thread flushes the map every CLICK_FLUSH_INTERVAL seconds, or sooner once
+CLICK_FLUSH_MAX_PENDING distinct hashes are waiting. Each hash gets one
+Store.add_clicks() call per flush. Pending counts are flushed again at
+interpreter exit so a clean shutdown loses nothing.
+
+Every click is also counted in its minute bucket; a flush folds those into
+minute, hour and day rollups (common.rollups) with one Store.add_rollups()
+call. Clicks whose total was written synchronously are recorded with
+record_rollup() so they still reach the rollups.
+"""
+
+import atexit
+import os
+import threading
+
+from common import rollups, storage
+
+# "sync" updates click_count inside the request (original behaviour),
+# "batched" defers it to the write-behind flusher
+MODE = os.getenv('CLICK_COUNT_MODE', 'sync').lower()
+FLUSH_INTERVAL = float(os.getenv('CLICK_FLUSH_INTERVAL', '5'))
+FLUSH_MAX_PENDING = int(os.getenv('CLICK_FLUSH_MAX_PENDING', '500'))
+# Rollup rows kept for retry while the rollup table is unavailable
+ROLLUP_MAX_RETRY = int(os.getenv('CLICK_ROLLUP_MAX_RETRY', '50000'))
+
+
+class ClickCounter:
+    """Accumulates per-hash increments and flushes them off the request path"""
+
+    def __init__(self, flush_interval=FLUSH_INTERVAL, max_pending=FLUSH_MAX_PENDING, log=None):
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.log = log
+        self.pending = {}
+        self.buckets = {}
+        self.retry_rows = []
+        self.lock = threading.Lock()
+        self.flush_lock = threading.Lock()
+        self.wakeup = threading.Event()
+        self.stopped = False
+        self.thread = None
+
+    def start(self):
+        with self.lock:
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._run, name='click-flusher', daemon=True)
+                self.thread.start()
+                atexit.register(self.close)
+
+    def increment(self, url_hash, count=1, rollup=True):
+        """
+        Record ``count`` clicks to be written on the next flush. Pass
+        ``rollup=False`` when putting back clicks whose rollups were already
+        recorded (e.g. after a failed synchronous write).
+        """
+        if self.thread is None:
+            self.start()
+        with self.lock:
+            self.pending[url_hash] = self.pending.get(url_hash, 0) + count
+            full = len(self.pending) >= self.max_pending
+        if rollup:
+            self.record_rollup(url_hash, count)
+        if full:
+            self.wakeup.set()
+
+    def record_rollup(self, url_hash, count=1):
+        """Count clicks in the rollups only; their click_count was already written"""
+        if not rollups.ENABLED:
+            return
+        if self.thread is None:
+            self.start()
+        key = (url_hash, rollups.minute_of())
+        with self.lock:
+            self.buckets[key] = self.buckets.get(key, 0) + count
+            full = len(self.buckets) >= self.max_pending
+        if full:
+            self.wakeup.set()
+
+    def take(self, url_hash):
+        """Remove and return the clicks still pending for one hash (their rollups stay pending)"""
+        with self.lock:
+            return self.pending.pop(url_hash, 0)
+
+    def flush(self):
+        """Write all pending increments, one update per hash"""
+        with self.flush_lock:
+            # Before the swap: if the store cannot be created the counts
+            # stay pending for the next flush instead of being dropped
+            store = storage.get_store()
+            with self.lock:
+                batch, self.pending = self.pending, {}
+                buckets, self.buckets = self.buckets, {}
+                retry_rows, self.retry_rows = self.retry_rows, []
+            if buckets or retry_rows:
+                self._flush_rollups(store, rollups.expand(buckets) + retry_rows)
+            if not batch:
+                return 0
+            written = 0
+            for url_hash, count in batch.items():
+                try:
+                    store.add_clicks(url_hash, count)
+                    written += 1
+                except Exception as e:
+                    # Keep the counts and retry on the next flush
+                    with self.lock:
+                        self.pending[url_hash] = self.pending.get(url_hash, 0) + count
+                    if self.log:
+                        self.log("ERROR", "Click flush failed", hash=url_hash, count=count, error=str(e))
+            return written
+
+    def _flush_rollups(self, store, rows):
+        try:
+            failed = store.add_rollups(rows)
+            error = None
+        except Exception as e:
+            failed, error = rows, str(e)
+        if not failed:
+            return
+        with self.lock:
+            room = max(0, ROLLUP_MAX_RETRY - len(self.retry_rows))
+            self.retry_rows.extend(failed[:room])
+        if self.log:
+            self.log("ERROR", "Rollup flush failed", rows=len(failed), dropped=max(0, len(failed) - room),
+                     error=error)
+
+    def close(self):
+        """Stop the flusher thread and write whatever is still pending"""
+        self.stopped = True
+        self.wakeup.set()
+        if self.thread is not None and self.thread is not threading.current_thread():
+            self.thread.join(timeout=self.flush_interval + 5)
+        self.flush()
+
+    def _run(self):
+        while not self.stopped:
+            self.wakeup.wait(self.flush_interval)
+            self.wakeup.clear()
+            if self.stopped:
+                break
+            try:
+                self.flush()
+            except Exception as e:
+                if self.log:
+                    self.log("ERROR", "Click flusher error", error=str(e))
@@ -0,0 +1,200 @@
+"""
+Shared DynamoDB client/table factory for the OpenFaaS functions.
+
+The functions run under of-watchdog in http mode, so server.py stays resident
+between requests. The boto3 session, service model and HTTP connection pool
+are therefore built lazily once per process and reused by every invocation
+instead of being recreated inside handle().
+"""
+
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import boto3
+from boto3.dynamodb.types import TypeDeserializer
+from botocore.config import Config
+
+_lock = threading.Lock()
+_resource = None
+_tables = {}
+_deserializer = TypeDeserializer()
+
+# DynamoDB limits per BatchGetItem / BatchWriteItem call
+BATCH_GET_LIMIT = 100
+BATCH_WRITE_LIMIT = 25
+BATCH_MAX_RETRIES = int(os.getenv('DYNAMODB_BATCH_MAX_RETRIES', '8'))
+
+
+def endpoint_url():
+    return os.getenv('DYNAMODB_ENDPOINT', 'http://dynamodb:8000')
+
+
+def table_name():
+    return os.getenv('DYNAMODB_TABLE', 'url_mappings')
+
+
+def rollup_table_name():
+    """Table holding the click rollups (see common.rollups), keyed by hash + bucket"""
+    return os.getenv('DYNAMODB_ROLLUP_TABLE', table_name() + '_rollups')
+
+
+def client_config():
+    """Build the botocore config from environment variables"""
+    return Config(
+        max_pool_connections=int(os.getenv('DYNAMODB_MAX_POOL_CONNECTIONS', '10')),
+        connect_timeout=float(os.getenv('DYNAMODB_CONNECT_TIMEOUT', '2')),
+        read_timeout=float(os.getenv('DYNAMODB_READ_TIMEOUT', '5')),
+        retries={
+            'mode': os.getenv('DYNAMODB_RETRY_MODE', 'standard'),
+            'max_attempts': int(os.getenv('DYNAMODB_MAX_ATTEMPTS', '3'))
+        }
+    )
+
+
+def _session():
+    # A private session: the default boto3 session is not thread-safe
+    return boto3.session.Session(
+        region_name=os.getenv('AWS_REGION', 'us-east-1'),
+        aws_access_key_id=os.getenv('AWS_ACCESS_KEY_ID', 'local'),
+        aws_secret_access_key=os.getenv('AWS_SECRET_ACCESS_KEY', 'local')
+    )
+
+
+def get_resource():
+    """Return the process-wide DynamoDB service resource, creating it on first use"""
+    global _resource
+    if _resource is None:
+        with _lock:
+            if _resource is None:
+                _resource = _session().resource(
+                    'dynamodb',
+                    endpoint_url=endpoint_url(),
+                    config=client_config()
+                )
+    return _resource
+
+
+def get_client():
+    """Return the low-level client behind the shared resource (thread-safe)"""
+    return get_resource().meta.client
+
+
+def new_wire_client():
+    """
+    A separate client that leaves items in DynamoDB's typed JSON
+    ({"S": ...}); the resource's client converts them to Python values.
+    For tools that copy items verbatim.
+    """
+    return _session().client('dynamodb', endpoint_url=endpoint_url(), config=client_config())
+
+
+def get_table(name=None):
+    """Return a cached Table handle for ``name`` (defaults to DYNAMODB_TABLE)"""
+    name = name or table_name()
+    table = _tables.get(name)
+    if table is None:
+        resource = get_resource()
+        with _lock:
+            table = _tables.get(name)
+            if table is None:
+                table = resource.Table(name)
+                _tables[name] = table
+    return table
+
+
+def deserialize_item(raw_item):
+    """
+    Convert a low-level attribute-value map (e.g. the ``Item`` returned with a
+    ConditionalCheckFailedException) into the plain dict the Table API returns.
+    """
+    return {key: _deserializer.deserialize(value) for key, value in raw_item.items()}
+
+
+def backoff(attempt, base=0.05, cap=2.0):
+    """Sleep with capped exponential backoff and full jitter"""
+    time.sleep(random.uniform(0, min(cap, base * (2 ** attempt))))
+
+
+def batch_get_items(keys, name=None, max_retries=BATCH_MAX_RETRIES):
+    """
+    Fetch ``keys`` with BatchGetItem in chunks of 100, retrying unprocessed
+    keys with backoff. Returns a dict of hash -> item for the keys that exist.
+    """
+    name = name or table_name()
+    resource = get_resource()
+    found = {}
+    for start in range(0, len(keys), BATCH_GET_LIMIT):
+        request = {name: {'Keys': keys[start:start + BATCH_GET_LIMIT]}}
+        attempt = 0
+        while request:
+            response = resource.batch_get_item(RequestItems=request)
+            for item in response.get('Responses', {}).get(name, []):
+                found[item['hash']] = item
+            request = response.get('UnprocessedKeys') or {}
+            if request:
+                if attempt >= max_retries:
+                    raise RuntimeError(f"BatchGetItem left keys unprocessed after {max_retries} retries")
+                backoff(attempt)
+                attempt += 1
+    return found
+
+
+def batch_write_items(items, name=None, max_retries=BATCH_MAX_RETRIES):
+    """
+    Put ``items`` with BatchWriteItem in chunks of 25, retrying unprocessed
+    items with backoff. Writes are unconditional.
+    """
+    name = name or table_name()
+    resource = get_resource()
+    for start in range(0, len(items), BATCH_WRITE_LIMIT):
+        request = {name: [
+            {'PutRequest': {'Item': item}}
+            for item in items[start:start + BATCH_WRITE_LIMIT]
+        ]}
+        attempt = 0
+        while request:
+            response = resource.batch_write_item(RequestItems=request)
+            request = response.get('UnprocessedItems') or {}
+            if request:
+                if attempt >= max_retries:
+                    raise RuntimeError(f"BatchWriteItem left items unprocessed after {max_retries} retries")
+                backoff(attempt)
+                attempt += 1
+
+
+def scan_segment(segment, total_segments, on_page, name=None, **scan_kwargs):
+    """
+    Page through one segment of a parallel Scan, calling ``on_page(items)``
+    for each page. Returns the number of items seen.
+    """
+    table = get_table(name)
+    kwargs = dict(scan_kwargs, Segment=segment, TotalSegments=total_segments)
+    seen = 0
+    while True:
+        response = table.scan(**kwargs)
+        items = response.get('Items', [])
+        seen += len(items)
+        on_page(items)
+        last_key = response.get('LastEvaluatedKey')
+        if not last_key:
+            return seen
+        kwargs['ExclusiveStartKey'] = last_key
+
+
+def parallel_scan(on_page, segments=4, name=None, **scan_kwargs):
+    """
+    Scan the whole table with ``segments`` concurrent workers; ``on_page`` is
+    called from worker threads and must be thread-safe. Extra keyword
+    arguments (ProjectionExpression, FilterExpression, ...) are passed to
+    every Scan call. Returns the total number of items seen.
+    """
+    segments = max(1, segments)
+    with ThreadPoolExecutor(max_workers=segments, thread_name_prefix='scan') as executor:
+        futures = [
+            executor.submit(scan_segment, segment, segments, on_page, name, **scan_kwargs)
+            for segment in range(segments)
+        ]
+        return sum(future.result() for future in futures)
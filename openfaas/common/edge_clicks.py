@@ -0,0 +1,207 @@
+"""
+Click counting for redirects answered by the edge cache.
+
+When Caddy serves a redirect from its response cache the request never
+reaches redirect-handler.py, but Caddy still writes it to its JSON access
+log. AccessLogTailer follows that log and calls ``on_hit(hash)`` for every
+GET of a short hash that was answered with a redirect and marked as a cache
+hit in its Cache-Status header. Misses are forwarded to redirect-handler,
+which counts them itself, so nothing is counted twice (apart from the
+occasional background revalidation of a stale entry).
+
+The read position (file inode and offset) is saved every
+CHECKPOINT_INTERVAL seconds, so a restart resumes where it left off. Without
+a saved position tailing starts at the end of the file rather than counting
+old traffic again. When Caddy rolls the log, the rest of the old file is
+read before switching to the new one.
+"""
+
+import atexit
+import json
+import os
+import re
+import threading
+import time
+
+from common.redirect_policy import REDIRECT_STATUSES
+
+POLL_INTERVAL = float(os.getenv('EDGE_LOG_POLL_INTERVAL', '1'))
+CHECKPOINT_INTERVAL = float(os.getenv('EDGE_LOG_CHECKPOINT_INTERVAL', '10'))
+
+HASH_PATH = re.compile(r'^/([a-f0-9]{8})(?:\?.*)?$')
+# RFC 9211 Cache-Status, e.g. "Souin; hit; ttl=120; key=..."
+CACHE_HIT = re.compile(r';\s*hit\b')
+
+
+def parse_hit(line):
+    """The hash of a redirect the edge cache served itself, or None"""
+    try:
+        entry = json.loads(line)
+    except ValueError:
+        return None
+    if not isinstance(entry, dict) or entry.get('status') not in REDIRECT_STATUSES:
+        return None
+    request = entry.get('request') or {}
+    if request.get('method') != 'GET':
+        return None
+    match = HASH_PATH.match(request.get('uri', ''))
+    if match is None:
+        return None
+    cache_status = (entry.get('resp_headers') or {}).get('Cache-Status') or []
+    if not any(CACHE_HIT.search(value) for value in cache_status):
+        return None
+    return match.group(1)
+
+
+class AccessLogTailer:
+    """Follows a Caddy JSON access log and reports edge cache hits"""
+
+    def __init__(self, path, on_hit, state_path=None, poll_interval=POLL_INTERVAL,
+                 checkpoint_interval=CHECKPOINT_INTERVAL, log=None):
+        self.path = path
+        self.on_hit = on_hit
+        self.state_path = state_path
+        self.poll_interval = poll_interval
+        self.checkpoint_interval = checkpoint_interval
+        self.log = log
+        self.file = None
+        self.resume = True
+        self.inode = None
+        self.offset = 0
+        self.partial = b''
+        self.lines = 0
+        self.hits = 0
+        self.errors = 0
+        self.rotations = 0
+        self.last_checkpoint = time.monotonic()
+        self.thread = None
+        self.lock = threading.Lock()
+
+    def start(self):
+        with self.lock:
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._run, name='edge-clicks', daemon=True)
+                self.thread.start()
+                atexit.register(self.checkpoint)
+
+    def _load_state(self):
+        if not self.state_path:
+            return None
+        try:
+            with open(self.state_path) as f:
+                state = json.load(f)
+            return int(state['inode']), int(state['offset'])
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            if self.log:
+                self.log("WARN", "Could not read edge log position", path=self.state_path, error=str(e))
+            return None
+
+    def checkpoint(self):
+        """Save the position of the last complete line read"""
+        self.last_checkpoint = time.monotonic()
+        if not self.state_path or self.inode is None:
+            return
+        tmp_path = f"{self.state_path}.tmp"
+        try:
+            os.makedirs(os.path.dirname(os.path.abspath(self.state_path)), exist_ok=True)
+            with open(tmp_path, 'w') as f:
+                json.dump({"inode": self.inode, "offset": self.offset - len(self.partial)}, f)
+            os.replace(tmp_path, self.state_path)
+        except OSError as e:
+            if self.log:
+                self.log("WARN", "Could not save edge log position", path=self.state_path, error=str(e))
+
+    def _open(self):
+        """Open the log; returns False if it does not exist yet"""
+        try:
+            f = open(self.path, 'rb')
+        except FileNotFoundError:
+            # Whatever appears later is new traffic
+            self.resume = False
+            return False
+        stat = os.fstat(f.fileno())
+        state = self._load_state() if self.resume else None
+        if state is not None and state[0] == stat.st_ino and state[1] <= stat.st_size:
+            offset = state[1]
+        elif self.resume and state is None:
+            # First start: only count traffic from now on
+            offset = stat.st_size
+        else:
+            # A file created or rolled since the last checkpoint: read it all
+            offset = 0
+        self.resume = False
+        f.seek(offset)
+        self.file, self.inode, self.offset, self.partial = f, stat.st_ino, offset, b''
+        return True
+
+    def _rotated(self):
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return False
+        return stat.st_ino != self.inode or stat.st_size < self.offset
+
+    def read_available(self):
+        """Process every complete line written since the last call; returns the hits found"""
+        data = self.file.read()
+        if not data:
+            return 0
+        self.offset += len(data)
+        lines = (self.partial + data).split(b'\n')
+        self.partial = lines.pop()
+        hits = 0
+        for line in lines:
+            if not line.strip():
+                continue
+            self.lines += 1
+            url_hash = parse_hit(line)
+            if url_hash is None:
+                continue
+            try:
+                self.on_hit(url_hash)
+                hits += 1
+            except Exception as e:
+                self.errors += 1
+                if self.log:
+                    self.log("ERROR", "Edge click not recorded", hash=url_hash, error=str(e))
+        self.hits += hits
+        return hits
+
+    def poll(self):
+        """One pass: read new lines, follow a rolled log, checkpoint when due"""
+        if self.file is None and not self._open():
+            return
+        self.read_available()
+        if self._rotated():
+            # Finish the old file, then start the new one from the top
+            self.read_available()
+            self.file.close()
+            self.file = None
+            self.rotations += 1
+            if self._open():
+                self.checkpoint()
+        elif time.monotonic() - self.last_checkpoint >= self.checkpoint_interval:
+            self.checkpoint()
+
+    def _run(self):
+        while True:
+            try:
+                self.poll()
+            except Exception as e:
+                self.errors += 1
+                if self.log:
+                    self.log("ERROR", "Edge log tailer error", path=self.path, error=str(e))
+            time.sleep(self.poll_interval)
+
+    def stats(self):
+        return {
+            "path": self.path,
+            "inode": self.inode,
+            "offset": self.offset,
+            "lines": self.lines,
+            "hits": self.hits,
+            "errors": self.errors,
+            "rotations": self.rotations
+        }
@@ -0,0 +1,87 @@
+"""
+Optional link expiry.
+
+A link created with a TTL stores ``expires_at`` (epoch seconds, the same
+attribute the DynamoDB TTL setting in init-table.sh watches). From that
+moment redirect-url and redirect-handler.py answer 410 Gone, and the
+sweeper (common.storage.sweep) deletes the item on its next pass.
+
+Shorten requests may carry either field:
+
+    "ttl": 86400                            seconds from now
+    "expires_at": 1798761600                epoch seconds
+    "expires_at": "2027-01-01T00:00:00Z"    ISO 8601 (UTC unless an offset is given)
+
+LINK_DEFAULT_TTL applies to requests without either (0: links never
+expire) and LINK_MAX_TTL caps what a request may ask for (0: no cap).
+"""
+
+import os
+import time
+from datetime import datetime, timezone
+
+DEFAULT_TTL = int(os.getenv('LINK_DEFAULT_TTL', '0'))
+MAX_TTL = int(os.getenv('LINK_MAX_TTL', '0'))
+
+
+def _parse_time(value):
+    if isinstance(value, bool):
+        raise ValueError("expires_at must be epoch seconds or an ISO 8601 timestamp")
+    if isinstance(value, (int, float)):
+        return int(value)
+    if isinstance(value, str):
+        try:
+            parsed = datetime.fromisoformat(value.strip().replace('Z', '+00:00'))
+        except ValueError:
+            raise ValueError("expires_at must be epoch seconds or an ISO 8601 timestamp")
+        if parsed.tzinfo is None:
+            parsed = parsed.replace(tzinfo=timezone.utc)
+        return int(parsed.timestamp())
+    raise ValueError("expires_at must be epoch seconds or an ISO 8601 timestamp")
+
+
+def requested_expiry(data, now=None):
+    """
+    The expires_at a shorten request asks for (``ttl`` or ``expires_at``),
+    falling back to LINK_DEFAULT_TTL. Returns None for a link that never
+    expires; raises ValueError for an invalid or out-of-range value.
+    """
+    now = int(now if now is not None else time.time())
+    data = data if isinstance(data, dict) else {}
+    if data.get('ttl') is not None and data.get('expires_at') is not None:
+        raise ValueError("Give either ttl or expires_at, not both")
+    if data.get('ttl') is not None:
+        ttl = data['ttl']
+        if isinstance(ttl, bool) or not isinstance(ttl, (int, float)) or ttl <= 0:
+            raise ValueError("ttl must be a positive number of seconds")
+        expires_at = now + int(ttl)
+    elif data.get('expires_at') is not None:
+        expires_at = _parse_time(data['expires_at'])
+        if expires_at <= now:
+            raise ValueError("expires_at must be in the future")
+    elif DEFAULT_TTL > 0:
+        expires_at = now + DEFAULT_TTL
+    else:
+        return None
+    if MAX_TTL > 0 and expires_at > now + MAX_TTL:
+        raise ValueError(f"Links may live at most {MAX_TTL} seconds")
+    return expires_at
+
+
+def expires_at(item):
+    """The item's expiry as epoch seconds, or None if it never expires"""
+    value = item.get('expires_at') if item else None
+    return int(value) if value is not None else None
+
+
+def is_expired(item, now=None):
+    value = expires_at(item)
+    return value is not None and value <= (now if now is not None else time.time())
+
+
+def outlives(item, wanted):
+    """Whether ``item`` lives at least as long as an expiry of ``wanted`` (None: forever)"""
+    current = expires_at(item)
+    if current is None:
+        return True
+    return wanted is not None and current >= wanted
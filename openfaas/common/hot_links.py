@@ -0,0 +1,208 @@
+"""
+Constant-memory tracking of the most-clicked hashes.
+
+SpaceSaving keeps at most ``capacity`` counters. A hash that is already
+tracked is incremented; a new hash replaces the one with the smallest count
+and inherits that count (plus one), recording it as ``error``, the amount
+by which the estimate may overcount. Any hash with more than N/capacity of
+the N recorded clicks is guaranteed to be tracked. Counters are grouped by
+count (the "stream summary" layout), so every update is O(1).
+
+HotLinks wraps a tracker for a redirect server: counts are halved every
+HOT_LINKS_DECAY_INTERVAL seconds so the list follows current traffic, and
+the top entries are written to a JSON snapshot every HOT_LINKS_SNAPSHOT_INTERVAL
+seconds (and at exit). The next process reads the snapshot at start to
+pre-warm its cache and connection pools before taking traffic.
+"""
+
+import atexit
+import json
+import os
+import threading
+import time
+
+HOT_LINKS_K = int(os.getenv('HOT_LINKS_K', '1000'))
+SNAPSHOT_INTERVAL = float(os.getenv('HOT_LINKS_SNAPSHOT_INTERVAL', '60'))
+DECAY_INTERVAL = float(os.getenv('HOT_LINKS_DECAY_INTERVAL', '3600'))
+
+
+class SpaceSaving:
+    """Top-K heavy hitters in O(capacity) memory"""
+
+    def __init__(self, capacity):
+        self.capacity = max(1, capacity)
+        self.counters = {}   # key -> [count, error]
+        self.buckets = {}    # count -> {key: None}, insertion-ordered
+        self.min_count = 0
+        self.total = 0
+        self.lock = threading.Lock()
+
+    def _move(self, key, old, new):
+        if old:
+            bucket = self.buckets[old]
+            del bucket[key]
+            if not bucket:
+                del self.buckets[old]
+                if self.min_count == old:
+                    self.min_count = new
+        self.buckets.setdefault(new, {})[key] = None
+
+    def add(self, key):
+        with self.lock:
+            self.total += 1
+            counter = self.counters.get(key)
+            if counter is not None:
+                counter[0] += 1
+                self._move(key, counter[0] - 1, counter[0])
+                return
+            if len(self.counters) < self.capacity:
+                self.counters[key] = [1, 0]
+                self._move(key, 0, 1)
+                self.min_count = 1
+                return
+            # Replace the oldest of the least-counted keys
+            floor = self.min_count
+            bucket = self.buckets[floor]
+            victim = next(iter(bucket))
+            del self.counters[victim]
+            self.counters[key] = [floor + 1, floor]
+            del bucket[victim]
+            if not bucket:
+                del self.buckets[floor]
+                self.min_count = floor + 1
+            self.buckets.setdefault(floor + 1, {})[key] = None
+
+    def top(self, limit=None):
+        """[(key, count, error)] by descending count"""
+        with self.lock:
+            ranked = sorted(self.counters.items(), key=lambda entry: -entry[1][0])
+        if limit is not None:
+            ranked = ranked[:limit]
+        return [(key, count, error) for key, (count, error) in ranked]
+
+    def _replace(self, counters):
+        self.counters = counters
+        self.buckets = {}
+        for key, (count, _) in sorted(counters.items(), key=lambda entry: entry[1][0]):
+            self.buckets.setdefault(count, {})[key] = None
+        self.min_count = min(self.buckets) if self.buckets else 0
+
+    def decay(self):
+        """Halve every count (dropping those that reach zero) so old traffic fades"""
+        with self.lock:
+            self.total //= 2
+            self._replace({
+                key: [count // 2, error // 2]
+                for key, (count, error) in self.counters.items() if count // 2 > 0
+            })
+
+    def restore(self, entries):
+        """Start from saved (key, count, error) entries instead of empty counters"""
+        entries = sorted(entries, key=lambda entry: -entry[1])[:self.capacity]
+        with self.lock:
+            self.total = sum(count for _, count, _ in entries)
+            self._replace({key: [count, error] for key, count, error in entries if count > 0})
+
+    def __len__(self):
+        return len(self.counters)
+
+
+class HotLinks:
+    """
+    A SpaceSaving tracker with periodic decay and an on-disk snapshot.
+    ``locate(hash)`` is called when saving and may return fields to keep
+    with the entry (e.g. its location and expires_at) so a new process can
+    fill its cache without a lookup.
+    """
+
+    def __init__(self, path=None, capacity=HOT_LINKS_K, snapshot_interval=SNAPSHOT_INTERVAL,
+                 decay_interval=DECAY_INTERVAL, locate=None, log=None):
+        self.path = path
+        self.tracker = SpaceSaving(capacity)
+        self.snapshot_interval = snapshot_interval
+        self.decay_interval = decay_interval
+        self.locate = locate
+        self.log = log
+        self.last_snapshot = None
+        self.last_decay = time.monotonic()
+        self.thread = None
+        self.lock = threading.Lock()
+
+    def record(self, url_hash):
+        self.tracker.add(url_hash)
+
+    def top(self, limit=None):
+        return [
+            {"hash": url_hash, "count": count, "error": error}
+            for url_hash, count, error in self.tracker.top(limit)
+        ]
+
+    def stats(self, limit=100):
+        return {
+            "capacity": self.tracker.capacity,
+            "tracked": len(self.tracker),
+            "total": self.tracker.total,
+            "snapshot_path": self.path,
+            "last_snapshot": self.last_snapshot,
+            "top": self.top(limit)
+        }
+
+    def load(self):
+        """
+        Read the saved snapshot and resume counting from it, so the next
+        snapshot does not forget links that were hot before the restart.
+        Returns its entries (hottest first), or [] if there is none.
+        """
+        if not self.path:
+            return []
+        try:
+            with open(self.path) as f:
+                items = json.load(f).get('items', [])
+            self.tracker.restore(
+                (item['hash'], int(item.get('count', 0)), int(item.get('error', 0))) for item in items
+            )
+            return items
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            if not isinstance(e, FileNotFoundError) and self.log:
+                self.log("WARN", "Could not read hot-link snapshot", path=self.path, error=str(e))
+            return []
+
+    def save(self):
+        if not self.path:
+            return
+        items = self.top()
+        if self.locate is not None:
+            for item in items:
+                fields = self.locate(item['hash'])
+                if fields:
+                    item.update(fields)
+        snapshot = {"saved_at": time.time(), "total": self.tracker.total, "items": items}
+        tmp_path = f"{self.path}.tmp"
+        try:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            with open(tmp_path, 'w') as f:
+                json.dump(snapshot, f, separators=(',', ':'))
+            os.replace(tmp_path, self.path)
+            self.last_snapshot = snapshot['saved_at']
+        except OSError as e:
+            if self.log:
+                self.log("WARN", "Could not save hot-link snapshot", path=self.path, error=str(e))
+
+    def start(self):
+        with self.lock:
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._run, name='hot-links', daemon=True)
+                self.thread.start()
+                atexit.register(self.save)
+
+    def _run(self):
+        while True:
+            time.sleep(self.snapshot_interval)
+            try:
+                if time.monotonic() - self.last_decay >= self.decay_interval:
+                    self.tracker.decay()
+                    self.last_decay = time.monotonic()
+                self.save()
+            except Exception as e:
+                if self.log:
+                    self.log("ERROR", "Hot-link snapshot failed", error=str(e))
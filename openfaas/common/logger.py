@@ -0,0 +1,177 @@
+"""
+Asynchronous structured logger shared by the OpenFaaS functions.
+
+Callers only check the level, sample, and enqueue a tuple; timestamp
+formatting, JSON encoding and the stderr write happen on a background thread
+that drains the queue in batches (one write + flush per batch).
+
+Configuration (environment):
+    LOG_LEVEL                   minimum level written: DEBUG, INFO, WARN, ERROR (default INFO)
+    LOG_LEVEL_<FUNCTION>        the same for one function, e.g. LOG_LEVEL_REDIRECT_URL=DEBUG
+    LOG_HOT_SAMPLE_RATE         fraction of INFO/DEBUG lines marked hot=True that are kept (default 1.0)
+    LOG_HOT_SAMPLE_RATE_<LEVEL> the same for one level, e.g. LOG_HOT_SAMPLE_RATE_DEBUG=0
+    LOG_SAMPLE_RATES            per-message rates for hot lines, "message=rate;message=rate",
+                                e.g. "Received hash=0.001;URL found=0.01"
+    LOG_QUEUE_SIZE              bounded queue length; records beyond it are dropped and counted
+    LOG_BATCH_SIZE              max records per write
+    LOG_FLUSH_INTERVAL          max seconds a record waits before being written
+
+A hot line's rate is the first of: its LOG_SAMPLE_RATES entry, the
+``sample_rate`` given at the call site, its level's rate. WARN and ERROR
+lines are never sampled, and when the queue is full they are written
+synchronously instead of being dropped.
+
+    log = get_logger("redirect-url")
+    log("INFO", "Received hash", hot=True, hash=url_hash)
+    log("INFO", "Query string", hot=True, sample_rate=0.001, query=query_string)
+"""
+
+import atexit
+import json
+import os
+import queue
+import random
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+
+LEVELS = {"DEBUG": 10, "INFO": 20, "WARN": 30, "WARNING": 30, "ERROR": 40}
+
+
+def _parse_rates(value):
+    """"message=rate;message=rate" -> {message: rate}; malformed entries are ignored"""
+    rates = {}
+    for entry in value.split(';'):
+        message, sep, rate = entry.rpartition('=')
+        if not sep or not message.strip():
+            continue
+        try:
+            rates[message.strip()] = float(rate)
+        except ValueError:
+            pass
+    return rates
+
+
+class Logger:
+    def __init__(self, function, stream=None):
+        self.function = function
+        self.stream = stream or sys.stderr
+        level = os.getenv('LOG_LEVEL_' + function.upper().replace('-', '_')) or os.getenv('LOG_LEVEL', 'INFO')
+        self.threshold = LEVELS.get(level.upper(), LEVELS["INFO"])
+        hot_sample_rate = os.getenv('LOG_HOT_SAMPLE_RATE', '1.0')
+        self.level_rates = {level: float(os.getenv(f'LOG_HOT_SAMPLE_RATE_{level}', hot_sample_rate))
+                            for level in ("DEBUG", "INFO")}
+        self.message_rates = _parse_rates(os.getenv('LOG_SAMPLE_RATES', ''))
+        self.batch_size = int(os.getenv('LOG_BATCH_SIZE', '256'))
+        self.flush_interval = float(os.getenv('LOG_FLUSH_INTERVAL', '0.5'))
+        self.queue = queue.Queue(maxsize=int(os.getenv('LOG_QUEUE_SIZE', '10000')))
+        self.lock = threading.Lock()
+        self.thread = None
+        self.pid = None
+        self.dropped = 0
+        self.sampled_out = 0
+        self.written = 0
+
+    def __call__(self, level, message, hot=False, sample_rate=None, **kwargs):
+        severity = LEVELS.get(level, LEVELS["INFO"])
+        if severity < self.threshold:
+            return
+        if hot and severity < LEVELS["WARN"]:
+            rate = self.message_rates.get(message)
+            if rate is None:
+                rate = sample_rate if sample_rate is not None else self.level_rates.get(level, 1.0)
+            if rate < 1.0 and random.random() >= rate:
+                self.sampled_out += 1
+                return
+
+        record = (time.time(), level, message, kwargs)
+        if self.thread is None or self.pid != os.getpid():
+            self._start()
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            if severity >= LEVELS["WARN"]:
+                self._write([record])
+            else:
+                self.dropped += 1
+
+    def _start(self):
+        with self.lock:
+            # Also restarts the writer in a forked child, which inherits no threads
+            if self.thread is not None and self.pid == os.getpid():
+                return
+            first_start = self.thread is None
+            self.pid = os.getpid()
+            self.thread = threading.Thread(target=self._run, name='log-writer', daemon=True)
+            self.thread.start()
+            if first_start:
+                atexit.register(self.flush)
+
+    def _format(self, record):
+        timestamp, level, message, kwargs = record
+        log_data = {
+            "timestamp": datetime.fromtimestamp(timestamp, timezone.utc).isoformat(),
+            "level": level,
+            "function": self.function,
+            "message": message,
+            **kwargs
+        }
+        return json.dumps(log_data, default=str)
+
+    def _write(self, records):
+        with self.lock:
+            try:
+                self.stream.write("".join(self._format(record) + "\n" for record in records))
+                self.stream.flush()
+                self.written += len(records)
+            except (OSError, ValueError):
+                pass
+
+    def _drain(self, first=None):
+        batch = [] if first is None else [first]
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(self.queue.get_nowait())
+            except queue.Empty:
+                break
+        if batch:
+            self._write(batch)
+        return len(batch)
+
+    def _run(self):
+        reported_drops = 0
+        while True:
+            try:
+                first = self.queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                first = None
+            self._drain(first)
+            if self.dropped != reported_drops:
+                reported_drops = self.dropped
+                self._write([(time.time(), "WARN", "Log records dropped, queue full",
+                              {"dropped_total": reported_drops})])
+
+    def flush(self):
+        """Write everything still queued (called at exit)"""
+        while self._drain():
+            pass
+
+    def stats(self):
+        return {
+            "queued": self.queue.qsize(),
+            "written": self.written,
+            "dropped": self.dropped,
+            "sampled_out": self.sampled_out
+        }
+
+
+_loggers = {}
+
+
+def get_logger(function):
+    """Return the process-wide logger for ``function``"""
+    logger = _loggers.get(function)
+    if logger is None:
+        logger = _loggers.setdefault(function, Logger(function))
+    return logger
@@ -0,0 +1,261 @@
+"""
+Minimal in-process metrics with Prometheus text exposition.
+
+Histograms preallocate their bucket counters and observe() only does a
+bisect and a few integer/float updates under a lock, so timers are cheap
+enough to leave on for every request:
+
+    start = time.perf_counter()
+    item = table.get_item(...)
+    GET_ITEM.observe(time.perf_counter() - start)
+
+Metrics are per process. With several worker processes behind one port
+(gunicorn) set METRICS_MULTIPROC_DIR to a directory shared by them and
+cleared before they start: every process then writes its samples there
+every METRICS_SNAPSHOT_INTERVAL seconds (and at exit), and render() in any
+worker returns the sum over all of them. Counters and histograms of exited
+workers keep counting towards the total; gauges get a ``pid`` label and
+are dropped once their process is gone.
+"""
+
+import atexit
+import glob
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# Seconds; covers sub-millisecond cache hits up to multi-second timeouts
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{key}="{value}"' for key, value in labels.items()) + '}'
+
+
+def _format_value(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+MULTIPROC_DIR = os.getenv('METRICS_MULTIPROC_DIR', '')
+SNAPSHOT_INTERVAL = float(os.getenv('METRICS_SNAPSHOT_INTERVAL', '1'))
+
+
+def _parse_value(text):
+    try:
+        return int(text)
+    except ValueError:
+        return float(text)
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def clear_multiproc_dir(path=None):
+    """Remove old snapshots; call once before the worker processes start"""
+    for snapshot in glob.glob(os.path.join(path or MULTIPROC_DIR, '*.json')):
+        try:
+            os.remove(snapshot)
+        except OSError:
+            pass
+
+
+class Registry:
+    def __init__(self, multiproc_dir=MULTIPROC_DIR, snapshot_interval=SNAPSHOT_INTERVAL):
+        self.metrics = []
+        self.lock = threading.Lock()
+        self.multiproc_dir = multiproc_dir
+        self.snapshot_interval = snapshot_interval
+        self.writer = None
+        self.writer_pid = None
+
+    def register(self, metric):
+        with self.lock:
+            self.metrics.append(metric)
+        if self.multiproc_dir:
+            self._start_writer()
+
+    def _families(self):
+        """[(name, help, kind, [sample lines])] with one entry per metric name"""
+        families = {}
+        with self.lock:
+            metrics = list(self.metrics)
+        for metric in metrics:
+            family = families.setdefault(metric.name, (metric.name, metric.help, metric.kind, []))
+            family[3].extend(metric.samples())
+        return list(families.values())
+
+    def render(self):
+        """Prometheus text format; metrics sharing a name share HELP/TYPE lines"""
+        if self.multiproc_dir:
+            return self._render_multiproc()
+        lines = []
+        for name, help, kind, samples in self._families():
+            lines.append(f'# HELP {name} {help}')
+            lines.append(f'# TYPE {name} {kind}')
+            lines.extend(samples)
+        return '\n'.join(lines) + '\n'
+
+    def _start_writer(self):
+        with self.lock:
+            # Also restarts the writer in a forked child, which inherits no threads
+            if self.writer is not None and self.writer_pid == os.getpid():
+                return
+            first_start = self.writer is None
+            self.writer_pid = os.getpid()
+            self.writer = threading.Thread(target=self._run_writer, name='metrics-snapshot', daemon=True)
+            self.writer.start()
+            if first_start:
+                atexit.register(self.write_snapshot)
+
+    def _run_writer(self):
+        while True:
+            time.sleep(self.snapshot_interval)
+            self.write_snapshot()
+
+    def write_snapshot(self):
+        """Write this process's samples to <dir>/<pid>.json"""
+        pid = os.getpid()
+        families = []
+        for name, help, kind, samples in self._families():
+            if kind == 'gauge':
+                # "name{labels} value" -> "name{labels,pid="..."} value"
+                samples = [
+                    line.replace('} ', f',pid="{pid}"}} ', 1) if '} ' in line else line.replace(' ', f'{{pid="{pid}"}} ', 1)
+                    for line in samples
+                ]
+            families.append([name, help, kind, samples])
+        path = os.path.join(self.multiproc_dir, f'{pid}.json')
+        try:
+            os.makedirs(self.multiproc_dir, exist_ok=True)
+            with open(f'{path}.tmp', 'w') as f:
+                json.dump({"pid": pid, "families": families}, f)
+            os.replace(f'{path}.tmp', path)
+        except OSError:
+            pass
+
+    def _render_multiproc(self):
+        self._start_writer()
+        self.write_snapshot()
+        merged = {}
+        for path in sorted(glob.glob(os.path.join(self.multiproc_dir, '*.json'))):
+            try:
+                with open(path) as f:
+                    snapshot = json.load(f)
+            except (OSError, ValueError):
+                continue
+            alive = snapshot.get('pid') == os.getpid() or _pid_alive(snapshot.get('pid', 0))
+            for name, help, kind, samples in snapshot.get('families', []):
+                if kind == 'gauge' and not alive:
+                    continue
+                family = merged.setdefault(name, (help, kind, {}))
+                values = family[2]
+                for line in samples:
+                    key, _, value = line.rpartition(' ')
+                    values[key] = values.get(key, 0) + _parse_value(value)
+        lines = []
+        for name, (help, kind, values) in merged.items():
+            lines.append(f'# HELP {name} {help}')
+            lines.append(f'# TYPE {name} {kind}')
+            lines.extend(f'{key} {_format_value(value)}' for key, value in values.items())
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+
+
+class Histogram:
+    kind = 'histogram'
+
+    def __init__(self, name, help, labels=None, buckets=DEFAULT_BUCKETS, registry=REGISTRY):
+        self.name = name
+        self.help = help
+        self.labels = dict(labels or {})
+        self.bounds = tuple(buckets)
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self.lock = threading.Lock()
+        registry.register(self)
+
+    def observe(self, value):
+        index = bisect_left(self.bounds, value)
+        with self.lock:
+            self.counts[index] += 1
+            self.sum += value
+            self.count += 1
+
+    def samples(self):
+        with self.lock:
+            counts = list(self.counts)
+            total, count = self.sum, self.count
+        lines = []
+        cumulative = 0
+        for bound, bucket_count in zip(self.bounds + (float('inf'),), counts):
+            cumulative += bucket_count
+            le = '+Inf' if bound == float('inf') else repr(bound)
+            lines.append(f'{self.name}_bucket{_format_labels({**self.labels, "le": le})} {cumulative}')
+        lines.append(f'{self.name}_sum{_format_labels(self.labels)} {_format_value(total)}')
+        lines.append(f'{self.name}_count{_format_labels(self.labels)} {count}')
+        return lines
+
+
+class Counter:
+    """A counter with at most one label; inc(value) counts under that label value"""
+
+    kind = 'counter'
+
+    def __init__(self, name, help, label=None, registry=REGISTRY):
+        self.name = name
+        self.help = help
+        self.label = label
+        self.values = {}
+        self.lock = threading.Lock()
+        registry.register(self)
+
+    def inc(self, label_value=None, amount=1):
+        with self.lock:
+            self.values[label_value] = self.values.get(label_value, 0) + amount
+
+    def samples(self):
+        with self.lock:
+            values = dict(self.values)
+        if self.label is None:
+            return [f'{self.name} {_format_value(values.get(None, 0))}']
+        return [
+            f'{self.name}{_format_labels({self.label: value})} {_format_value(amount)}'
+            for value, amount in sorted(values.items(), key=lambda kv: str(kv[0]))
+        ]
+
+
+class Gauge:
+    """A value read from a callback at scrape time (e.g. a cache size)"""
+
+    kind = 'gauge'
+
+    def __init__(self, name, help, callback, labels=None, registry=REGISTRY):
+        self.name = name
+        self.help = help
+        self.callback = callback
+        self.labels = dict(labels or {})
+        registry.register(self)
+
+    def samples(self):
+        return [f'{self.name}{_format_labels(self.labels)} {_format_value(self.callback())}']
+
+
+def stage_timers(name, help, stages):
+    """One histogram per stage, sharing a metric name: {stage: Histogram}"""
+    return {stage: Histogram(name, help, labels={'stage': stage}) for stage in stages}
@@ -0,0 +1,136 @@
+"""
+Fire-and-forget announcements of newly created hashes.
+
+redirect-handler.py answers hashes missing from its Bloom filter with a local
+404, so shorten-url pushes every new hash to FILTER_NOTIFY_URL (the handler's
+POST /_admin/filter) instead of waiting for the handler's next catch-up
+scan. Hashes are queued and posted in batches from a background thread.
+
+A failed post is retried FILTER_NOTIFY_RETRIES times. Hashes that are
+still not delivered, or that did not fit in the queue, are counted and
+logged. The notifier then asks the handler for a full filter rebuild
+(FILTER_REBUILD_URL, by default FILTER_NOTIFY_URL + "/rebuild") until the
+handler accepts the request, since the handler's catch-up scan would only
+find those hashes if their created_at is newer than its watermark.
+"""
+
+import os
+import queue
+import threading
+import time
+import urllib.request
+
+NOTIFY_URL = os.getenv('FILTER_NOTIFY_URL', '')
+REBUILD_URL = os.getenv('FILTER_REBUILD_URL', f"{NOTIFY_URL.rstrip('/')}/rebuild" if NOTIFY_URL else '')
+NOTIFY_TIMEOUT = float(os.getenv('FILTER_NOTIFY_TIMEOUT', '2'))
+NOTIFY_RETRIES = int(os.getenv('FILTER_NOTIFY_RETRIES', '2'))
+# How often a pending rebuild request is retried while no hashes arrive
+RESYNC_INTERVAL = float(os.getenv('FILTER_NOTIFY_RESYNC_INTERVAL', '30'))
+NOTIFY_BATCH_SIZE = 1000
+
+
+class HashNotifier:
+    def __init__(self, url=NOTIFY_URL, rebuild_url=REBUILD_URL, log=None):
+        self.url = url
+        self.rebuild_url = rebuild_url
+        self.log = log
+        self.queue = queue.Queue(maxsize=100000)
+        self.lock = threading.Lock()
+        self.thread = None
+        self.pid = None
+        self.sent = 0
+        self.dropped = 0
+        self.failed = 0
+        self.rebuilds_requested = 0
+        # Some hashes never reached the handler; it needs a full rebuild
+        self.resync = False
+
+    def announce(self, hashes):
+        if not self.url:
+            return
+        if self.thread is None or self.pid != os.getpid():
+            self._start()
+        hashes = list(hashes)
+        for index, url_hash in enumerate(hashes):
+            try:
+                self.queue.put_nowait(url_hash)
+            except queue.Full:
+                with self.lock:
+                    self.dropped += len(hashes) - index
+                self.resync = True
+                return
+
+    def _start(self):
+        with self.lock:
+            if self.thread is not None and self.pid == os.getpid():
+                return
+            self.pid = os.getpid()
+            self.thread = threading.Thread(target=self._run, name='hash-notifier', daemon=True)
+            self.thread.start()
+
+    def _post(self, url, body):
+        request = urllib.request.Request(url, data=body, headers={'Content-Type': 'text/plain'}, method='POST')
+        with urllib.request.urlopen(request, timeout=NOTIFY_TIMEOUT) as response:
+            response.read()
+
+    def _send(self, batch):
+        body = "\n".join(batch).encode()
+        for attempt in range(NOTIFY_RETRIES + 1):
+            try:
+                self._post(self.url, body)
+                self.sent += len(batch)
+                return True
+            except Exception as e:
+                error = e
+            if attempt < NOTIFY_RETRIES:
+                time.sleep(0.5 * 2 ** attempt)
+        self.failed += len(batch)
+        self.resync = True
+        if self.log:
+            self.log("WARN", "Hash announcement failed", error=str(error), count=len(batch), failed_total=self.failed)
+        return False
+
+    def _request_rebuild(self):
+        if not self.rebuild_url:
+            self.resync = False
+            return
+        try:
+            self._post(self.rebuild_url, b'')
+        except Exception as e:
+            if self.log:
+                self.log("WARN", "Hash filter rebuild request failed", error=str(e))
+            return
+        self.resync = False
+        self.rebuilds_requested += 1
+        if self.log:
+            self.log("INFO", "Requested hash filter rebuild", dropped_total=self.dropped, failed_total=self.failed)
+
+    def _run(self):
+        reported_drops = 0
+        while True:
+            try:
+                batch = [self.queue.get(timeout=RESYNC_INTERVAL)]
+            except queue.Empty:
+                batch = []
+            while batch and len(batch) < NOTIFY_BATCH_SIZE:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            delivered = self._send(batch) if batch else True
+            if self.dropped != reported_drops:
+                reported_drops = self.dropped
+                if self.log:
+                    self.log("WARN", "Hash announcements dropped, queue full", dropped_total=reported_drops)
+            if self.resync and delivered:
+                self._request_rebuild()
+
+    def stats(self):
+        return {
+            "queued": self.queue.qsize(),
+            "sent": self.sent,
+            "dropped": self.dropped,
+            "failed": self.failed,
+            "rebuilds_requested": self.rebuilds_requested,
+            "resync_pending": self.resync
+        }
@@ -0,0 +1,67 @@
+"""
+Status code and caching headers for short-link redirects.
+
+A mapping never changes once written, so redirects can be cached. By
+default they are not, which keeps every click visible to the redirect path:
+
+    REDIRECT_STATUS                   301, 302, 307 or 308 (default 301)
+    REDIRECT_MAX_AGE                  seconds browsers may reuse the redirect
+    REDIRECT_S_MAXAGE                 seconds shared caches (Caddy) may reuse it
+    REDIRECT_STALE_WHILE_REVALIDATE   seconds a shared cache may serve it stale
+                                      while it fetches a fresh copy
+
+With all three at 0 the response carries ``Cache-Control: no-cache``. A
+redirect reused from a browser cache never reaches the server, so those
+clicks are lost; one served by Caddy is still written to its access log,
+where common.edge_clicks counts it. The usual production setting is
+therefore REDIRECT_MAX_AGE=0 with a non-zero REDIRECT_S_MAXAGE.
+
+A link with an expiry (common.expiry) is never cached past it: every
+lifetime is cut to the seconds it has left and it also gets an Expires header.
+"""
+
+import os
+import time
+from email.utils import formatdate
+
+REDIRECT_STATUSES = (301, 302, 307, 308)
+
+STATUS = int(os.getenv('REDIRECT_STATUS', '301'))
+MAX_AGE = int(os.getenv('REDIRECT_MAX_AGE', '0'))
+S_MAXAGE = int(os.getenv('REDIRECT_S_MAXAGE', '0'))
+STALE_WHILE_REVALIDATE = int(os.getenv('REDIRECT_STALE_WHILE_REVALIDATE', '0'))
+
+if STATUS not in REDIRECT_STATUSES:
+    raise ValueError(f"REDIRECT_STATUS must be one of {', '.join(map(str, REDIRECT_STATUSES))}, not {STATUS}")
+
+
+def cache_control(max_age=None, s_maxage=None, stale_while_revalidate=None):
+    """The Cache-Control value for a redirect; arguments override the environment"""
+    max_age = MAX_AGE if max_age is None else max_age
+    s_maxage = S_MAXAGE if s_maxage is None else s_maxage
+    stale_while_revalidate = STALE_WHILE_REVALIDATE if stale_while_revalidate is None else stale_while_revalidate
+    if max_age <= 0 and s_maxage <= 0:
+        return 'no-cache'
+    parts = ['public', f'max-age={max(max_age, 0)}']
+    if s_maxage > 0:
+        parts.append(f's-maxage={s_maxage}')
+    if stale_while_revalidate > 0:
+        parts.append(f'stale-while-revalidate={stale_while_revalidate}')
+    return ', '.join(parts)
+
+
+CACHE_CONTROL = cache_control()
+
+
+def headers(expires_at=None, now=None):
+    """Headers a redirect response carries besides Location"""
+    if expires_at is None:
+        return {"Cache-Control": CACHE_CONTROL}
+    remaining = max(0, int(expires_at - (now if now is not None else time.time())))
+    s_maxage = min(S_MAXAGE, remaining)
+    # The stale window follows s-maxage, so both together must fit
+    stale = min(STALE_WHILE_REVALIDATE, remaining - s_maxage)
+    return {
+        "Cache-Control": cache_control(min(MAX_AGE, remaining), s_maxage, stale),
+        "Expires": formatdate(expires_at, usegmt=True)
+    }
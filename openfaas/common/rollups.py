@@ -0,0 +1,87 @@
+"""
+Time-bucketed click rollups.
+
+Every click lands in a per-hash minute bucket. When the write-behind
+ClickCounter flushes, each minute bucket is also folded into its hour and
+day buckets, so all three granularities are precomputed and a flush costs
+one counter update per (hash, bucket) rather than one write per click.
+
+Buckets are stored as ``<prefix>#<UTC time>`` keys (``m#2026-10-17T07:08``,
+``h#2026-10-17T07``, ``d#2026-10-17``). The fixed-width timestamps sort
+chronologically, so a series is one range read over at most ``count``
+buckets, whatever the link's total traffic. Each granularity expires after
+its own retention period.
+
+Rollups trail click_count by up to one flush interval; click_count stays
+the authoritative total.
+"""
+
+import os
+import time
+from datetime import datetime, timezone
+
+ENABLED = os.getenv('CLICK_ROLLUPS', 'on').lower() not in ('off', 'false', '0', 'no')
+
+# name: (key prefix, strftime format, bucket seconds, retention seconds)
+GRANULARITIES = {
+    'minute': ('m', '%Y-%m-%dT%H:%M', 60, int(os.getenv('CLICK_ROLLUP_MINUTE_RETENTION', str(2 * 86400)))),
+    'hour': ('h', '%Y-%m-%dT%H', 3600, int(os.getenv('CLICK_ROLLUP_HOUR_RETENTION', str(35 * 86400)))),
+    'day': ('d', '%Y-%m-%d', 86400, int(os.getenv('CLICK_ROLLUP_DAY_RETENTION', str(400 * 86400))))
+}
+
+# Series returned by summary(): granularity -> number of buckets
+SUMMARY_SERIES = (('minute', 60), ('hour', 24), ('day', 30))
+
+
+def minute_of(timestamp=None):
+    """The minute bucket (epoch minutes) a click at ``timestamp`` falls in"""
+    return int(timestamp if timestamp is not None else time.time()) // 60
+
+
+def bucket_key(granularity, timestamp):
+    prefix, fmt, _, _ = GRANULARITIES[granularity]
+    return f"{prefix}#{datetime.fromtimestamp(timestamp, timezone.utc).strftime(fmt)}"
+
+
+def expand(minute_counts):
+    """
+    Fold ``{(hash, epoch_minute): count}`` into every granularity. Returns
+    (hash, bucket, count, expires_at) rows, one per distinct bucket.
+    """
+    totals = {}
+    for (url_hash, minute), count in minute_counts.items():
+        timestamp = minute * 60
+        for granularity, (_, _, seconds, retention) in GRANULARITIES.items():
+            start = timestamp // seconds * seconds
+            key = (url_hash, bucket_key(granularity, start))
+            if key in totals:
+                totals[key][0] += count
+            else:
+                totals[key] = [count, start + seconds + retention]
+    return [(url_hash, bucket, count, expires_at) for (url_hash, bucket), (count, expires_at) in totals.items()]
+
+
+def series(store, url_hash, granularity, count, now=None):
+    """
+    The last ``count`` buckets of ``granularity`` up to and including the
+    current one, oldest first, as [{"bucket": ..., "clicks": n}]. Buckets
+    with no clicks are filled in with 0.
+    """
+    seconds = GRANULARITIES[granularity][2]
+    last = int(now if now is not None else time.time()) // seconds * seconds
+    keys = [bucket_key(granularity, last - i * seconds) for i in range(count - 1, -1, -1)]
+    found = store.get_rollups(url_hash, keys[0], keys[-1])
+    return [{"bucket": key.split('#', 1)[1], "clicks": int(found.get(key, 0))} for key in keys]
+
+
+def summary(store, url_hash, now=None):
+    """Minute, hour and day series for one hash plus their recent totals"""
+    now = now if now is not None else time.time()
+    result = {
+        granularity + 's': series(store, url_hash, granularity, count, now=now)
+        for granularity, count in SUMMARY_SERIES
+    }
+    result['last_hour'] = sum(bucket['clicks'] for bucket in result['minutes'])
+    result['last_24h'] = sum(bucket['clicks'] for bucket in result['hours'])
+    result['last_30d'] = sum(bucket['clicks'] for bucket in result['days'])
+    return result
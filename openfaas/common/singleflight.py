@@ -0,0 +1,105 @@
+"""
+Single-flight coalescing of concurrent lookups for the same key.
+
+When a link goes viral many threads miss the cache for the same hash at the
+same moment. The first caller (the leader) runs the backend call; callers
+that arrive while it is in flight wait for and share its result, or its
+exception, instead of issuing their own.
+
+Waiters give up after ``timeout`` seconds measured from the start of the
+flight and raise FlightTimeout. An overdue flight is also dropped from the
+table, so new callers start a fresh call rather than join a hung one.
+
+    flights = SingleFlight(timeout=5)
+    item = flights.do(url_hash, lambda: table.get_item(Key={'hash': url_hash}))
+
+do_shared() also tells the caller whether it got a waiter's copy, for work
+the leader's call does as a side effect and each waiter must repeat (e.g.
+counting a click).
+"""
+
+import threading
+import time
+
+
+class FlightTimeout(Exception):
+    """The in-flight call for a key did not finish within the timeout"""
+
+
+class _Flight:
+    __slots__ = ('done', 'started', 'result', 'error')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.started = time.monotonic()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    def __init__(self, timeout=5.0, counter=None):
+        self.timeout = timeout
+        self.counter = counter
+        self.flights = {}
+        self.lock = threading.Lock()
+        self.leaders = 0
+        self.coalesced = 0
+        self.timeouts = 0
+
+    def _count(self, outcome):
+        if self.counter is not None:
+            self.counter.inc(outcome)
+
+    def do(self, key, fn, timeout=None):
+        """Run ``fn()`` for ``key`` unless a call is already in flight; return its result"""
+        return self.do_shared(key, fn, timeout)[0]
+
+    def do_shared(self, key, fn, timeout=None):
+        """Like do(), but returns (result, shared): shared is True for waiters"""
+        timeout = self.timeout if timeout is None else timeout
+        now = time.monotonic()
+        with self.lock:
+            flight = self.flights.get(key)
+            if flight is None or now - flight.started > timeout:
+                flight = _Flight()
+                self.flights[key] = flight
+                leader = True
+                self.leaders += 1
+            else:
+                leader = False
+                self.coalesced += 1
+
+        if leader:
+            self._count("leader")
+            try:
+                flight.result = fn()
+                return flight.result, False
+            except Exception as e:
+                flight.error = e
+                raise
+            finally:
+                with self.lock:
+                    if self.flights.get(key) is flight:
+                        del self.flights[key]
+                flight.done.set()
+
+        self._count("coalesced")
+        if not flight.done.wait(max(0.0, flight.started + timeout - now)):
+            with self.lock:
+                self.timeouts += 1
+                if self.flights.get(key) is flight:
+                    del self.flights[key]
+            self._count("timeout")
+            raise FlightTimeout(f"Lookup for {key} still in flight after {timeout}s")
+        if flight.error is not None:
+            raise flight.error
+        return flight.result, True
+
+    def stats(self):
+        with self.lock:
+            return {
+                "in_flight": len(self.flights),
+                "leaders": self.leaders,
+                "coalesced": self.coalesced,
+                "timeouts": self.timeouts
+            }
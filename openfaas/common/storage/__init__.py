@@ -0,0 +1,142 @@
+"""
+Storage backends for the url_mappings table.
+
+shorten-url, redirect-url and redirect-handler.py talk to a Store rather than
+to boto3 directly. STORAGE_BACKEND selects the implementation:
+
+    dynamodb  DynamoDB / DynamoDB Local through the shared boto3 resource (default)
+    sqlite    an embedded SQLite database in WAL mode at SQLITE_PATH, for
+              single-node deployments without the DynamoDB Local JVM
+
+Items are plain dicts with at least ``hash``, ``original_url``, ``created_at``
+and ``click_count``. Numbers may come back as Decimal (DynamoDB) or int
+(SQLite), so callers convert with int() as before.
+
+Click rollups (common.rollups) live beside the mappings: a second table
+keyed by (hash, bucket), written through add_rollups() and read back with
+get_rollups().
+
+Links may expire: an optional ``expires_at`` (epoch seconds) attribute, see
+common.expiry. Expired items stay readable until the sweeper removes them
+with delete_expired(), so readers check expiry themselves.
+
+Every backend passes ``python3 -m common.storage.conformance``.
+"""
+
+import os
+import threading
+
+_lock = threading.Lock()
+_store = None
+
+
+class StoreError(Exception):
+    """A backend failure; ``code`` carries the backend's error code when there is one"""
+
+    def __init__(self, message, code=None):
+        super().__init__(message)
+        self.code = code
+
+
+class Store:
+    """Interface implemented by every backend"""
+
+    name = None
+
+    def get(self, url_hash):
+        """Return the item for ``url_hash``, or None"""
+        raise NotImplementedError
+
+    def put_if_absent(self, item):
+        """
+        Insert ``item`` unless its hash exists. Returns None when the item
+        was written, otherwise the item already stored under that hash.
+        """
+        raise NotImplementedError
+
+    def add_clicks(self, url_hash, count):
+        """Atomically add ``count`` clicks; returns the new count, or None if the hash does not exist"""
+        raise NotImplementedError
+
+    def batch_get(self, hashes):
+        """Return {hash: item} for the ``hashes`` that exist"""
+        raise NotImplementedError
+
+    def batch_put(self, items):
+        """Write ``items`` unconditionally, overwriting existing hashes"""
+        raise NotImplementedError
+
+    def batch_put_if_absent(self, items):
+        """
+        put_if_absent() for many items. Returns {hash: stored item} for the
+        items that were not written because their hash already existed.
+        """
+        raise NotImplementedError
+
+    def delete(self, url_hash):
+        raise NotImplementedError
+
+    def delete_expired(self, hashes, now):
+        """
+        Delete those of ``hashes`` whose expires_at is <= ``now`` (epoch
+        seconds); items without expires_at, or renewed since they were read,
+        are left alone. Returns the hashes that were deleted.
+        """
+        raise NotImplementedError
+
+    def extend_expiry(self, url_hash, expires_at):
+        """
+        Make an expiring item live until at least ``expires_at``, or forever
+        when it is None. Items that already outlive it are left unchanged.
+        """
+        raise NotImplementedError
+
+    def scan(self, on_page, segments=1, created_since=None, attributes=None, expired_before=None):
+        """
+        Visit every item, calling ``on_page(items)`` per page from up to
+        ``segments`` worker threads. ``created_since`` limits the scan to
+        items with created_at >= that ISO timestamp, ``expired_before`` to
+        items with expires_at <= that epoch time; ``attributes`` limits the
+        attributes returned (``hash`` is always included). Returns the
+        number of items visited.
+        """
+        raise NotImplementedError
+
+    def add_rollups(self, rows):
+        """
+        Add click counts to time buckets (see common.rollups). ``rows`` are
+        (hash, bucket, count, expires_at) tuples; each bucket's counter is
+        created on first use. Returns the rows that were not written, so
+        callers can retry exactly those.
+        """
+        raise NotImplementedError
+
+    def get_rollups(self, url_hash, first_bucket, last_bucket):
+        """Return {bucket: count} for the buckets of ``url_hash`` in [first_bucket, last_bucket]"""
+        raise NotImplementedError
+
+
+def backend_name():
+    return os.getenv('STORAGE_BACKEND', 'dynamodb').lower()
+
+
+def create_store(backend=None):
+    """Build a new store for ``backend`` (default: STORAGE_BACKEND)"""
+    backend = backend or backend_name()
+    if backend == 'dynamodb':
+        from common.storage.dynamodb import DynamoStore
+        return DynamoStore()
+    if backend == 'sqlite':
+        from common.storage.sqlite import SQLiteStore
+        return SQLiteStore()
+    raise ValueError(f"Unknown STORAGE_BACKEND: {backend}")
+
+
+def get_store():
+    """Return the process-wide store, creating it on first use"""
+    global _store
+    if _store is None:
+        with _lock:
+            if _store is None:
+                _store = create_store()
+    return _store
@@ -0,0 +1,276 @@
+"""
+Conformance checks every storage backend must pass.
+
+    python3 -m common.storage.conformance                      # STORAGE_BACKEND, temp SQLite file
+    python3 -m common.storage.conformance --backend dynamodb   # configured DynamoDB table
+    python3 -m common.storage.conformance --backend sqlite --path /tmp/check.db
+
+Run it from openfaas/ (or with openfaas/ on PYTHONPATH). Checks only touch
+hashes under a random ``~conformance-`` prefix and delete them afterwards,
+so it is safe against a live table. Exits non-zero if any check fails.
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+
+from common.storage import create_store
+
+
+def _item(url_hash, url, created_at=None, **extra):
+    item = {
+        'hash': url_hash,
+        'original_url': url,
+        'created_at': created_at or datetime.utcnow().isoformat(),
+        'click_count': 0
+    }
+    item.update(extra)
+    return item
+
+
+class Conformance:
+    def __init__(self, store):
+        self.store = store
+        self.prefix = f"~conformance-{uuid.uuid4().hex[:8]}-"
+        self.created = set()
+        self.failures = []
+
+    def key(self, name):
+        url_hash = self.prefix + name
+        self.created.add(url_hash)
+        return url_hash
+
+    def expect(self, condition, message):
+        if not condition:
+            self.failures.append(message)
+
+    def in_threads(self, target, count=8):
+        """Run ``target(n)`` on ``count`` threads; exceptions become failures"""
+        def run(n):
+            try:
+                target(n)
+            except Exception as e:
+                self.failures.append(f"{target.__name__} raised {type(e).__name__}: {e}")
+
+        threads = [threading.Thread(target=run, args=(n,)) for n in range(count)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    def check_get_missing(self):
+        self.expect(self.store.get(self.key('missing')) is None, "get() of a missing hash should return None")
+
+    def check_put_if_absent(self):
+        url_hash = self.key('put')
+        self.expect(self.store.put_if_absent(_item(url_hash, 'https://a.example')) is None,
+                    "put_if_absent() of a new hash should return None")
+        existing = self.store.put_if_absent(_item(url_hash, 'https://b.example'))
+        self.expect(existing is not None and existing['original_url'] == 'https://a.example',
+                    "put_if_absent() of an existing hash should return the stored item unchanged")
+        stored = self.store.get(url_hash)
+        self.expect(stored is not None and stored['original_url'] == 'https://a.example',
+                    "a failed put_if_absent() must not overwrite the stored item")
+        self.expect(stored is not None and int(stored['click_count']) == 0, "click_count should round-trip as 0")
+
+    def check_extra_attributes(self):
+        url_hash = self.key('extra')
+        self.store.put_if_absent(_item(url_hash, 'https://extra.example', expires_at=1700000000))
+        stored = self.store.get(url_hash) or {}
+        self.expect(int(stored.get('expires_at', 0)) == 1700000000, "extra attributes should round-trip")
+
+    def check_add_clicks(self):
+        url_hash = self.key('clicks')
+        self.store.put_if_absent(_item(url_hash, 'https://clicks.example'))
+        self.expect(self.store.add_clicks(url_hash, 1) == 1, "add_clicks() should return the new count")
+        self.expect(self.store.add_clicks(url_hash, 5) == 6, "add_clicks() should accumulate")
+        self.expect(self.store.add_clicks(self.key('no-such'), 1) is None,
+                    "add_clicks() on a missing hash should return None")
+        self.expect(self.store.get(self.key('no-such')) is None, "add_clicks() must not create items")
+
+    def check_concurrent_clicks(self):
+        url_hash = self.key('concurrent')
+        self.store.put_if_absent(_item(url_hash, 'https://concurrent.example'))
+
+        def click(n):
+            for _ in range(25):
+                self.store.add_clicks(url_hash, 1)
+
+        self.in_threads(click)
+        stored = self.store.get(url_hash) or {}
+        self.expect(int(stored.get('click_count', 0)) == 200, "concurrent add_clicks() should not lose updates")
+
+    def check_concurrent_put_if_absent(self):
+        url_hash = self.key('race')
+        results = []
+
+        def put(n):
+            results.append(self.store.put_if_absent(_item(url_hash, f'https://race.example/{n}')))
+
+        self.in_threads(put)
+        winners = [result for result in results if result is None]
+        self.expect(len(winners) == 1, "exactly one concurrent put_if_absent() should win")
+        stored = (self.store.get(url_hash) or {}).get('original_url')
+        self.expect(all(result['original_url'] == stored for result in results if result is not None),
+                    "losing put_if_absent() calls should all see the winner's item")
+
+    def check_batch(self):
+        items = [_item(self.key(f'batch-{i}'), f'https://batch.example/{i}') for i in range(130)]
+        self.store.batch_put(items)
+        hashes = [item['hash'] for item in items] + [self.key('batch-missing')]
+        found = self.store.batch_get(hashes)
+        self.expect(len(found) == 130, f"batch_get() should find 130 items, found {len(found)}")
+        self.expect(all(found[item['hash']]['original_url'] == item['original_url'] for item in items if item['hash'] in found),
+                    "batch_get() should return the items written by batch_put()")
+        self.store.batch_put([_item(items[0]['hash'], 'https://batch.example/replaced')])
+        self.expect((self.store.get(items[0]['hash']) or {}).get('original_url') == 'https://batch.example/replaced',
+                    "batch_put() should overwrite existing items")
+        self.expect(self.store.batch_get([]) == {}, "batch_get([]) should return {}")
+
+    def check_batch_put_if_absent(self):
+        taken = self.key('absent-taken')
+        self.store.put_if_absent(_item(taken, 'https://absent.example/first'))
+        items = [_item(self.key(f'absent-{i}'), f'https://absent.example/{i}') for i in range(30)]
+        existing = self.store.batch_put_if_absent(items + [_item(taken, 'https://absent.example/second')])
+        self.expect(list(existing) == [taken],
+                    f"batch_put_if_absent() should only report the existing hash, got {sorted(existing)}")
+        self.expect(existing.get(taken, {}).get('original_url') == 'https://absent.example/first',
+                    "batch_put_if_absent() should return the stored item for an existing hash")
+        self.expect((self.store.get(taken) or {}).get('original_url') == 'https://absent.example/first',
+                    "batch_put_if_absent() must not overwrite existing items")
+        found = self.store.batch_get([item['hash'] for item in items])
+        self.expect(len(found) == 30, f"batch_put_if_absent() should write 30 new items, found {len(found)}")
+        self.expect(self.store.batch_put_if_absent([]) == {}, "batch_put_if_absent([]) should return {}")
+
+    def check_scan(self):
+        old = (datetime.utcnow() - timedelta(days=30)).isoformat()
+        since = (datetime.utcnow() - timedelta(days=1)).isoformat()
+        old_hash = self.key('scan-old')
+        new_hash = self.key('scan-new')
+        self.store.batch_put([_item(old_hash, 'https://old.example', created_at=old),
+                              _item(new_hash, 'https://new.example')])
+        for segments in (1, 4):
+            seen = {}
+            lock = threading.Lock()
+
+            def on_page(items):
+                with lock:
+                    for item in items:
+                        seen[item['hash']] = item
+
+            total = self.store.scan(on_page, segments=segments, attributes=('created_at',))
+            self.expect(old_hash in seen and new_hash in seen, f"scan(segments={segments}) should visit every item")
+            self.expect(total == len(seen), f"scan(segments={segments}) should return the number of items visited")
+            self.expect('original_url' not in seen.get(new_hash, {}), "scan(attributes=...) should project attributes")
+            self.expect('created_at' in seen.get(new_hash, {}), "scan(attributes=...) should keep the requested attributes")
+
+            recent = set()
+            self.store.scan(lambda items: recent.update(item['hash'] for item in items),
+                            segments=segments, created_since=since)
+            self.expect(new_hash in recent and old_hash not in recent,
+                        f"scan(segments={segments}, created_since=...) should filter on created_at")
+
+    def check_rollups(self):
+        url_hash = self.key('rollups')
+        expires_at = int(time.time()) + 3600
+        first, second, hour = 'm#2026-01-01T00:00', 'm#2026-01-01T00:01', 'h#2026-01-01T00'
+        failed = self.store.add_rollups([(url_hash, first, 2, expires_at), (url_hash, second, 3, expires_at),
+                                         (url_hash, hour, 5, expires_at)])
+        self.expect(failed == [], "add_rollups() should write every row")
+        self.store.add_rollups([(url_hash, first, 1, expires_at)])
+        found = self.store.get_rollups(url_hash, 'm#2026-01-01T00:00', 'm#2026-01-01T00:59')
+        self.expect({key: int(value) for key, value in found.items()} == {first: 3, second: 3},
+                    "get_rollups() should return the accumulated buckets in range, and only those")
+        self.expect(self.store.get_rollups(self.key('rollups-missing'), 'm#', 'm#~') == {},
+                    "get_rollups() of a hash without clicks should return {}")
+
+        def click(n):
+            for _ in range(10):
+                self.store.add_rollups([(url_hash, hour, 1, expires_at)])
+
+        self.in_threads(click)
+        found = self.store.get_rollups(url_hash, hour, hour)
+        self.expect(int(found.get(hour, 0)) == 85, "concurrent add_rollups() should not lose updates")
+
+    def check_expiry(self):
+        now = int(time.time())
+        expired, live, forever = self.key('expired'), self.key('live'), self.key('forever')
+        self.store.batch_put([_item(expired, 'https://expired.example', expires_at=now - 10),
+                              _item(live, 'https://live.example', expires_at=now + 3600),
+                              _item(forever, 'https://forever.example')])
+        for segments in (1, 4):
+            found = set()
+            self.store.scan(lambda items: found.update(item['hash'] for item in items),
+                            segments=segments, expired_before=now)
+            self.expect(expired in found and live not in found and forever not in found,
+                        f"scan(segments={segments}, expired_before=...) should only visit expired items")
+        deleted = self.store.delete_expired([expired, live, forever, self.key('expiry-missing')], now)
+        self.expect(deleted == [expired], "delete_expired() should delete only the expired items")
+        self.expect(self.store.get(expired) is None, "delete_expired() should remove the item")
+        self.expect(self.store.get(live) is not None and self.store.get(forever) is not None,
+                    "delete_expired() must not touch live items")
+
+        self.store.extend_expiry(live, now + 60)
+        self.expect(int(self.store.get(live)['expires_at']) == now + 3600,
+                    "extend_expiry() must not shorten an item's life")
+        self.store.extend_expiry(live, now + 7200)
+        self.expect(int(self.store.get(live)['expires_at']) == now + 7200, "extend_expiry() should lengthen it")
+        self.store.extend_expiry(live, None)
+        self.expect('expires_at' not in self.store.get(live), "extend_expiry(None) should remove the expiry")
+        self.store.extend_expiry(forever, now + 60)
+        self.expect('expires_at' not in self.store.get(forever), "extend_expiry() must not add an expiry")
+
+    def check_delete(self):
+        url_hash = self.key('delete')
+        self.store.put_if_absent(_item(url_hash, 'https://delete.example'))
+        self.store.delete(url_hash)
+        self.expect(self.store.get(url_hash) is None, "delete() should remove the item")
+        self.store.delete(url_hash)
+
+    def run(self):
+        checks = [getattr(self, name) for name in dir(self) if name.startswith('check_')]
+        try:
+            for check in checks:
+                before = len(self.failures)
+                try:
+                    check()
+                except Exception as e:
+                    self.failures.append(f"{check.__name__} raised {type(e).__name__}: {e}")
+                status = 'ok' if len(self.failures) == before else 'FAIL'
+                print(f"{status:<4} {check.__name__}", file=sys.stderr)
+        finally:
+            for url_hash in self.created:
+                try:
+                    self.store.delete(url_hash)
+                except Exception:
+                    pass
+        return self.failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--backend', default=os.getenv('STORAGE_BACKEND', 'sqlite'))
+    parser.add_argument('--path', help='SQLite database file (default: a temporary file)')
+    args = parser.parse_args()
+
+    if args.backend == 'sqlite':
+        from common.storage.sqlite import SQLiteStore
+        with tempfile.TemporaryDirectory() as tmp:
+            store = SQLiteStore(path=args.path or os.path.join(tmp, 'conformance.db'))
+            failures = Conformance(store).run()
+    else:
+        failures = Conformance(create_store(args.backend)).run()
+
+    for failure in failures:
+        print(f"FAIL: {failure}", file=sys.stderr)
+    print(f"{args.backend}: {'FAILED' if failures else 'passed'} ({len(failures)} failures)")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
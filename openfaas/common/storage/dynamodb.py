@@ -0,0 +1,223 @@
+"""
+DynamoDB backend: the url_mappings table through common.dynamo's shared
+resource. botocore ClientErrors are re-raised as StoreError with the
+DynamoDB error code.
+
+Click rollups live in a second table (DYNAMODB_ROLLUP_TABLE, partition key
+``hash``, sort key ``bucket``, TTL on ``expires_at``). BatchWriteItem cannot
+increment, so add_rollups() issues one ADD per bucket, spread over as many
+threads as the connection pool allows. Conditional deletes of expired
+links (delete_expired) are spread the same way, since BatchWriteItem cannot
+take a condition either.
+"""
+
+import os
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+from boto3.dynamodb.conditions import Key
+from botocore.exceptions import ClientError
+
+from common import dynamo
+from common.storage import Store, StoreError
+
+ROLLUP_WRITERS = int(os.getenv('DYNAMODB_MAX_POOL_CONNECTIONS', '10'))
+
+
+def _error_code(error):
+    return error.response.get('Error', {}).get('Code')
+
+
+@contextmanager
+def _translate_errors():
+    try:
+        yield
+    except ClientError as e:
+        raise StoreError(str(e), code=_error_code(e)) from e
+
+
+class DynamoStore(Store):
+    name = 'dynamodb'
+
+    def __init__(self, table_name=None, table=None, rollup_table_name=None):
+        self.table_name = table_name or dynamo.table_name()
+        self.rollup_table_name = rollup_table_name or dynamo.rollup_table_name()
+        # An explicit table (e.g. the benchmarks' in-memory one) bypasses the factory
+        self._table = table
+
+    @property
+    def table(self):
+        return self._table if self._table is not None else dynamo.get_table(self.table_name)
+
+    def get(self, url_hash):
+        with _translate_errors():
+            return self.table.get_item(Key={'hash': url_hash}).get('Item')
+
+    def put_if_absent(self, item):
+        table = self.table
+        with _translate_errors():
+            while True:
+                try:
+                    table.put_item(
+                        Item=item,
+                        ConditionExpression='attribute_not_exists(#h)',
+                        ExpressionAttributeNames={'#h': 'hash'},
+                        ReturnValuesOnConditionCheckFailure='ALL_OLD'
+                    )
+                    return None
+                except ClientError as e:
+                    if _error_code(e) != 'ConditionalCheckFailedException':
+                        raise
+                    if 'Item' in e.response:
+                        return dynamo.deserialize_item(e.response['Item'])
+                # Older DynamoDB Local versions do not return the item on
+                # failure; if it was deleted in between, try the write again
+                existing = table.get_item(Key={'hash': item['hash']}).get('Item')
+                if existing is not None:
+                    return existing
+
+    def add_clicks(self, url_hash, count):
+        with _translate_errors():
+            try:
+                response = self.table.update_item(
+                    Key={'hash': url_hash},
+                    UpdateExpression='ADD click_count :inc',
+                    ConditionExpression='attribute_exists(#h)',
+                    ExpressionAttributeNames={'#h': 'hash'},
+                    ExpressionAttributeValues={':inc': count},
+                    ReturnValues='UPDATED_NEW'
+                )
+            except ClientError as e:
+                if _error_code(e) == 'ConditionalCheckFailedException':
+                    return None
+                raise
+        return int(response.get('Attributes', {}).get('click_count', 0))
+
+    def batch_get(self, hashes):
+        keys = [{'hash': url_hash} for url_hash in dict.fromkeys(hashes)]
+        with _translate_errors():
+            return dynamo.batch_get_items(keys, name=self.table_name)
+
+    def batch_put(self, items):
+        with _translate_errors():
+            dynamo.batch_write_items(list(items), name=self.table_name)
+
+    def batch_put_if_absent(self, items):
+        # BatchWriteItem cannot carry a condition; run conditional puts in parallel
+        items = list(items)
+        if len(items) <= 1:
+            existing = [self.put_if_absent(item) for item in items]
+        else:
+            workers = min(ROLLUP_WRITERS, len(items))
+            with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='put') as executor:
+                existing = list(executor.map(self.put_if_absent, items))
+        return {item['hash']: stored for item, stored in zip(items, existing) if stored is not None}
+
+    def delete(self, url_hash):
+        with _translate_errors():
+            self.table.delete_item(Key={'hash': url_hash})
+
+    def _delete_expired(self, url_hash, now):
+        try:
+            self.table.delete_item(
+                Key={'hash': url_hash},
+                ConditionExpression='expires_at <= :now',
+                ExpressionAttributeValues={':now': now}
+            )
+            return url_hash
+        except ClientError as e:
+            if _error_code(e) == 'ConditionalCheckFailedException':
+                return None
+            raise
+
+    def delete_expired(self, hashes, now):
+        hashes = list(dict.fromkeys(hashes))
+        now = int(now)
+        with _translate_errors():
+            if len(hashes) <= 1:
+                deleted = [self._delete_expired(url_hash, now) for url_hash in hashes]
+            else:
+                workers = min(ROLLUP_WRITERS, len(hashes))
+                with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='delete') as executor:
+                    deleted = list(executor.map(lambda url_hash: self._delete_expired(url_hash, now), hashes))
+        return [url_hash for url_hash in deleted if url_hash is not None]
+
+    def extend_expiry(self, url_hash, expires_at):
+        kwargs = {
+            'Key': {'hash': url_hash},
+            'ConditionExpression': 'attribute_exists(expires_at)'
+        }
+        if expires_at is None:
+            kwargs['UpdateExpression'] = 'REMOVE expires_at'
+        else:
+            kwargs['UpdateExpression'] = 'SET expires_at = :expires'
+            kwargs['ConditionExpression'] += ' AND expires_at < :expires'
+            kwargs['ExpressionAttributeValues'] = {':expires': int(expires_at)}
+        with _translate_errors():
+            try:
+                self.table.update_item(**kwargs)
+            except ClientError as e:
+                if _error_code(e) != 'ConditionalCheckFailedException':
+                    raise
+
+    def scan(self, on_page, segments=1, created_since=None, attributes=None, expired_before=None):
+        kwargs = {}
+        if attributes:
+            names = {f'#a{i}': name for i, name in enumerate(dict.fromkeys(('hash',) + tuple(attributes)))}
+            kwargs['ProjectionExpression'] = ', '.join(names)
+            kwargs['ExpressionAttributeNames'] = names
+        conditions, values = [], {}
+        if created_since is not None:
+            conditions.append('created_at >= :since')
+            values[':since'] = created_since
+        if expired_before is not None:
+            conditions.append('expires_at <= :expired')
+            values[':expired'] = int(expired_before)
+        if conditions:
+            kwargs['FilterExpression'] = ' AND '.join(conditions)
+            kwargs['ExpressionAttributeValues'] = values
+        with _translate_errors():
+            return dynamo.parallel_scan(on_page, segments=segments, name=self.table_name, **kwargs)
+
+    def _add_rollup(self, row):
+        url_hash, bucket, count, expires_at = row
+        try:
+            dynamo.get_table(self.rollup_table_name).update_item(
+                Key={'hash': url_hash, 'bucket': bucket},
+                UpdateExpression='ADD clicks :inc SET expires_at = :expires',
+                ExpressionAttributeValues={':inc': count, ':expires': expires_at}
+            )
+            return None
+        except Exception:
+            # ClientError or a BotoCoreError (connection, timeout): only this
+            # row is retried, rows already added are not added again
+            return row
+
+    def add_rollups(self, rows):
+        rows = list(rows)
+        if len(rows) <= 1:
+            failed = [self._add_rollup(row) for row in rows]
+        else:
+            workers = min(ROLLUP_WRITERS, len(rows))
+            with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='rollups') as executor:
+                failed = list(executor.map(self._add_rollup, rows))
+        return [row for row in failed if row is not None]
+
+    def get_rollups(self, url_hash, first_bucket, last_bucket):
+        table = dynamo.get_table(self.rollup_table_name)
+        kwargs = {
+            'KeyConditionExpression': Key('hash').eq(url_hash) & Key('bucket').between(first_bucket, last_bucket),
+            # BUCKET is a reserved word
+            'ProjectionExpression': '#b, clicks',
+            'ExpressionAttributeNames': {'#b': 'bucket'}
+        }
+        found = {}
+        with _translate_errors():
+            while True:
+                response = table.query(**kwargs)
+                for item in response.get('Items', []):
+                    found[item['bucket']] = int(item.get('clicks', 0))
+                last_key = response.get('LastEvaluatedKey')
+                if not last_key:
+                    return found
+                kwargs['ExclusiveStartKey'] = last_key
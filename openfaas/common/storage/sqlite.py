@@ -0,0 +1,361 @@
+"""
+Embedded SQLite backend for single-node deployments.
+
+The database at SQLITE_PATH runs in WAL mode, so readers never block the
+writer and several processes on one host (the function servers and
+redirect-handler.py) can share the file. ``hash`` is the primary key of a
+WITHOUT ROWID table, so every lookup is a single clustered B-tree probe.
+
+Each thread gets its own connection (sqlite3 connections must not be shared
+between threads) and reopens it after a fork. The SQL text of every
+statement is a constant, so sqlite3's per-connection statement cache keeps
+them prepared after first use.
+
+Attributes other than the four core columns (e.g. ones added by later
+features) round-trip through a JSON ``attributes`` column. Link expiry
+(``expires_at``) is one of them and is queried with json_extract().
+
+Click rollups go to ``<table>_rollups``, keyed by (hash, bucket) so a series
+is one range read of the clustered key. Expired buckets are pruned from
+add_rollups() at most once every SQLITE_ROLLUP_PRUNE_INTERVAL seconds.
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+
+from common.storage import Store, StoreError
+
+SQLITE_PATH = os.getenv('SQLITE_PATH', '/var/lib/urlshortener/url_mappings.db')
+SQLITE_BUSY_TIMEOUT = float(os.getenv('SQLITE_BUSY_TIMEOUT', '5'))
+SQLITE_CACHE_KIB = int(os.getenv('SQLITE_CACHE_KIB', '8192'))
+SQLITE_ROLLUP_PRUNE_INTERVAL = float(os.getenv('SQLITE_ROLLUP_PRUNE_INTERVAL', '3600'))
+
+CORE_COLUMNS = ('hash', 'original_url', 'created_at', 'click_count')
+# Stay under SQLITE_MAX_VARIABLE_NUMBER on older builds (999)
+IN_CHUNK = 500
+SCAN_PAGE = 1000
+
+SELECT_ONE = 'SELECT hash, original_url, created_at, click_count, attributes FROM {table} WHERE hash = ?'
+INSERT_IF_ABSENT = (
+    'INSERT OR IGNORE INTO {table} (hash, original_url, created_at, click_count, attributes) '
+    'VALUES (?, ?, ?, ?, ?)'
+)
+UPSERT = (
+    'INSERT OR REPLACE INTO {table} (hash, original_url, created_at, click_count, attributes) '
+    'VALUES (?, ?, ?, ?, ?)'
+)
+ADD_CLICKS = 'UPDATE {table} SET click_count = click_count + ? WHERE hash = ?'
+SELECT_CLICKS = 'SELECT click_count FROM {table} WHERE hash = ?'
+DELETE = 'DELETE FROM {table} WHERE hash = ?'
+EXPIRES_AT = "json_extract(attributes, '$.expires_at')"
+DELETE_EXPIRED = "DELETE FROM {table} WHERE hash = ? AND json_extract(attributes, '$.expires_at') <= ?"
+EXTEND_EXPIRY = (
+    "UPDATE {table} SET attributes = json_set(attributes, '$.expires_at', ?) "
+    "WHERE hash = ? AND json_extract(attributes, '$.expires_at') < ?"
+)
+REMOVE_EXPIRY = (
+    "UPDATE {table} SET attributes = nullif(json_remove(attributes, '$.expires_at'), '{{}}') "
+    "WHERE hash = ? AND json_extract(attributes, '$.expires_at') IS NOT NULL"
+)
+ADD_ROLLUP = (
+    'INSERT INTO {table}_rollups (hash, bucket, clicks, expires_at) VALUES (?, ?, ?, ?) '
+    'ON CONFLICT (hash, bucket) DO UPDATE SET clicks = clicks + excluded.clicks, expires_at = excluded.expires_at'
+)
+SELECT_ROLLUPS = 'SELECT bucket, clicks FROM {table}_rollups WHERE hash = ? AND bucket BETWEEN ? AND ?'
+PRUNE_ROLLUPS = 'DELETE FROM {table}_rollups WHERE expires_at < ?'
+
+
+@contextmanager
+def _translate_errors():
+    try:
+        yield
+    except sqlite3.Error as e:
+        raise StoreError(str(e), code=type(e).__name__) from e
+
+
+def _plain(value):
+    # DynamoDB-shaped callers may hand over Decimals
+    if isinstance(value, Decimal):
+        return int(value) if value == value.to_integral_value() else float(value)
+    return value
+
+
+def _row_to_item(row):
+    url_hash, original_url, created_at, click_count, attributes = row
+    item = json.loads(attributes) if attributes else {}
+    item.update({
+        'hash': url_hash,
+        'original_url': original_url,
+        'created_at': created_at,
+        'click_count': click_count
+    })
+    return item
+
+
+def _item_to_row(item):
+    extra = {key: _plain(value) for key, value in item.items() if key not in CORE_COLUMNS}
+    return (
+        item['hash'],
+        item['original_url'],
+        item.get('created_at', ''),
+        int(item.get('click_count', 0)),
+        json.dumps(extra, separators=(',', ':')) if extra else None
+    )
+
+
+class SQLiteStore(Store):
+    name = 'sqlite'
+
+    def __init__(self, path=None, table_name=None):
+        self.path = path or SQLITE_PATH
+        # Same table-name setting as the DynamoDB backend
+        self.table_name = table_name or os.getenv('DYNAMODB_TABLE', 'url_mappings')
+        self.local = threading.local()
+        self.sql = {
+            name: statement.format(table=self.table_name)
+            for name, statement in (
+                ('select_one', SELECT_ONE), ('insert_if_absent', INSERT_IF_ABSENT), ('upsert', UPSERT),
+                ('add_clicks', ADD_CLICKS), ('select_clicks', SELECT_CLICKS), ('delete', DELETE),
+                ('add_rollup', ADD_ROLLUP), ('select_rollups', SELECT_ROLLUPS), ('prune_rollups', PRUNE_ROLLUPS),
+                ('delete_expired', DELETE_EXPIRED), ('extend_expiry', EXTEND_EXPIRY), ('remove_expiry', REMOVE_EXPIRY)
+            )
+        }
+        self.pruned_at = 0.0
+        self._create_schema()
+
+    def _connect(self):
+        directory = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(directory, exist_ok=True)
+        conn = sqlite3.connect(self.path, timeout=SQLITE_BUSY_TIMEOUT, isolation_level=None,
+                               check_same_thread=False, cached_statements=64)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        conn.execute(f'PRAGMA cache_size=-{SQLITE_CACHE_KIB}')
+        return conn
+
+    @property
+    def conn(self):
+        conn = getattr(self.local, 'conn', None)
+        if conn is None or self.local.pid != os.getpid():
+            conn = self._connect()
+            self.local.conn = conn
+            self.local.pid = os.getpid()
+        return conn
+
+    def _create_schema(self):
+        with _translate_errors():
+            self.conn.execute(
+                f'CREATE TABLE IF NOT EXISTS {self.table_name} ('
+                'hash TEXT PRIMARY KEY NOT NULL, '
+                'original_url TEXT NOT NULL, '
+                'created_at TEXT NOT NULL, '
+                'click_count INTEGER NOT NULL DEFAULT 0, '
+                'attributes TEXT'
+                ') WITHOUT ROWID'
+            )
+            self.conn.execute(
+                f'CREATE INDEX IF NOT EXISTS {self.table_name}_created_at ON {self.table_name} (created_at)'
+            )
+            self.conn.execute(
+                f'CREATE TABLE IF NOT EXISTS {self.table_name}_rollups ('
+                'hash TEXT NOT NULL, '
+                'bucket TEXT NOT NULL, '
+                'clicks INTEGER NOT NULL DEFAULT 0, '
+                'expires_at INTEGER, '
+                'PRIMARY KEY (hash, bucket)'
+                ') WITHOUT ROWID'
+            )
+            self.conn.execute(
+                f'CREATE INDEX IF NOT EXISTS {self.table_name}_rollups_expires_at '
+                f'ON {self.table_name}_rollups (expires_at)'
+            )
+
+    def get(self, url_hash):
+        with _translate_errors():
+            row = self.conn.execute(self.sql['select_one'], (url_hash,)).fetchone()
+        return _row_to_item(row) if row else None
+
+    def put_if_absent(self, item):
+        row = _item_to_row(item)
+        conn = self.conn
+        with _translate_errors():
+            while True:
+                if conn.execute(self.sql['insert_if_absent'], row).rowcount == 1:
+                    return None
+                existing = conn.execute(self.sql['select_one'], (item['hash'],)).fetchone()
+                if existing is not None:
+                    return _row_to_item(existing)
+                # Deleted between the insert and the read; try the insert again
+
+    def add_clicks(self, url_hash, count):
+        conn = self.conn
+        with _translate_errors():
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                if conn.execute(self.sql['add_clicks'], (int(count), url_hash)).rowcount == 0:
+                    conn.execute('COMMIT')
+                    return None
+                row = conn.execute(self.sql['select_clicks'], (url_hash,)).fetchone()
+                conn.execute('COMMIT')
+            except BaseException:
+                conn.execute('ROLLBACK')
+                raise
+        return int(row[0])
+
+    def batch_get(self, hashes):
+        hashes = list(dict.fromkeys(hashes))
+        found = {}
+        with _translate_errors():
+            for start in range(0, len(hashes), IN_CHUNK):
+                chunk = hashes[start:start + IN_CHUNK]
+                rows = self.conn.execute(
+                    f'SELECT hash, original_url, created_at, click_count, attributes FROM {self.table_name} '
+                    f'WHERE hash IN ({",".join("?" * len(chunk))})',
+                    chunk
+                )
+                for row in rows:
+                    found[row[0]] = _row_to_item(row)
+        return found
+
+    def batch_put(self, items):
+        rows = [_item_to_row(item) for item in items]
+        if not rows:
+            return
+        conn = self.conn
+        with _translate_errors():
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                conn.executemany(self.sql['upsert'], rows)
+                conn.execute('COMMIT')
+            except BaseException:
+                conn.execute('ROLLBACK')
+                raise
+
+    def batch_put_if_absent(self, items):
+        rows = [_item_to_row(item) for item in items]
+        if not rows:
+            return {}
+        conn = self.conn
+        existing = {}
+        with _translate_errors():
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                for row in rows:
+                    if conn.execute(self.sql['insert_if_absent'], row).rowcount == 0:
+                        existing[row[0]] = _row_to_item(conn.execute(self.sql['select_one'], (row[0],)).fetchone())
+                conn.execute('COMMIT')
+            except BaseException:
+                conn.execute('ROLLBACK')
+                raise
+        return existing
+
+    def delete(self, url_hash):
+        with _translate_errors():
+            self.conn.execute(self.sql['delete'], (url_hash,))
+
+    def delete_expired(self, hashes, now):
+        hashes = list(dict.fromkeys(hashes))
+        if not hashes:
+            return []
+        now = int(now)
+        conn = self.conn
+        deleted = []
+        with _translate_errors():
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                for url_hash in hashes:
+                    if conn.execute(self.sql['delete_expired'], (url_hash, now)).rowcount == 1:
+                        deleted.append(url_hash)
+                conn.execute('COMMIT')
+            except BaseException:
+                conn.execute('ROLLBACK')
+                raise
+        return deleted
+
+    def extend_expiry(self, url_hash, expires_at):
+        with _translate_errors():
+            if expires_at is None:
+                self.conn.execute(self.sql['remove_expiry'], (url_hash,))
+            else:
+                self.conn.execute(self.sql['extend_expiry'], (int(expires_at), url_hash, int(expires_at)))
+
+    def add_rollups(self, rows):
+        rows = [(url_hash, bucket, int(count), expires_at) for url_hash, bucket, count, expires_at in rows]
+        if not rows:
+            return []
+        now = time.time()
+        conn = self.conn
+        with _translate_errors():
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                conn.executemany(self.sql['add_rollup'], rows)
+                if now - self.pruned_at >= SQLITE_ROLLUP_PRUNE_INTERVAL:
+                    conn.execute(self.sql['prune_rollups'], (int(now),))
+                    self.pruned_at = now
+                conn.execute('COMMIT')
+            except BaseException:
+                conn.execute('ROLLBACK')
+                raise
+        return []
+
+    def get_rollups(self, url_hash, first_bucket, last_bucket):
+        with _translate_errors():
+            rows = self.conn.execute(self.sql['select_rollups'], (url_hash, first_bucket, last_bucket)).fetchall()
+        return dict(rows)
+
+    def _scan_range(self, low, high, on_page, created_since, attributes, expired_before):
+        """Page through hashes in [low, high) in primary-key order"""
+        where = ['hash > ?']
+        if high is not None:
+            where.append('hash < ?')
+        if created_since is not None:
+            where.append('created_at >= ?')
+        if expired_before is not None:
+            where.append(f'{EXPIRES_AT} <= ?')
+        statement = (
+            f'SELECT hash, original_url, created_at, click_count, attributes FROM {self.table_name} '
+            f'WHERE {" AND ".join(where)} ORDER BY hash LIMIT {SCAN_PAGE}'
+        )
+        keep = set(('hash',) + tuple(attributes)) if attributes else None
+        seen = 0
+        last = low
+        while True:
+            params = [last]
+            if high is not None:
+                params.append(high)
+            if created_since is not None:
+                params.append(created_since)
+            if expired_before is not None:
+                params.append(int(expired_before))
+            with _translate_errors():
+                rows = self.conn.execute(statement, params).fetchall()
+            if not rows:
+                return seen
+            items = [_row_to_item(row) for row in rows]
+            if keep is not None:
+                items = [{key: value for key, value in item.items() if key in keep} for item in items]
+            seen += len(items)
+            on_page(items)
+            last = rows[-1][0]
+
+    def scan(self, on_page, segments=1, created_since=None, attributes=None, expired_before=None):
+        # Segments split the hex keyspace by leading digit(s); '' sorts
+        # before every hash, so the first segment starts there
+        segments = max(1, min(segments, 16))
+        bounds = [''] + [format(i * 16 // segments, 'x') for i in range(1, segments)] + [None]
+        if segments == 1:
+            return self._scan_range('', None, on_page, created_since, attributes, expired_before)
+        with ThreadPoolExecutor(max_workers=segments, thread_name_prefix='scan') as executor:
+            futures = [
+                executor.submit(self._scan_range, bounds[i], bounds[i + 1], on_page, created_since, attributes,
+                                expired_before)
+                for i in range(segments)
+            ]
+            return sum(future.result() for future in futures)
+
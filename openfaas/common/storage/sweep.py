@@ -0,0 +1,191 @@
+"""
+Deletes expired links (see common.expiry) from url_mappings.
+
+    python3 -m common.storage.sweep                     # one pass over STORAGE_BACKEND
+    python3 -m common.storage.sweep --dry-run           # count only
+    python3 -m common.storage.sweep --interval 3600     # keep sweeping
+
+Run it from openfaas/ (or with openfaas/ on PYTHONPATH). redirect-handler.py
+runs the same Sweeper in the background when LINK_SWEEP_INTERVAL is set.
+
+A pass is a parallel scan (LINK_SWEEP_SEGMENTS segments) filtered to items
+whose expires_at has passed. Each scan worker deletes what it finds in
+batches of LINK_SWEEP_BATCH through Store.delete_expired(). The delete is
+conditional, so a link renewed since it was read survives. All workers
+share one LINK_SWEEP_RATE deletes/s budget, halved while the store reports
+throttling (the import's AdaptiveRate). Each pass reports the items and
+bytes it reclaimed. Bytes are estimated with DynamoDB's item size rules:
+attribute names plus values.
+
+DynamoDB's own TTL deletion (enabled by init-table.sh) does the same job
+on AWS, within a couple of days; DynamoDB Local and SQLite need the sweeper.
+"""
+
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+from decimal import Decimal
+
+from common import storage
+from common.storage.transfer import THROTTLE_CODES, AdaptiveRate
+
+SEGMENTS = int(os.getenv('LINK_SWEEP_SEGMENTS', '4'))
+BATCH_SIZE = int(os.getenv('LINK_SWEEP_BATCH', '25'))
+RATE = float(os.getenv('LINK_SWEEP_RATE', '200'))
+MAX_RETRIES = 5
+
+
+def value_size(value):
+    """Approximate stored size of one attribute value, DynamoDB-style"""
+    if isinstance(value, str):
+        return len(value.encode())
+    if isinstance(value, (bytes, bytearray)):
+        return len(value)
+    if value is None or isinstance(value, bool):
+        return 1
+    if isinstance(value, (int, float, Decimal)):
+        digits = str(value).lstrip('-').replace('.', '').lstrip('0') or '0'
+        return (len(digits) + 1) // 2 + 1
+    if isinstance(value, dict):
+        return 3 + sum(len(key.encode()) + value_size(item) + 1 for key, item in value.items())
+    if isinstance(value, (list, tuple, set)):
+        return 3 + sum(value_size(item) + 1 for item in value)
+    return len(str(value).encode())
+
+
+def item_size(item):
+    return sum(len(name.encode()) + value_size(value) for name, value in item.items())
+
+
+class Sweeper:
+    """Rate-limited, parallel deletion of expired items"""
+
+    def __init__(self, store=None, segments=SEGMENTS, batch_size=BATCH_SIZE, rate=RATE,
+                 dry_run=False, log=None):
+        self.store = store
+        self.segments = segments
+        self.batch_size = max(1, batch_size)
+        self.rate = rate
+        self.dry_run = dry_run
+        self.log = log
+        self.passes = 0
+        self.last_report = None
+        self.thread = None
+        self.lock = threading.Lock()
+
+    def _delete(self, items, now, limiter, totals):
+        by_hash = {item['hash']: item for item in items}
+        hashes = list(by_hash)
+        for attempt in range(MAX_RETRIES + 1):
+            limiter.acquire(len(hashes))
+            try:
+                deleted = self.store.delete_expired(hashes, now)
+                limiter.succeeded()
+                break
+            except storage.StoreError as e:
+                if e.code not in THROTTLE_CODES or attempt == MAX_RETRIES:
+                    raise
+                limiter.throttled()
+        reclaimed = sum(item_size(by_hash[url_hash]) for url_hash in deleted)
+        with self.lock:
+            totals['deleted'] += len(deleted)
+            totals['bytes'] += reclaimed
+
+    def sweep(self, now=None):
+        """One pass; returns its report"""
+        store = self.store = self.store or storage.get_store()
+        now = int(now if now is not None else time.time())
+        started = time.monotonic()
+        limiter = AdaptiveRate(self.rate, max(1.0, self.rate / 8), self.rate, self.rate / 20)
+        totals = {'expired': 0, 'expired_bytes': 0, 'deleted': 0, 'bytes': 0, 'errors': 0}
+
+        def on_page(items):
+            items = [item for item in items if item.get('expires_at') is not None]
+            with self.lock:
+                totals['expired'] += len(items)
+                totals['expired_bytes'] += sum(item_size(item) for item in items)
+            if self.dry_run:
+                return
+            for start in range(0, len(items), self.batch_size):
+                try:
+                    self._delete(items[start:start + self.batch_size], now, limiter, totals)
+                except Exception as e:
+                    with self.lock:
+                        totals['errors'] += 1
+                    if self.log:
+                        self.log("ERROR", "Expired link delete failed", error=str(e))
+
+        store.scan(on_page, segments=self.segments, expired_before=now)
+        report = {
+            "backend": store.name,
+            "expired": totals['expired'],
+            "deleted": totals['deleted'],
+            # Renewed, or removed by someone else, between the scan and the delete
+            "skipped": totals['expired'] - totals['deleted'] if not self.dry_run else 0,
+            "bytes_reclaimed": totals['bytes'] if not self.dry_run else totals['expired_bytes'],
+            "errors": totals['errors'],
+            "throttled": limiter.throttles,
+            "dry_run": self.dry_run,
+            "seconds": round(time.monotonic() - started, 3),
+            "finished_at": time.time()
+        }
+        self.passes += 1
+        self.last_report = report
+        if self.log:
+            self.log("INFO", "Expired link sweep finished", **{k: v for k, v in report.items() if k != 'finished_at'})
+        return report
+
+    def start(self, interval):
+        with self.lock:
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._run, args=(interval,), name='link-sweeper', daemon=True)
+                self.thread.start()
+
+    def _run(self, interval):
+        while True:
+            time.sleep(interval)
+            try:
+                self.sweep()
+            except Exception as e:
+                if self.log:
+                    self.log("ERROR", "Expired link sweep failed", error=str(e))
+
+    def stats(self):
+        return {
+            "segments": self.segments,
+            "batch_size": self.batch_size,
+            "rate": self.rate,
+            "passes": self.passes,
+            "last": self.last_report
+        }
+
+
+def _log(level, message, **kwargs):
+    details = ' '.join(f"{key}={value}" for key, value in kwargs.items())
+    print(f"{level} {message} {details}".rstrip(), file=sys.stderr)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--backend', help='storage backend (default: STORAGE_BACKEND)')
+    parser.add_argument('--segments', type=int, default=SEGMENTS)
+    parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+    parser.add_argument('--rate', type=float, default=RATE, help='deletes/s ceiling')
+    parser.add_argument('--dry-run', action='store_true', help='count expired items without deleting them')
+    parser.add_argument('--interval', type=float, default=0, help='repeat every N seconds (default: one pass)')
+    args = parser.parse_args()
+
+    sweeper = Sweeper(storage.create_store(args.backend), segments=args.segments, batch_size=args.batch_size,
+                      rate=args.rate, dry_run=args.dry_run, log=_log)
+    while True:
+        print(json.dumps(sweeper.sweep()))
+        if args.interval <= 0:
+            break
+        time.sleep(args.interval)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,457 @@
+"""
+Parallel export and import of the url_mappings DynamoDB table.
+
+    python3 -m common.storage.transfer export --out /backup/url_mappings --segments 16
+    python3 -m common.storage.transfer export --out /backup/url_mappings --segments 16 --resume
+    python3 -m common.storage.transfer import --in /backup/url_mappings --workers 16
+    python3 -m common.storage.transfer import --in /backup/url_mappings --endpoint http://other:8000
+
+Run it from openfaas/ (or with openfaas/ on PYTHONPATH). The table and
+endpoint come from DYNAMODB_TABLE / DYNAMODB_ENDPOINT unless given.
+
+Export runs a parallel segmented Scan. Each segment streams its pages
+straight into its own gzip NDJSON file, ``part-NNNN-of-MMMM.ndjson.gz``.
+Every line is ``{"Item": {...}}`` in DynamoDB's typed JSON, so values
+round-trip exactly. Memory stays at about one page per worker. Every
+--checkpoint-pages pages a segment ends its gzip member and records its
+LastEvaluatedKey and file offset in ``checkpoint.json``. ``--resume``
+truncates each file back to its last checkpoint and carries on from there.
+
+Import reads the part files on reader threads and feeds batches of 25
+through a bounded queue to --workers BatchWriteItem threads. Unprocessed
+items are retried with backoff. The write rate adapts: throttling halves it
+and each clean batch raises it again (AIMD), between --min-rate and
+--max-rate. Finished files are recorded in ``import-<table>.json`` so
+``--resume`` skips them.
+
+Both directions print throughput to stderr every --report-interval seconds.
+"""
+
+import argparse
+import glob
+import gzip
+import json
+import os
+import queue
+import sys
+import threading
+import time
+
+DEFAULT_SEGMENTS = 8
+PART_PATTERN = 'part-{segment:04d}-of-{total:04d}.ndjson.gz'
+CHECKPOINT_FILE = 'checkpoint.json'
+THROTTLE_CODES = ('ProvisionedThroughputExceededException', 'ThrottlingException', 'RequestLimitExceeded')
+
+
+class Progress:
+    """Thread-safe item/byte counters with a periodic throughput line on stderr"""
+
+    def __init__(self, label, interval, show_bytes=True):
+        self.label = label
+        self.interval = interval
+        self.show_bytes = show_bytes
+        self.items = 0
+        self.bytes = 0
+        self.lock = threading.Lock()
+        self.stopped = threading.Event()
+        self.started = time.monotonic()
+        self.thread = None
+
+    def add(self, items, nbytes=0):
+        with self.lock:
+            self.items += items
+            self.bytes += nbytes
+
+    def line(self, since, items_then):
+        elapsed = max(time.monotonic() - self.started, 1e-9)
+        window = max(time.monotonic() - since, 1e-9)
+        line = (f"{self.label}: {self.items} items, {(self.items - items_then) / window:.0f} items/s now, "
+                f"{self.items / elapsed:.0f} items/s avg")
+        if self.show_bytes:
+            line += f", {self.bytes / elapsed / 2 ** 20:.1f} MiB/s"
+        return line
+
+    def start(self):
+        self.started = time.monotonic()
+        self.thread = threading.Thread(target=self._run, name='progress', daemon=True)
+        self.thread.start()
+
+    def _run(self):
+        since, items_then = time.monotonic(), 0
+        while not self.stopped.wait(self.interval):
+            print(self.line(since, items_then), file=sys.stderr)
+            since, items_then = time.monotonic(), self.items
+
+    def stop(self):
+        self.stopped.set()
+        elapsed = time.monotonic() - self.started
+        print(f"{self.line(self.started, 0)} ({elapsed:.1f}s)", file=sys.stderr)
+
+
+class StateFile:
+    """A small JSON document rewritten atomically on every update"""
+
+    def __init__(self, path, state):
+        self.path = path
+        self.state = state
+        self.lock = threading.Lock()
+
+    @classmethod
+    def load(cls, path, default):
+        try:
+            with open(path) as f:
+                return cls(path, json.load(f))
+        except FileNotFoundError:
+            return cls(path, default)
+
+    def write(self):
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(self.state, f, indent=1)
+        os.replace(tmp_path, self.path)
+
+
+def _client(endpoint, connections):
+    # Set before the shared resource is first built
+    if endpoint:
+        os.environ['DYNAMODB_ENDPOINT'] = endpoint
+    os.environ.setdefault('DYNAMODB_MAX_POOL_CONNECTIONS', str(connections))
+    from common import dynamo
+    return dynamo, dynamo.new_wire_client()
+
+
+def _run_all(target, args_list):
+    """Run target(*args) on one thread each; re-raise the first failure"""
+    errors = []
+
+    def run(args):
+        try:
+            target(*args)
+        except BaseException as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=run, args=(args,)) for args in args_list]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    if errors:
+        raise errors[0]
+
+
+# Export
+
+def export_segment(client, table, segment, total, out_dir, checkpoint, progress, page_size, checkpoint_pages):
+    with checkpoint.lock:
+        state = dict(checkpoint.state['parts'].setdefault(
+            str(segment), {'last_key': None, 'offset': 0, 'items': 0, 'done': False}
+        ))
+    if state['done']:
+        return
+    path = os.path.join(out_dir, PART_PATTERN.format(segment=segment, total=total))
+    kwargs = {'TableName': table, 'Segment': segment, 'TotalSegments': total}
+    if page_size:
+        kwargs['Limit'] = page_size
+    if state['last_key']:
+        kwargs['ExclusiveStartKey'] = state['last_key']
+    items = state['items']
+    pages = 0
+    with open(path, 'ab') as raw:
+        # Anything after the last checkpoint is scanned again
+        raw.truncate(state['offset'])
+        member = gzip.GzipFile(fileobj=raw, mode='wb')
+        while True:
+            response = client.scan(**kwargs)
+            page = response.get('Items', [])
+            data = ''.join(json.dumps({'Item': item}, separators=(',', ':')) + '\n' for item in page).encode()
+            member.write(data)
+            items += len(page)
+            pages += 1
+            progress.add(len(page), len(data))
+            last_key = response.get('LastEvaluatedKey')
+            if last_key is None or pages % checkpoint_pages == 0:
+                # Close the gzip member so the file is valid up to this offset
+                member.close()
+                raw.flush()
+                os.fsync(raw.fileno())
+                with checkpoint.lock:
+                    checkpoint.state['parts'][str(segment)] = {
+                        'last_key': last_key, 'offset': raw.tell(), 'items': items, 'done': last_key is None
+                    }
+                    checkpoint.write()
+                if last_key is None:
+                    return
+                member = gzip.GzipFile(fileobj=raw, mode='wb')
+            kwargs['ExclusiveStartKey'] = last_key
+
+
+def export_table(args):
+    dynamo, client = _client(args.endpoint, args.segments)
+    table = args.table or dynamo.table_name()
+    os.makedirs(args.out, exist_ok=True)
+    checkpoint_path = os.path.join(args.out, CHECKPOINT_FILE)
+    if os.path.exists(checkpoint_path) and not args.resume:
+        sys.exit(f"{checkpoint_path} exists; pass --resume to continue that export or use a new directory")
+    checkpoint = StateFile.load(checkpoint_path, {'table': table, 'segments': args.segments, 'parts': {}})
+    if checkpoint.state['table'] != table or checkpoint.state['segments'] != args.segments:
+        sys.exit(f"{checkpoint_path} is for table {checkpoint.state['table']} with "
+                 f"{checkpoint.state['segments']} segments")
+    checkpoint.write()
+
+    progress = Progress(f"export {table}", args.report_interval)
+    progress.start()
+    try:
+        _run_all(export_segment, [
+            (client, table, segment, args.segments, args.out, checkpoint, progress,
+             args.page_size, args.checkpoint_pages)
+            for segment in range(args.segments)
+        ])
+    finally:
+        progress.stop()
+    total_items = sum(part['items'] for part in checkpoint.state['parts'].values())
+    size = sum(os.path.getsize(path) for path in glob.glob(os.path.join(args.out, 'part-*.ndjson.gz')))
+    checkpoint.state['completed_at'] = time.time()
+    checkpoint.write()
+    print(f"Exported {total_items} items from {table} to {args.out} ({size / 2 ** 20:.1f} MiB compressed)")
+
+
+# Import
+
+class AdaptiveRate:
+    """
+    Paces writes to ``rate`` items/s. Throttling halves the rate; every
+    batch written without throttling adds ``step`` items/s back (AIMD).
+    Batches already in flight when the rate drops report the same overload,
+    so the rate is halved at most once per ``cooldown`` seconds.
+    """
+
+    def __init__(self, initial, minimum, maximum, step, cooldown=1.0):
+        self.rate = initial
+        self.minimum = minimum
+        self.maximum = maximum
+        self.step = step
+        self.cooldown = cooldown
+        self.available_at = time.monotonic()
+        self.decreased_at = 0.0
+        self.throttles = 0
+        self.lock = threading.Lock()
+
+    def acquire(self, items):
+        with self.lock:
+            now = time.monotonic()
+            start = max(now, self.available_at)
+            self.available_at = start + items / self.rate
+        if start > now:
+            time.sleep(start - now)
+
+    def throttled(self):
+        with self.lock:
+            self.throttles += 1
+            now = time.monotonic()
+            if now - self.decreased_at >= self.cooldown:
+                self.rate = max(self.minimum, self.rate / 2)
+                self.decreased_at = now
+
+    def succeeded(self):
+        with self.lock:
+            self.rate = min(self.maximum, self.rate + self.step)
+
+
+class FileTracker:
+    """Marks an input file done once it is fully read and every batch from it is written"""
+
+    def __init__(self, state):
+        self.state = state
+        self.pending = {}
+        self.read = set()
+        self.lock = threading.Lock()
+
+    def sent(self, name):
+        with self.lock:
+            self.pending[name] = self.pending.get(name, 0) + 1
+
+    def written(self, name):
+        with self.lock:
+            self.pending[name] -= 1
+            self._maybe_done(name)
+
+    def finished_reading(self, name):
+        with self.lock:
+            self.read.add(name)
+            self._maybe_done(name)
+
+    def _maybe_done(self, name):
+        if name in self.read and not self.pending.get(name):
+            with self.state.lock:
+                self.state.state['done'].append(name)
+                try:
+                    self.state.write()
+                except OSError as e:
+                    print(f"Could not record import progress: {e}", file=sys.stderr)
+
+
+def read_batches(path, batch_size=25):
+    """Yield lists of typed items from one part file"""
+    batch = []
+    with gzip.open(path, 'rt') as f:
+        for line in f:
+            if line.strip():
+                batch.append(json.loads(line)['Item'])
+                if len(batch) == batch_size:
+                    yield batch
+                    batch = []
+    if batch:
+        yield batch
+
+
+def write_batch(dynamo, client, table, batch, rate, progress, max_retries):
+    from botocore.exceptions import ClientError
+
+    request = {table: [{'PutRequest': {'Item': item}} for item in batch]}
+    attempt = 0
+    while request:
+        count = len(request[table])
+        rate.acquire(count)
+        try:
+            response = client.batch_write_item(RequestItems=request)
+        except ClientError as e:
+            if e.response.get('Error', {}).get('Code') not in THROTTLE_CODES:
+                raise
+            response = {'UnprocessedItems': request}
+        unprocessed = response.get('UnprocessedItems') or {}
+        progress.add(count - len(unprocessed.get(table, [])))
+        if not unprocessed:
+            rate.succeeded()
+            return
+        rate.throttled()
+        if attempt >= max_retries:
+            raise RuntimeError(f"BatchWriteItem left items unprocessed after {max_retries} retries")
+        dynamo.backoff(attempt)
+        attempt += 1
+        request = unprocessed
+
+
+def import_table(args):
+    dynamo, client = _client(args.endpoint, args.workers)
+    table = args.table or dynamo.table_name()
+    paths = sorted(glob.glob(os.path.join(args.input, 'part-*.ndjson.gz')))
+    if not paths:
+        sys.exit(f"No part-*.ndjson.gz files in {args.input}")
+    state_path = os.path.join(args.input, f'import-{table}.json')
+    state = StateFile.load(state_path, {'table': table, 'done': []}) if args.resume else \
+        StateFile(state_path, {'table': table, 'done': []})
+    done = set(state.state['done'])
+    paths = [path for path in paths if os.path.basename(path) not in done]
+
+    rate = AdaptiveRate(args.max_rate, args.min_rate, args.max_rate, max(args.max_rate / 100, 1))
+    tracker = FileTracker(state)
+    batches = queue.Queue(maxsize=args.workers * 4)
+    failed = threading.Event()
+    progress = Progress(f"import {table}", args.report_interval, show_bytes=False)
+
+    writer_errors = []
+
+    def put(entry):
+        """Queue a batch; gives up once a write has failed"""
+        while not failed.is_set():
+            try:
+                batches.put(entry, timeout=0.5)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def reader(path):
+        name = os.path.basename(path)
+        for batch in read_batches(path):
+            tracker.sent(name)
+            if not put((name, batch)):
+                return
+        tracker.finished_reading(name)
+
+    def writer():
+        while True:
+            entry = batches.get()
+            if entry is None:
+                return
+            name, batch = entry
+            if failed.is_set():
+                # Keep draining so readers and the shutdown below never block on a full queue
+                continue
+            try:
+                write_batch(dynamo, client, table, batch, rate, progress, args.max_retries)
+            except BaseException as e:
+                writer_errors.append(e)
+                failed.set()
+                continue
+            tracker.written(name)
+
+    writers = []
+    for _ in range(args.workers):
+        thread = threading.Thread(target=writer, name='import-writer')
+        thread.start()
+        writers.append(thread)
+
+    progress.start()
+    try:
+        # Readers share the pool size with the writers; decompression is cheap next to the writes
+        pending = list(paths)
+        lock = threading.Lock()
+
+        def read_files():
+            while not failed.is_set():
+                with lock:
+                    if not pending:
+                        return
+                    path = pending.pop(0)
+                try:
+                    reader(path)
+                except BaseException:
+                    failed.set()
+                    raise
+
+        _run_all(read_files, [()] * min(args.readers, len(paths) or 1))
+    finally:
+        for _ in writers:
+            batches.put(None)
+        for thread in writers:
+            thread.join()
+        progress.stop()
+    if writer_errors:
+        raise writer_errors[0]
+    print(f"Imported {progress.items} items into {table} from {len(paths)} files "
+          f"({rate.throttles} throttled batches, final rate {rate.rate:.0f} items/s)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--table', help='table name (default: DYNAMODB_TABLE)')
+    parser.add_argument('--endpoint', help='DynamoDB endpoint (default: DYNAMODB_ENDPOINT)')
+    parser.add_argument('--report-interval', type=float, default=5.0)
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    export_parser = commands.add_parser('export', help='scan the table into gzip NDJSON part files')
+    export_parser.add_argument('--out', required=True, help='output directory')
+    export_parser.add_argument('--segments', type=int, default=DEFAULT_SEGMENTS)
+    export_parser.add_argument('--page-size', type=int, default=0, help='Scan Limit (default: 1 MB pages)')
+    export_parser.add_argument('--checkpoint-pages', type=int, default=10)
+    export_parser.add_argument('--resume', action='store_true')
+
+    import_parser = commands.add_parser('import', help='write exported part files into the table')
+    import_parser.add_argument('--in', dest='input', required=True, help='directory written by export')
+    import_parser.add_argument('--workers', type=int, default=8, help='BatchWriteItem threads')
+    import_parser.add_argument('--readers', type=int, default=4, help='part files decompressed at once')
+    import_parser.add_argument('--max-rate', type=float, default=10000, help='items/s ceiling')
+    import_parser.add_argument('--min-rate', type=float, default=25, help='items/s floor when throttled')
+    import_parser.add_argument('--max-retries', type=int, default=10)
+    import_parser.add_argument('--resume', action='store_true', help='skip files a previous import finished')
+
+    args = parser.parse_args()
+    if args.command == 'export':
+        export_table(args)
+    else:
+        import_table(args)
+
+
+if __name__ == '__main__':
+    main()
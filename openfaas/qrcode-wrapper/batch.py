@@ -0,0 +1,238 @@
+"""
+Batch QR code generation on a process pool.
+
+Rendering is CPU-bound pure Python/PIL, so a batch is spread over a pool of
+worker processes sized to the CPUs the container may use (affinity and
+cgroup quota), QR_BATCH_WORKERS to override. The workers run at a lower
+priority (QR_BATCH_NICE) and batches wait their turn for one of
+QR_BATCH_CONCURRENCY slots, so campaign jobs queue behind each other
+instead of starving the single-image requests served by the Flask threads.
+
+Results come back in input order while later items are still rendering: at
+most QR_BATCH_WINDOW items per batch are in flight, so memory stays bounded
+however long the batch is. Cached renderings are reused, but batch output
+only goes to the disk tier, so a campaign does not evict interactive entries.
+"""
+
+import base64
+import io
+import json
+import math
+import multiprocessing
+import os
+import threading
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from cache import cache_key
+
+
+def _read(path):
+    with open(path) as f:
+        return f.read().strip()
+
+
+def _cgroup_quota():
+    """(quota, period) in microseconds from cgroup v2 or v1, or None when unlimited/unknown"""
+    try:
+        quota, period = _read('/sys/fs/cgroup/cpu.max').split()
+    except (OSError, ValueError):
+        try:
+            quota = _read('/sys/fs/cgroup/cpu/cpu.cfs_quota_us')
+            period = _read('/sys/fs/cgroup/cpu/cpu.cfs_period_us')
+        except OSError:
+            return None
+    if quota in ('max', '-1'):
+        return None
+    try:
+        return int(quota), int(period)
+    except ValueError:
+        return None
+
+
+def available_cpus():
+    """CPUs this process may use, honouring affinity and the cgroup CPU quota"""
+    try:
+        cpus = len(os.sched_getaffinity(0))
+    except AttributeError:
+        cpus = os.cpu_count() or 1
+    quota = _cgroup_quota()
+    if quota is not None:
+        cpus = min(cpus, math.ceil(quota[0] / quota[1]))
+    return max(1, cpus)
+
+
+WORKERS = int(os.getenv('QR_BATCH_WORKERS', '0')) or available_cpus()
+CONCURRENCY = int(os.getenv('QR_BATCH_CONCURRENCY', '1'))
+QUEUE_TIMEOUT = float(os.getenv('QR_BATCH_QUEUE_TIMEOUT', '30'))
+MAX_ITEMS = int(os.getenv('QR_BATCH_MAX_ITEMS', '5000'))
+WINDOW = int(os.getenv('QR_BATCH_WINDOW', str(WORKERS * 8)))
+NICE = int(os.getenv('QR_BATCH_NICE', '10'))
+
+_slots = threading.BoundedSemaphore(CONCURRENCY)
+_pool_lock = threading.Lock()
+_pool = None
+
+
+class BatchBusy(Exception):
+    """No batch slot freed up within QR_BATCH_QUEUE_TIMEOUT"""
+
+
+def _lower_priority():
+    try:
+        os.nice(NICE)
+    except OSError:
+        pass
+
+
+def _render(text, options, fmt):
+    # Runs in a worker process
+    from handler import RENDERERS
+    return RENDERERS[fmt](text, options)
+
+
+def get_pool(broken=None):
+    """
+    The shared worker pool, started on first use. Passing the pool that
+    raised BrokenProcessPool (a worker was killed, e.g. OOM) replaces it.
+    """
+    global _pool
+    if _pool is None or _pool is broken:
+        with _pool_lock:
+            if _pool is broken and broken is not None:
+                broken.shutdown(wait=False)
+                _pool = None
+            if _pool is None:
+                # spawn: forking a multi-threaded server can copy held locks
+                _pool = ProcessPoolExecutor(
+                    max_workers=WORKERS,
+                    mp_context=multiprocessing.get_context('spawn'),
+                    initializer=_lower_priority
+                )
+    return _pool
+
+
+def parse_line(line):
+    """
+    One input line: a JSON string, {"text": ...}, or bare text. Returns the
+    text, '' for a malformed line, or None for a blank one.
+    """
+    line = line.strip()
+    if line[:1] in ('"', '{'):
+        try:
+            value = json.loads(line)
+        except ValueError:
+            return ''
+        if isinstance(value, dict):
+            value = value.get('text', '')
+        return value.strip() if isinstance(value, str) else ''
+    return line or None
+
+
+def render_batch(texts, options, fmt, cache):
+    """
+    Yield (index, text, etag, data, error) for ``texts`` in input order.
+    Holds one batch slot for as long as the generator runs.
+    """
+    if not _slots.acquire(timeout=QUEUE_TIMEOUT):
+        raise BatchBusy(f"No batch slot free after {QUEUE_TIMEOUT:.0f}s")
+    try:
+        pool = get_pool()
+        window = []
+
+        def finish(entry):
+            index, text, etag, data, future = entry
+            if future is None:
+                return index, text, etag, data, None
+            try:
+                data = future.result()
+            except Exception as e:
+                return index, text, None, None, f"QR code generation failed: {e}"
+            cache.put(etag, data, memory=False)
+            return index, text, etag, data, None
+
+        for index, text in enumerate(texts):
+            if index >= MAX_ITEMS:
+                while window:
+                    yield finish(window.pop(0))
+                yield index, text, None, None, f"Batch limit of {MAX_ITEMS} items reached"
+                return
+            if not text:
+                window.append((index, text, None, None, None))
+            else:
+                etag = cache_key(text, *options, fmt)
+                data = cache.peek(etag)
+                future = None
+                if data is None:
+                    try:
+                        future = pool.submit(_render, text, options, fmt)
+                    except BrokenProcessPool:
+                        pool = get_pool(broken=pool)
+                        future = pool.submit(_render, text, options, fmt)
+                window.append((index, text, etag, data, future))
+            # Hand back finished results from the front, in order
+            while len(window) > WINDOW or (window and _ready(window[0])):
+                yield finish(window.pop(0))
+        while window:
+            yield finish(window.pop(0))
+    finally:
+        _slots.release()
+
+
+def _ready(entry):
+    future = entry[4]
+    return future is None or future.done()
+
+
+def ndjson_lines(results, fmt):
+    for index, text, etag, data, error in results:
+        if error is None and not text:
+            error = "No input provided"
+        if error is not None:
+            line = {"index": index, "text": text, "error": error}
+        else:
+            line = {"index": index, "text": text, "format": fmt, "etag": etag,
+                    "data": base64.b64encode(data).decode()}
+        yield (json.dumps(line) + "\n").encode()
+
+
+class _Chunks(io.RawIOBase):
+    """Unseekable sink that hands zipfile's output back chunk by chunk"""
+
+    def __init__(self):
+        self.chunks = []
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def drain(self):
+        chunks, self.chunks = self.chunks, []
+        return b''.join(chunks)
+
+
+def zip_stream(results, fmt):
+    """
+    Stream a zip archive: NNNNN.<fmt> per rendered item plus manifest.ndjson
+    (one line per input item, with its file name or error)
+    """
+    sink = _Chunks()
+    compression = zipfile.ZIP_STORED if fmt == 'png' else zipfile.ZIP_DEFLATED
+    manifest = []
+    with zipfile.ZipFile(sink, 'w', compression=compression) as archive:
+        for index, text, etag, data, error in results:
+            if error is None and not text:
+                error = "No input provided"
+            if error is not None:
+                manifest.append({"index": index, "text": text, "error": error})
+                continue
+            name = f"{index:05d}.{fmt}"
+            archive.writestr(name, data)
+            manifest.append({"index": index, "text": text, "file": name, "etag": etag})
+            yield sink.drain()
+        archive.writestr('manifest.ndjson', ''.join(json.dumps(entry) + "\n" for entry in manifest))
+    yield sink.drain()
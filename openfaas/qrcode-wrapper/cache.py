@@ -0,0 +1,138 @@
+"""
+Content-addressed cache for rendered QR code images.
+
+Entries are keyed by a SHA256 of everything that affects the output (input
+text, error-correction level, box size, border, colors, format), so the key
+doubles as a strong ETag. There are two tiers:
+
+- an in-memory LRU bounded by entry count and total bytes
+- an optional on-disk tier (QR_CACHE_DIR) that survives restarts; disk hits
+  are promoted into memory
+"""
+
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+
+
+def cache_key(*parts):
+    """Stable hex digest of the rendering inputs"""
+    return hashlib.sha256(json.dumps(parts, separators=(',', ':')).encode()).hexdigest()
+
+
+class QRCache:
+    def __init__(self, max_entries=1024, max_bytes=32 * 1024 * 1024, disk_dir=None):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.disk_dir = disk_dir or None
+        self.entries = OrderedDict()
+        self.bytes = 0
+        self.lock = threading.Lock()
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.disk_errors = 0
+        if self.disk_dir:
+            os.makedirs(self.disk_dir, exist_ok=True)
+
+    def _disk_path(self, key):
+        return os.path.join(self.disk_dir, key[:2], key)
+
+    def get(self, key):
+        """Return cached bytes for ``key`` or None"""
+        with self.lock:
+            data = self.entries.get(key)
+            if data is not None:
+                self.entries.move_to_end(key)
+                self.memory_hits += 1
+                return data
+
+        if self.disk_dir:
+            try:
+                with open(self._disk_path(key), 'rb') as f:
+                    data = f.read()
+            except FileNotFoundError:
+                data = None
+            except OSError:
+                data = None
+                with self.lock:
+                    self.disk_errors += 1
+            if data is not None:
+                with self.lock:
+                    self.disk_hits += 1
+                self._remember(key, data)
+                return data
+
+        with self.lock:
+            self.misses += 1
+        return None
+
+    def peek(self, key):
+        """Like get(), but leaves LRU order, stats and the memory tier untouched"""
+        with self.lock:
+            data = self.entries.get(key)
+        if data is None and self.disk_dir:
+            try:
+                with open(self._disk_path(key), 'rb') as f:
+                    data = f.read()
+            except OSError:
+                pass
+        return data
+
+    def put(self, key, data, memory=True):
+        """Cache ``data``; ``memory=False`` writes only the disk tier"""
+        if memory:
+            self._remember(key, data)
+        if self.disk_dir:
+            self._write_disk(key, data)
+
+    def _remember(self, key, data):
+        if self.max_entries <= 0 or len(data) > self.max_bytes:
+            return
+        with self.lock:
+            previous = self.entries.pop(key, None)
+            if previous is not None:
+                self.bytes -= len(previous)
+            self.entries[key] = data
+            self.bytes += len(data)
+            while len(self.entries) > self.max_entries or self.bytes > self.max_bytes:
+                _, evicted = self.entries.popitem(last=False)
+                self.bytes -= len(evicted)
+                self.evictions += 1
+
+    def _write_disk(self, key, data):
+        # Write to a temp file and rename so readers never see partial images
+        path = self._disk_path(key)
+        tmp_path = None
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path))
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except OSError:
+            with self.lock:
+                self.disk_errors += 1
+            if tmp_path and os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+
+    def stats(self):
+        with self.lock:
+            lookups = self.memory_hits + self.disk_hits + self.misses
+            return {
+                "entries": len(self.entries),
+                "bytes": self.bytes,
+                "max_entries": self.max_entries,
+                "max_bytes": self.max_bytes,
+                "disk_dir": self.disk_dir,
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "disk_errors": self.disk_errors,
+                "hit_ratio": (self.memory_hits + self.disk_hits) / lookups if lookups else 0.0
+            }
@@ -1,92 +1,215 @@
 import qrcode
-from qrcode.constants import ERROR_CORRECT_M
+from qrcode.constants import ERROR_CORRECT_L, ERROR_CORRECT_M, ERROR_CORRECT_Q, ERROR_CORRECT_H
 import io
 import json
-import sys
-from datetime import datetime
-
-def log(level, message, **kwargs):
-    """Helper function to log messages with consistent format"""
-    timestamp = datetime.utcnow().isoformat()
-    log_data = {
-        "timestamp": timestamp,
-        "level": level,
-        "function": "qrcode-wrapper",
-        "message": message,
-        **kwargs
-    }
-    print(json.dumps(log_data), file=sys.stderr)
-    sys.stderr.flush()
+import os
+import re
+from collections import namedtuple
+from urllib.parse import parse_qsl
+from cache import QRCache, cache_key
+from common.logger import get_logger
+
+ERROR_CORRECTION_LEVELS = {
+    "L": ERROR_CORRECT_L,
+    "M": ERROR_CORRECT_M,
+    "Q": ERROR_CORRECT_Q,
+    "H": ERROR_CORRECT_H
+}
+
+# Everything that changes the rendered image; part of the cache key
+QROptions = namedtuple('QROptions', 'error_correction box_size border fill_color back_color')
+DEFAULT_OPTIONS = QROptions("M", 10, 4, "black", "white")
+
+CONTENT_TYPES = {
+    "png": "image/png",
+    "svg": "image/svg+xml"
+}
+
+MAX_BOX_SIZE = 40
+MAX_BORDER = 20
+COLOR_PATTERN = re.compile(r'^(#[0-9a-fA-F]{3}|#[0-9a-fA-F]{6}|[a-zA-Z]{1,20})$')
+
+CORS_HEADERS = {
+    "Access-Control-Allow-Origin": "*",
+    "Access-Control-Allow-Methods": "GET, POST, OPTIONS",
+    "Access-Control-Allow-Headers": "Content-Type, Authorization"
+}
 
-def handle(req):
+# Rendered images are content-addressed, so clients may keep them for long
+CACHE_MAX_AGE = int(os.getenv('QR_CACHE_MAX_AGE', '86400'))
+
+cache = QRCache(
+    max_entries=int(os.getenv('QR_CACHE_SIZE', '1024')),
+    max_bytes=int(os.getenv('QR_CACHE_MAX_BYTES', str(32 * 1024 * 1024))),
+    disk_dir=os.getenv('QR_CACHE_DIR', '')
+)
+
+log = get_logger("qrcode-wrapper")
+
+def parse_options(params):
     """
-    Generate a QR code from the input text/URL.
-    Returns a PNG image with CORS headers.
+    Read rendering parameters from a query-parameter mapping:
+    format (png|svg), ec (L|M|Q|H), size (pixels per module), border
+    (modules), fill and back (color name or #hex).
+    Returns (fmt, QROptions); raises ValueError on invalid input.
     """
+    fmt = params.get("format", "png").lower()
+    if fmt not in CONTENT_TYPES:
+        raise ValueError(f"Unsupported format: {fmt}")
     
-    log("INFO", "QR code generation request received")
+    error_correction = params.get("ec", DEFAULT_OPTIONS.error_correction).upper()
+    if error_correction not in ERROR_CORRECTION_LEVELS:
+        raise ValueError(f"Unsupported error correction level: {error_correction}")
     
     try:
-        # Read the input (URL to encode)
-        input_text = req.strip()
-        log("INFO", "Input text received", text=input_text, length=len(input_text))
-        
-        if not input_text:
-            log("WARN", "Empty input received")
-            return json.dumps({
-                "statusCode": 400,
-                "headers": {
-                    "Content-Type": "application/json",
-                    "Access-Control-Allow-Origin": "*",
-                    "Access-Control-Allow-Methods": "POST, OPTIONS",
-                    "Access-Control-Allow-Headers": "Content-Type, Authorization"
-                },
-                "body": json.dumps({"error": "No input provided"})
-            })
-        
-        # Generate QR code
-        log("INFO", "Generating QR code")
-        qr = qrcode.QRCode(
-            version=1,
-            error_correction=ERROR_CORRECT_M,
-            box_size=10,
-            border=4,
-        )
-        qr.add_data(input_text)
-        qr.make(fit=True)
-        
-        # Create an image from the QR Code instance
-        log("INFO", "Creating QR code image")
-        img = qr.make_image(fill_color="black", back_color="white")
-        
-        # Save to bytes buffer
-        buf = io.BytesIO()
-        img.save(buf, 'PNG')
-        png_bytes = buf.getvalue()
-        log("INFO", "QR code generated successfully", size_bytes=len(png_bytes))
-        
-        # Return the PNG image with proper headers
-        return json.dumps({
-            "statusCode": 200,
-            "headers": {
-                "Content-Type": "image/png",
-                "Access-Control-Allow-Origin": "*",
-                "Access-Control-Allow-Methods": "POST, OPTIONS",
-                "Access-Control-Allow-Headers": "Content-Type, Authorization"
-            },
-            "body": png_bytes.hex(),
-            "isBase64Encoded": False
-        })
-        
+        box_size = int(params.get("size", DEFAULT_OPTIONS.box_size))
+        border = int(params.get("border", DEFAULT_OPTIONS.border))
+    except ValueError:
+        raise ValueError("size and border must be integers")
+    if not 1 <= box_size <= MAX_BOX_SIZE:
+        raise ValueError(f"size must be between 1 and {MAX_BOX_SIZE}")
+    if not 0 <= border <= MAX_BORDER:
+        raise ValueError(f"border must be between 0 and {MAX_BORDER}")
+    
+    fill_color = params.get("fill", DEFAULT_OPTIONS.fill_color)
+    back_color = params.get("back", DEFAULT_OPTIONS.back_color)
+    for color in (fill_color, back_color):
+        if not COLOR_PATTERN.match(color):
+            raise ValueError(f"Invalid color: {color}")
+    
+    return fmt, QROptions(error_correction, box_size, border, fill_color, back_color)
+
+def build_matrix(input_text, options):
+    """Build the QR code; the returned object holds the module matrix"""
+    qr = qrcode.QRCode(
+        version=1,
+        error_correction=ERROR_CORRECTION_LEVELS[options.error_correction],
+        box_size=options.box_size,
+        border=options.border,
+    )
+    qr.add_data(input_text)
+    qr.make(fit=True)
+    return qr
+
+def render_png(input_text, options):
+    """Rasterize the QR code with PIL and encode it as PNG bytes"""
+    qr = build_matrix(input_text, options)
+    
+    # Create an image from the QR Code instance
+    img = qr.make_image(fill_color=options.fill_color, back_color=options.back_color)
+    
+    # Save to bytes buffer
+    buf = io.BytesIO()
+    img.save(buf, 'PNG')
+    return buf.getvalue()
+
+def render_svg(input_text, options):
+    """
+    Emit the QR code as a single SVG path, skipping PIL entirely.
+    Horizontal runs of dark modules are merged into one rectangle each.
+    """
+    matrix = build_matrix(input_text, options).get_matrix()  # includes the border
+    modules = len(matrix)
+    pixels = modules * options.box_size
+    
+    path = []
+    for y, row in enumerate(matrix):
+        x = 0
+        while x < modules:
+            if row[x]:
+                start = x
+                while x < modules and row[x]:
+                    x += 1
+                path.append(f"M{start} {y}h{x - start}v1h{start - x}z")
+            else:
+                x += 1
+    
+    return (
+        f'<svg xmlns="http://www.w3.org/2000/svg" width="{pixels}" height="{pixels}" '
+        f'viewBox="0 0 {modules} {modules}" shape-rendering="crispEdges">'
+        f'<rect width="100%" height="100%" fill="{options.back_color}"/>'
+        f'<path fill="{options.fill_color}" d="{"".join(path)}"/>'
+        '</svg>'
+    ).encode()
+
+RENDERERS = {
+    "png": render_png,
+    "svg": render_svg
+}
+
+def get_image(input_text, options=DEFAULT_OPTIONS, fmt="png"):
+    """Return (etag, image_bytes, cache_hit), rendering only on a cache miss"""
+    key = cache_key(input_text, *options, fmt)
+    data = cache.get(key)
+    if data is not None:
+        return key, data, True
+    data = RENDERERS[fmt](input_text, options)
+    cache.put(key, data)
+    return key, data, False
+
+def error_response(status_code, message):
+    headers = {"Content-Type": "application/json", **CORS_HEADERS}
+    return status_code, headers, json.dumps({"error": message}).encode()
+
+def respond(input_text, params=None):
+    """
+    Generate a QR code and return (status_code, headers, body_bytes).
+    The body is the raw image, ready to be written to the client as-is.
+    """
+    input_text = input_text.strip()
+    log("INFO", "Input text received", hot=True, text=input_text, length=len(input_text))
+    
+    if not input_text:
+        log("WARN", "Empty input received")
+        return error_response(400, "No input provided")
+    
+    try:
+        fmt, options = parse_options(params or {})
+    except ValueError as e:
+        log("WARN", "Invalid QR code parameters", error=str(e))
+        return error_response(400, str(e))
+    
+    try:
+        # Generate QR code (or reuse a cached rendering)
+        etag, data, cache_hit = get_image(input_text, options, fmt)
+        log("INFO", "QR code generated successfully", hot=True, format=fmt, size_bytes=len(data), cache_hit=cache_hit)
     except Exception as e:
         log("ERROR", "QR code generation failed", error=str(e), error_type=type(e).__name__)
-        return json.dumps({
-            "statusCode": 500,
-            "headers": {
-                "Content-Type": "application/json",
-                "Access-Control-Allow-Origin": "*",
-                "Access-Control-Allow-Methods": "POST, OPTIONS",
-                "Access-Control-Allow-Headers": "Content-Type, Authorization"
-            },
-            "body": json.dumps({"error": f"QR code generation failed: {str(e)}"})
-        })
+        return error_response(500, f"QR code generation failed: {str(e)}")
+    
+    headers = {
+        "Content-Type": CONTENT_TYPES[fmt],
+        "ETag": f'"{etag}"',
+        "Cache-Control": f"public, max-age={CACHE_MAX_AGE}, immutable",
+        "Access-Control-Expose-Headers": "ETag",
+        **CORS_HEADERS
+    }
+    return 200, headers, data
+
+def handle(req, query=None):
+    """
+    Generate a QR code from the input text/URL.
+    Returns a PNG (hex-encoded in the JSON envelope) or SVG image with CORS
+    headers. This is the classic watchdog entry point; server.py calls
+    respond() directly and writes the raw bytes.
+    
+    ``query`` is the raw query string; when omitted it is read from the
+    watchdog's Http_Query environment variable.
+    """
+    
+    log("INFO", "QR code generation request received", hot=True)
+    
+    query_string = query if query is not None else os.getenv('Http_Query', '')
+    status_code, headers, data = respond(req, dict(parse_qsl(query_string)))
+    
+    if headers["Content-Type"] == "image/png":
+        body = data.hex()
+    else:
+        body = data.decode()
+    
+    return json.dumps({
+        "statusCode": status_code,
+        "headers": headers,
+        "body": body,
+        "isBase64Encoded": False
+    })
@@ -0,0 +1,106 @@
+from flask import Flask, Response, request, make_response, stream_with_context
+import json
+import batch
+from handler import respond, cache, log, parse_options, error_response
+
+app = Flask(__name__)
+
+@app.route("/", methods=["GET", "POST", "PUT", "DELETE", "OPTIONS"])
+def main():
+    # Handle OPTIONS for CORS preflight
+    if request.method == "OPTIONS":
+        response = make_response("", 200)
+        response.headers["Access-Control-Allow-Origin"] = "*"
+        response.headers["Access-Control-Allow-Methods"] = "GET, POST, OPTIONS"
+        response.headers["Access-Control-Allow-Headers"] = "Content-Type, Authorization"
+        return response
+    
+    # NDJSON batches go to the worker pool and are streamed back
+    if request.method == "POST" and request.mimetype == "application/x-ndjson":
+        return stream_batch()
+    
+    log("INFO", "QR code generation request received", hot=True)
+    
+    # Get request body (GET takes the text from ?text= so responses are cacheable)
+    if request.method == "POST":
+        req_data = request.get_data(as_text=True)
+    else:
+        req_data = request.args.get("text", "")
+    
+    # Render straight to bytes: no JSON envelope or hex round trip
+    status_code, headers, body = respond(req_data, request.args)
+    
+    # Client already has this exact image
+    etag = headers.get("ETag")
+    if status_code == 200 and etag and etag.strip('"') in request.if_none_match:
+        response = make_response("", 304)
+        for key in ("ETag", "Cache-Control", "Access-Control-Allow-Origin", "Access-Control-Expose-Headers"):
+            if key in headers:
+                response.headers[key] = headers[key]
+        return response
+    
+    response = make_response(body, status_code)
+    for key, value in headers.items():
+        response.headers[key] = value
+    
+    return response
+
+def batch_error(status_code, message):
+    status_code, headers, body = error_response(status_code, message)
+    response = make_response(body, status_code)
+    for key, value in headers.items():
+        response.headers[key] = value
+    return response
+
+def stream_batch():
+    # One text per input line; output=ndjson (default) returns one JSON line
+    # per input line with the image base64-encoded, output=zip an archive
+    output = request.args.get("output", "ndjson").lower()
+    if output not in ("ndjson", "zip"):
+        return batch_error(400, "output must be ndjson or zip")
+    try:
+        fmt, options = parse_options(request.args)
+    except ValueError as e:
+        return batch_error(400, str(e))
+
+    texts = (batch.parse_line(line.decode("utf-8")) for line in request.stream)
+    results = batch.render_batch((text for text in texts if text is not None), options, fmt, cache)
+    try:
+        # Wait for a batch slot before committing to a 200
+        first = next(results, None)
+    except batch.BatchBusy as e:
+        log("WARN", "QR batch rejected", error=str(e))
+        response = batch_error(503, str(e))
+        response.headers["Retry-After"] = str(max(1, int(batch.QUEUE_TIMEOUT)))
+        return response
+
+    def chained():
+        # Closing render_batch releases its batch slot even when the client
+        # disconnects before the last image
+        try:
+            if first is not None:
+                yield first
+            yield from results
+        finally:
+            results.close()
+
+    log("INFO", "QR batch started", format=fmt, output=output, workers=batch.WORKERS)
+    if output == "zip":
+        response = Response(stream_with_context(batch.zip_stream(chained(), fmt)), mimetype="application/zip")
+        response.headers["Content-Disposition"] = f'attachment; filename="qrcodes-{fmt}.zip"'
+    else:
+        response = Response(stream_with_context(batch.ndjson_lines(chained(), fmt)), mimetype="application/x-ndjson")
+    response.headers["Access-Control-Allow-Origin"] = "*"
+    response.headers["Access-Control-Allow-Methods"] = "GET, POST, OPTIONS"
+    response.headers["Access-Control-Allow-Headers"] = "Content-Type, Authorization"
+    return response
+
+@app.route("/_admin/cache", methods=["GET"])
+def cache_stats():
+    response = make_response(json.dumps(cache.stats()), 200)
+    response.headers["Content-Type"] = "application/json"
+    return response
+
+if __name__ == "__main__":
+    # Threaded so single-image requests are served while a batch streams
+    app.run(host="0.0.0.0", port=5000, threaded=True)
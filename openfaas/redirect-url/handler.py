@@ -1,29 +1,36 @@
 import json
-import boto3
 import os
-import sys
-from datetime import datetime
-from botocore.exceptions import ClientError
+import time
+from common import clicks, expiry, metrics, redirect_policy, rollups, singleflight, storage
+from common.logger import get_logger
 
-def log(level, message, **kwargs):
-    """Helper function to log messages with consistent format"""
-    timestamp = datetime.utcnow().isoformat()
-    log_data = {
-        "timestamp": timestamp,
-        "level": level,
-        "function": "redirect-url",
-        "message": message,
-        **kwargs
-    }
-    print(json.dumps(log_data), file=sys.stderr)
-    sys.stderr.flush()
+log = get_logger("redirect-url")
+
+STAGES = metrics.stage_timers(
+    "redirect_url_stage_seconds",
+    "Time spent in each stage of a redirect-url request",
+    ("client", "get_item", "update_item", "rollups", "serialize", "total")
+)
+RESPONSES = metrics.Counter("redirect_url_responses_total", "redirect-url responses by status code", label="status")
+CLICKS = metrics.Counter("redirect_url_clicks_total", "Clicks recorded by counting mode", label="mode")
+
+click_counter = clicks.ClickCounter(log=log)
+
+# Resident under server.py, concurrent requests for one hash share a single
+# get_item; each request still counts its own click
+COALESCING = metrics.Counter("redirect_url_singleflight_total", "get_item calls by single-flight role", label="outcome")
+flights = singleflight.SingleFlight(float(os.getenv('SINGLEFLIGHT_TIMEOUT', '5')), counter=COALESCING)
 
-def handle(req):
+def handle(req, query=None):
     """
     Handle incoming request to redirect from a short URL hash with CORS support.
+    Classic watchdog entry point: wraps respond() in the JSON envelope.
     
     Expected input: The hash string (e.g., "abc123")
     
+    ``query`` is the raw query string; when omitted it is read from the
+    watchdog's Http_Query environment variable.
+    
     Returns HTTP redirect response or error:
     {
         "statusCode": 301,
@@ -40,8 +47,30 @@ def handle(req):
         }
     }
     """
-    
-    log("INFO", "Redirect request received")
+    status_code, headers, body = respond(req, query=query, method=os.getenv('Http_Method', ''))
+    stage_start = time.perf_counter()
+    envelope = json.dumps({
+        "statusCode": status_code,
+        "headers": headers,
+        "body": json.dumps(body) if body is not None else ""
+    })
+    STAGES["serialize"].observe(time.perf_counter() - stage_start)
+    return envelope
+
+def respond(req, query=None, method=""):
+    """
+    Resolve a hash and return (status_code, headers, body) where body is a
+    dict to be sent as JSON, or None for an empty body. server.py maps this
+    straight onto a Flask response without any JSON envelope.
+    """
+    start = time.perf_counter()
+    status_code, headers, body = resolve(req, query, method)
+    STAGES["total"].observe(time.perf_counter() - start)
+    RESPONSES.inc(status_code)
+    return status_code, headers, body
+
+def resolve(req, query, method):
+    log("INFO", "Redirect request received", hot=True)
     
     # CORS headers for all responses
     cors_headers = {
@@ -51,117 +80,112 @@ def handle(req):
     }
     
     # Handle OPTIONS preflight request
-    method = os.getenv('Http_Method', '').upper()
-    log("INFO", "HTTP method detected", method=method)
+    method = (method or '').upper()
+    log("INFO", "HTTP method detected", hot=True, method=method)
     
     if method == 'OPTIONS':
-        log("INFO", "Handling OPTIONS preflight request")
-        return json.dumps({
-            "statusCode": 200,
-            "headers": cors_headers,
-            "body": ""
-        })
+        log("INFO", "Handling OPTIONS preflight request", hot=True)
+        return 200, cors_headers, None
     
     try:
         # Extract hash from request (assuming it comes as plain text)
         url_hash = req.strip()
-        log("INFO", "Received hash", hash=url_hash, hash_length=len(url_hash))
+        log("INFO", "Received hash", hot=True, hash=url_hash, hash_length=len(url_hash))
         
         if not url_hash:
             log("WARN", "Empty hash received")
-            return json.dumps({
-                "statusCode": 400,
-                "headers": cors_headers,
-                "body": json.dumps({"error": "Hash is required"})
-            })
-        
-        # Initialize DynamoDB client
-        dynamodb_endpoint = os.getenv('DYNAMODB_ENDPOINT', 'http://dynamodb:8000')
-        log("INFO", "Initializing DynamoDB client", endpoint=dynamodb_endpoint)
+            return 400, cors_headers, {"error": "Hash is required"}
         
-        dynamodb = boto3.resource(
-            'dynamodb',
-            endpoint_url=dynamodb_endpoint,
-            region_name=os.getenv('AWS_REGION', 'us-east-1'),
-            aws_access_key_id=os.getenv('AWS_ACCESS_KEY_ID', 'local'),
-            aws_secret_access_key=os.getenv('AWS_SECRET_ACCESS_KEY', 'local')
-        )
+        # Reuse the process-wide store (DynamoDB or SQLite)
+        stage_start = time.perf_counter()
+        store = storage.get_store()
+        STAGES["client"].observe(time.perf_counter() - stage_start)
+        log("INFO", "Querying store", hot=True, backend=store.name, hash=url_hash)
         
-        table_name = os.getenv('DYNAMODB_TABLE', 'url_mappings')
-        table = dynamodb.Table(table_name)
-        log("INFO", "Querying DynamoDB", table=table_name, hash=url_hash)
+        # Look up the hash
+        stage_start = time.perf_counter()
+        item = flights.do(url_hash, lambda: store.get(url_hash))
+        STAGES["get_item"].observe(time.perf_counter() - stage_start)
         
-        # Query DynamoDB for the hash
-        response = table.get_item(
-            Key={'hash': url_hash}
-        )
-        
-        if 'Item' not in response:
+        if item is None:
             log("WARN", "Hash not found in database", hash=url_hash)
-            return json.dumps({
-                "statusCode": 404,
-                "headers": cors_headers,
-                "body": json.dumps({"error": "URL not found"})
-            })
+            return 404, cors_headers, {"error": "URL not found"}
         
-        original_url = response['Item']['original_url']
-        # Convert Decimal to int for JSON serialization
-        current_count = int(response['Item'].get('click_count', 0))
-        log("INFO", "URL found", hash=url_hash, original_url=original_url, current_count=current_count)
+        if expiry.is_expired(item):
+            # Still stored until the sweeper's next pass; no click is counted
+            log("INFO", "Hash has expired", hash=url_hash, expires_at=expiry.expires_at(item))
+            return 410, cors_headers, {"error": "URL has expired"}
         
-        # Increment click count
-        log("INFO", "Incrementing click count", hash=url_hash)
-        update_response = table.update_item(
-            Key={'hash': url_hash},
-            UpdateExpression='SET click_count = click_count + :inc',
-            ExpressionAttributeValues={':inc': 1},
-            ReturnValues='UPDATED_NEW'
-        )
+        original_url = item['original_url']
         # Convert Decimal to int for JSON serialization
-        new_count = int(update_response.get('Attributes', {}).get('click_count', current_count + 1))
-        log("INFO", "Click count updated", hash=url_hash, new_count=new_count)
+        current_count = int(item.get('click_count', 0))
+        log("INFO", "URL found", hot=True, hash=url_hash, current_count=current_count)
         
         # Check if JSON format is requested via query parameter
-        query_string = os.getenv('Http_Query', '')
-        log("INFO", "Query string", query=query_string)
+        query_string = query if query is not None else os.getenv('Http_Query', '')
+        log("INFO", "Query string", hot=True, query=query_string)
+        wants_json = 'format=json' in query_string
+        
+        if clicks.MODE == 'batched' and not wants_json:
+            # Write-behind: count the click in memory, flushed off the request path
+            click_counter.increment(url_hash)
+            CLICKS.inc("batched")
+            new_count = current_count + 1
+            log("INFO", "Click count queued", hot=True, hash=url_hash, estimated_count=new_count)
+        else:
+            # Exact: fold in any clicks still pending for this hash
+            increment = 1 + click_counter.take(url_hash)
+            log("INFO", "Incrementing click count", hot=True, hash=url_hash, increment=increment)
+            stage_start = time.perf_counter()
+            try:
+                updated_count = store.add_clicks(url_hash, increment)
+            except Exception:
+                if increment > 1:
+                    click_counter.increment(url_hash, increment - 1, rollup=False)
+                raise
+            STAGES["update_item"].observe(time.perf_counter() - stage_start)
+            # The total is written; the time buckets follow with the next flush
+            click_counter.record_rollup(url_hash)
+            CLICKS.inc("exact")
+            new_count = updated_count if updated_count is not None else current_count + increment
+            log("INFO", "Click count updated", hot=True, hash=url_hash, new_count=new_count)
         
         # If format=json is in query string, return JSON instead of redirect
-        if 'format=json' in query_string:
-            log("INFO", "Returning JSON response", hash=url_hash, click_count=new_count)
+        if wants_json:
+            log("INFO", "Returning JSON response", hot=True, hash=url_hash, click_count=new_count)
             response_body = {
                 "hash": url_hash,
                 "original_url": original_url,
                 "click_count": new_count
             }
-            return json.dumps({
-                "statusCode": 200,
-                "headers": cors_headers,
-                "body": json.dumps(response_body)
-            })
+            if expiry.expires_at(item) is not None:
+                response_body["expires_at"] = expiry.expires_at(item)
+            if rollups.ENABLED:
+                stage_start = time.perf_counter()
+                try:
+                    response_body["clicks"] = rollups.summary(store, url_hash)
+                except Exception as e:
+                    # Stats are best-effort; the mapping itself was found
+                    log("WARN", "Click rollup query failed", hash=url_hash, error=str(e))
+                STAGES["rollups"].observe(time.perf_counter() - stage_start)
+            return 200, cors_headers, response_body
         
-        # Default: Return redirect response (merge CORS headers with Location)
+        # Default: Return redirect response (merge CORS headers with Location
+        # and the configured caching policy)
         redirect_headers = cors_headers.copy()
+        redirect_headers.update(redirect_policy.headers(expiry.expires_at(item)))
         redirect_headers["Location"] = original_url
         
-        log("INFO", "Returning redirect response", hash=url_hash, location=original_url, status=301)
+        log("INFO", "Returning redirect response", hot=True, hash=url_hash, status=redirect_policy.STATUS)
         
-        return json.dumps({
-            "statusCode": 301,
-            "headers": redirect_headers,
-            "body": ""
-        })
+        return redirect_policy.STATUS, redirect_headers, None
         
-    except ClientError as e:
-        log("ERROR", "DynamoDB error", error=str(e), error_code=e.response.get('Error', {}).get('Code'))
-        return json.dumps({
-            "statusCode": 500,
-            "headers": cors_headers,
-            "body": json.dumps({"error": f"Database error: {str(e)}"})
-        })
+    except singleflight.FlightTimeout as e:
+        log("ERROR", "Store lookup timed out", hash=url_hash, error=str(e))
+        return 504, cors_headers, {"error": "Lookup timed out"}
+    except storage.StoreError as e:
+        log("ERROR", "Store error", error=str(e), error_code=e.code)
+        return 500, cors_headers, {"error": f"Database error: {str(e)}"}
     except Exception as e:
         log("ERROR", "Unexpected error", error=str(e), error_type=type(e).__name__)
-        return json.dumps({
-            "statusCode": 500,
-            "headers": cors_headers,
-            "body": json.dumps({"error": str(e)})
-        })
+        return 500, cors_headers, {"error": str(e)}
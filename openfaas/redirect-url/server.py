@@ -1,6 +1,10 @@
 from flask import Flask, request, make_response
 import json
-from handler import handle
+import os
+import signal
+import sys
+from common import metrics
+from handler import respond
 
 app = Flask(__name__)
 
@@ -23,14 +27,8 @@ def main():
     else:
         req_data = ""
     
-    # Call handler
-    result = handle(req_data)
-    result_data = json.loads(result)
-    
-    # Extract status code, headers, and body
-    status_code = result_data.get("statusCode", 200)
-    headers = result_data.get("headers", {})
-    body = result_data.get("body", "")
+    # Call handler; the structured result needs no JSON envelope round trip
+    status_code, headers, body = respond(req_data, query=request.query_string.decode(), method=request.method)
     
     # Handle redirects (301, 302, etc)
     if status_code in [301, 302, 303, 307, 308]:
@@ -51,19 +49,18 @@ def main():
         # Otherwise, return actual HTTP redirect
         response = make_response("", status_code)
         response.headers["Location"] = location
+        for key in ("Cache-Control", "Expires"):
+            if key in headers:
+                response.headers[key] = headers[key]
         # Add CORS headers even for redirects
         response.headers["Access-Control-Allow-Origin"] = "*"
         response.headers["Access-Control-Expose-Headers"] = "Location"
         return response
     
     # Create regular response (errors, etc.)
-    if isinstance(body, str) and body:
-        try:
-            body_obj = json.loads(body)
-            response = make_response(json.dumps(body_obj), status_code)
-            response.headers["Content-Type"] = "application/json"
-        except:
-            response = make_response(body, status_code)
+    if body is not None:
+        response = make_response(json.dumps(body), status_code)
+        response.headers["Content-Type"] = "application/json"
     else:
         response = make_response("", status_code)
     
@@ -78,5 +75,38 @@ def main():
     
     return response
 
+@app.route("/metrics", methods=["GET"])
+def metrics_endpoint():
+    response = make_response(metrics.REGISTRY.render(), 200)
+    response.headers["Content-Type"] = metrics.CONTENT_TYPE
+    return response
+
+def run_gunicorn():
+    # Replace this process with gunicorn so of-watchdog supervises it directly
+    workers = os.getenv("GUNICORN_WORKERS", "2")
+    threads = os.getenv("GUNICORN_THREADS", "8")
+    os.chdir(os.path.dirname(os.path.abspath(__file__)))
+    # Workers share METRICS_MULTIPROC_DIR so /metrics reports all of them
+    if metrics.MULTIPROC_DIR:
+        metrics.clear_multiproc_dir()
+    os.execvp("gunicorn", [
+        "gunicorn",
+        "--bind", "0.0.0.0:5000",
+        "--workers", workers,
+        "--threads", threads,
+        "--worker-class", "gthread",
+        "--graceful-timeout", os.getenv("GUNICORN_GRACEFUL_TIMEOUT", "20"),
+        "--keep-alive", os.getenv("GUNICORN_KEEPALIVE", "75"),
+        "server:app"
+    ])
+
 if __name__ == "__main__":
-    app.run(host='0.0.0.0', port=5000)
+    # SERVER_MODE=gunicorn runs multiple worker processes/threads; the default
+    # "flask" mode keeps the single-process development server
+    if os.getenv("SERVER_MODE", "flask").lower() == "gunicorn":
+        run_gunicorn()
+    
+    # of-watchdog stops the function with SIGTERM; exit normally so atexit
+    # hooks (e.g. the write-behind click flush) get to run
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    app.run(host='0.0.0.0', port=5000, threaded=True)
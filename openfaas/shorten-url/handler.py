@@ -1,30 +1,245 @@
 import json
 import hashlib
-import boto3
 import os
-import sys
+import time
 from datetime import datetime
+from common import expiry, metrics, notify, storage
+from common.logger import get_logger
 
-def log(level, message, **kwargs):
-    """Helper function to log messages with consistent format"""
-    timestamp = datetime.utcnow().isoformat()
-    log_data = {
-        "timestamp": timestamp,
-        "level": level,
-        "function": "shorten-url",
-        "message": message,
-        **kwargs
+# How many deterministic re-salts to try when a hash is taken by another URL
+MAX_HASH_ATTEMPTS = int(os.getenv('SHORTEN_MAX_HASH_ATTEMPTS', '8'))
+
+# Bulk shortening: max URLs in one buffered JSON array, and how many URLs a
+# streamed NDJSON request groups into each batch of store calls
+BULK_MAX_ITEMS = int(os.getenv('SHORTEN_BULK_MAX_ITEMS', '10000'))
+BULK_CHUNK_SIZE = int(os.getenv('SHORTEN_BULK_CHUNK_SIZE', '500'))
+
+log = get_logger("shorten-url")
+notifier = notify.HashNotifier(log=log)
+
+STAGES = metrics.stage_timers(
+    "shorten_url_stage_seconds",
+    "Time spent in each stage of a shorten-url request",
+    ("parse", "client", "create", "batch_get", "batch_write", "serialize", "total")
+)
+RESPONSES = metrics.Counter("shorten_url_responses_total", "shorten-url responses by status code", label="status")
+OUTCOMES = metrics.Counter("shorten_url_mappings_total", "Shortened URLs by outcome", label="outcome")
+metrics.Gauge("shorten_url_filter_announcements_lost", "New hashes not delivered to redirect-handler's filter (dropped or failed)",
+              lambda: notifier.dropped + notifier.failed)
+
+def candidate_hash(original_url, attempt=0):
+    """
+    Hash for ``original_url``: the first 8 hex characters of SHA256.
+    Later attempts re-salt the input deterministically, so the same URL
+    always walks the same sequence of candidates.
+    """
+    data = original_url if attempt == 0 else f"{original_url}#{attempt}"
+    return hashlib.sha256(data.encode()).hexdigest()[:8]
+
+def new_item(url_hash, original_url, expires_at=None):
+    item = {
+        'hash': url_hash,
+        'original_url': original_url,
+        'created_at': datetime.utcnow().isoformat(),
+        'click_count': 0
     }
-    print(json.dumps(log_data), file=sys.stderr)
-    sys.stderr.flush()
+    if expires_at is not None:
+        item['expires_at'] = expires_at
+    return item
+
+def build_result(url_hash, original_url, item, already_exists):
+    """Response fields for one shortened URL"""
+    domain = os.getenv('SHORT_DOMAIN', 'http://localhost')
+    result = {
+        "hash": url_hash,
+        "short_url": f"{domain}/{url_hash}",
+        "original_url": original_url,
+        # Convert Decimal to int for JSON serialization
+        "click_count": int(item.get('click_count', 0)),
+        "already_exists": already_exists
+    }
+    expires_at = expiry.expires_at(item)
+    if expires_at is not None:
+        result["expires_at"] = expires_at
+    return result
+
+def keep_alive(store, item, expires_at):
+    """
+    An existing link asked for again lives at least as long as the new
+    request wants (forever when ``expires_at`` is None). Returns the item
+    with its resulting expiry.
+    """
+    if expiry.outlives(item, expires_at):
+        return item
+    store.extend_expiry(item['hash'], expires_at)
+    item = dict(item)
+    if expires_at is None:
+        item.pop('expires_at', None)
+    else:
+        item['expires_at'] = expires_at
+    return item
+
+def create_mapping(store, original_url, expires_at=None):
+    """
+    Insert a mapping for ``original_url`` with a single conditional write.
+    
+    Returns (hash, item, already_exists). If the candidate hash exists for
+    the same URL, the stored item is returned (its expiry extended to
+    ``expires_at`` if that is later). If it holds a different URL (a true
+    collision), the next re-salted candidate is tried. An expired link
+    frees its hash: it is deleted and the write retried.
+    """
+    for attempt in range(MAX_HASH_ATTEMPTS):
+        url_hash = candidate_hash(original_url, attempt)
+        item = new_item(url_hash, original_url, expires_at)
+        existing_item = store.put_if_absent(item)
+        if existing_item is not None and expiry.is_expired(existing_item):
+            log("INFO", "Replacing expired mapping", hash=url_hash)
+            store.delete_expired([url_hash], time.time())
+            existing_item = store.put_if_absent(item)
+        if existing_item is None:
+            return url_hash, item, False
+        if existing_item.get('original_url') == original_url:
+            return url_hash, keep_alive(store, existing_item, expires_at), True
+        log("WARN", "Hash collision, re-salting", hash=url_hash, attempt=attempt)
+    
+    raise RuntimeError(f"No free hash after {MAX_HASH_ATTEMPTS} attempts")
+
+def bulk_entry_url(entry):
+    """A bulk entry is either a URL string or an object with a "url" field"""
+    if isinstance(entry, dict):
+        entry = entry.get('url')
+    return entry if isinstance(entry, str) and entry else None
+
+def longest_expiry(first, second):
+    """The later of two expiries, where None (never) outlives everything"""
+    if first is None or second is None:
+        return None
+    return max(first, second)
+
+def shorten_many(entries):
+    """
+    Shorten a list of bulk entries with the store's batch get/put.
+    
+    The input is deduplicated and the first-choice hashes are fetched in
+    chunks of 100. Links that look new and collision-free are written with
+    a batch of conditional creates, so a mapping another writer created in
+    the meantime is never overwritten: if it is for the same URL it is
+    returned, otherwise the URL joins the fallback. Collisions, expired
+    links, and new URLs that claim the same hash within one batch, fall back
+    to the single-item conditional create. A URL listed more than once gets
+    the longest expiry asked for.
+    Results are returned in input order; invalid entries get an "error" field.
+    """
+    urls = []
+    errors = {}
+    wanted = {}
+    for index, entry in enumerate(entries):
+        url = bulk_entry_url(entry)
+        if url is not None:
+            try:
+                expires_at = expiry.requested_expiry(entry)
+            except ValueError as e:
+                errors[index] = str(e)
+                url = None
+            else:
+                wanted[url] = longest_expiry(wanted[url], expires_at) if url in wanted else expires_at
+        urls.append(url)
+    unique = list(dict.fromkeys(url for url in urls if url))
+    candidates = {url: candidate_hash(url) for url in unique}
+    
+    store = storage.get_store()
+    stage_start = time.perf_counter()
+    existing = store.batch_get(list(candidates.values()))
+    STAGES["batch_get"].observe(time.perf_counter() - stage_start)
+    
+    resolved = {}
+    to_write = {}
+    fallback = []
+    for url in unique:
+        url_hash = candidates[url]
+        item = existing.get(url_hash)
+        if item is not None and expiry.is_expired(item):
+            fallback.append(url)
+        elif item is not None:
+            if item.get('original_url') == url:
+                resolved[url] = (url_hash, keep_alive(store, item, wanted[url]), True)
+            else:
+                fallback.append(url)
+        elif url_hash in to_write:
+            fallback.append(url)
+        else:
+            to_write[url_hash] = new_item(url_hash, url, wanted[url])
+            resolved[url] = (url_hash, to_write[url_hash], False)
+    
+    stage_start = time.perf_counter()
+    raced = store.batch_put_if_absent(list(to_write.values()))
+    STAGES["batch_write"].observe(time.perf_counter() - stage_start)
+    for url_hash, item in raced.items():
+        # Created by another writer between the read and the write
+        url = to_write.pop(url_hash)['original_url']
+        if item.get('original_url') == url and not expiry.is_expired(item):
+            resolved[url] = (url_hash, keep_alive(store, item, wanted[url]), True)
+        else:
+            fallback.append(url)
+    notifier.announce(to_write)
+    
+    if fallback:
+        for url in fallback:
+            resolved[url] = create_mapping(store, url, wanted[url])
+            if not resolved[url][2]:
+                notifier.announce([resolved[url][0]])
+    
+    existing_count = len(unique) - len(to_write) - len(fallback)
+    OUTCOMES.inc("existing", existing_count)
+    OUTCOMES.inc("created", len(to_write))
+    OUTCOMES.inc("collision_fallback", len(fallback))
+    log("INFO", "Bulk shorten batch processed", count=len(urls), unique=len(unique),
+        existing=existing_count, created=len(to_write), collisions=len(fallback))
+    
+    results = []
+    for index, url in enumerate(urls):
+        if index in errors:
+            results.append({"error": errors[index]})
+        elif url is None:
+            results.append({"error": "URL is required"})
+        else:
+            url_hash, item, already_exists = resolved[url]
+            results.append(build_result(url_hash, url, item, already_exists))
+    return results
+
+def shorten_chunk(chunk):
+    """shorten_many for one streamed chunk; a failure gives every entry an error result"""
+    try:
+        return shorten_many(chunk)
+    except Exception as e:
+        log("ERROR", "Bulk shorten chunk failed", count=len(chunk), error=str(e), error_type=type(e).__name__)
+        return [{"error": str(e)}] * len(chunk)
+
+def shorten_stream(entries, chunk_size=None):
+    """
+    Shorten an iterable of bulk entries chunk by chunk, yielding results in order.
+    A chunk that fails gets an error result per entry and the stream goes on.
+    """
+    chunk_size = chunk_size or BULK_CHUNK_SIZE
+    chunk = []
+    for entry in entries:
+        chunk.append(entry)
+        if len(chunk) >= chunk_size:
+            yield from shorten_chunk(chunk)
+            chunk = []
+    if chunk:
+        yield from shorten_chunk(chunk)
 
 def handle(req):
     """
     Handle incoming request to shorten a URL with CORS support.
+    Classic watchdog entry point: wraps respond() in the JSON envelope.
     
     Expected input (JSON):
     {
-        "url": "https://example.com/very/long/url"
+        "url": "https://example.com/very/long/url",
+        "ttl": 86400                  (optional; or "expires_at", see common.expiry)
     }
     
     Returns:
@@ -33,9 +248,33 @@ def handle(req):
         "short_url": "http://yourdomain.com/abc123",
         "original_url": "https://example.com/very/long/url"
     }
-    """
     
-    log("INFO", "Shorten URL request received")
+    Bulk input is a JSON array of URLs (strings or {"url": ...} objects);
+    the response is an array of the objects above in input order.
+    """
+    status_code, headers, body = respond(req, method=os.getenv('Http_Method', ''))
+    stage_start = time.perf_counter()
+    envelope = json.dumps({
+        "statusCode": status_code,
+        "headers": headers,
+        "body": json.dumps(body) if body is not None else ""
+    })
+    STAGES["serialize"].observe(time.perf_counter() - stage_start)
+    return envelope
+
+def respond(req, method=""):
+    """
+    Shorten one URL (or a bulk array) and return (status_code, headers, body)
+    where body is a dict/list to be sent as JSON, or None for an empty body.
+    """
+    start = time.perf_counter()
+    status_code, headers, body = shorten(req, method)
+    STAGES["total"].observe(time.perf_counter() - start)
+    RESPONSES.inc(status_code)
+    return status_code, headers, body
+
+def shorten(req, method):
+    log("INFO", "Shorten URL request received", hot=True)
     
     # CORS headers for all responses
     cors_headers = {
@@ -45,112 +284,67 @@ def handle(req):
     }
     
     # Handle OPTIONS preflight request
-    method = os.getenv('Http_Method', '').upper()
-    log("INFO", "HTTP method detected", method=method)
+    method = (method or '').upper()
+    log("INFO", "HTTP method detected", hot=True, method=method)
     
     if method == 'OPTIONS':
-        log("INFO", "Handling OPTIONS preflight request")
-        return json.dumps({
-            "statusCode": 200,
-            "headers": cors_headers,
-            "body": ""
-        })
+        log("INFO", "Handling OPTIONS preflight request", hot=True)
+        return 200, cors_headers, None
     
     try:
         # Parse incoming request
-        log("INFO", "Parsing request body", body_length=len(req))
+        log("INFO", "Parsing request body", hot=True, body_length=len(req))
+        stage_start = time.perf_counter()
         data = json.loads(req)
+        STAGES["parse"].observe(time.perf_counter() - stage_start)
+        
+        # A JSON array is a bulk request
+        if isinstance(data, list):
+            if len(data) > BULK_MAX_ITEMS:
+                log("WARN", "Bulk request too large", count=len(data), limit=BULK_MAX_ITEMS)
+                return 413, cors_headers, {"error": f"At most {BULK_MAX_ITEMS} URLs per request; use NDJSON streaming for larger batches"}
+            log("INFO", "Bulk shorten request", count=len(data))
+            return 200, cors_headers, shorten_many(data)
+        
         original_url = data.get('url')
         
-        log("INFO", "Extracted URL from request", url=original_url)
+        log("INFO", "Extracted URL from request", hot=True, url=original_url)
         
         if not original_url:
             log("WARN", "Empty URL received")
-            return json.dumps({
-                "statusCode": 400,
-                "headers": cors_headers,
-                "body": json.dumps({"error": "URL is required"})
-            })
-        
-        # Generate hash from URL (first 8 characters of SHA256)
-        url_hash = hashlib.sha256(original_url.encode()).hexdigest()[:8]
-        log("INFO", "Generated hash", hash=url_hash, url=original_url)
+            return 400, cors_headers, {"error": "URL is required"}
         
-        # Initialize DynamoDB client
-        dynamodb_endpoint = os.getenv('DYNAMODB_ENDPOINT', 'http://dynamodb:8000')
-        log("INFO", "Initializing DynamoDB client", endpoint=dynamodb_endpoint)
-        
-        dynamodb = boto3.resource(
-            'dynamodb',
-            endpoint_url=dynamodb_endpoint,
-            region_name=os.getenv('AWS_REGION', 'us-east-1'),
-            aws_access_key_id=os.getenv('AWS_ACCESS_KEY_ID', 'local'),
-            aws_secret_access_key=os.getenv('AWS_SECRET_ACCESS_KEY', 'local')
-        )
-        
-        table_name = os.getenv('DYNAMODB_TABLE', 'url_mappings')
-        table = dynamodb.Table(table_name)
-        log("INFO", "Checking if URL mapping exists", table=table_name, hash=url_hash)
-        
-        # Check if hash already exists
-        existing_item = None
         try:
-            response = table.get_item(Key={'hash': url_hash})
-            if 'Item' in response:
-                existing_item = response['Item']
-                log("INFO", "Found existing URL mapping", hash=url_hash, click_count=existing_item.get('click_count', 0))
-        except Exception as e:
-            log("WARN", "Error checking for existing item", error=str(e))
+            expires_at = expiry.requested_expiry(data)
+        except ValueError as e:
+            log("WARN", "Invalid link expiry", error=str(e))
+            return 400, cors_headers, {"error": str(e)}
         
-        # If URL already exists, return existing mapping with counter
-        if existing_item:
-            # Convert Decimal to int for JSON serialization
-            click_count = int(existing_item.get('click_count', 0))
-            log("INFO", "Returning existing URL mapping", hash=url_hash, click_count=click_count)
-        else:
-            # Store new mapping in DynamoDB
-            log("INFO", "Storing new URL mapping", table=table_name, hash=url_hash)
-            table.put_item(
-                Item={
-                    'hash': url_hash,
-                    'original_url': original_url,
-                    'created_at': datetime.utcnow().isoformat(),
-                    'click_count': 0
-                }
-            )
-            click_count = 0
-            log("INFO", "URL mapping stored successfully", hash=url_hash)
-        
-        # Build short URL
-        domain = os.getenv('SHORT_DOMAIN', 'http://localhost')
-        short_url = f"{domain}/{url_hash}"
-        log("INFO", "Generated short URL", short_url=short_url, hash=url_hash, click_count=click_count)
+        # Reuse the process-wide store (DynamoDB or SQLite)
+        stage_start = time.perf_counter()
+        store = storage.get_store()
+        STAGES["client"].observe(time.perf_counter() - stage_start)
         
-        response_body = {
-            "hash": url_hash,
-            "short_url": short_url,
-            "original_url": original_url,
-            "click_count": click_count,
-            "already_exists": existing_item is not None
-        }
+        # Insert the mapping, or find the existing one, in a single conditional write
+        log("INFO", "Creating URL mapping", hot=True, backend=store.name)
+        stage_start = time.perf_counter()
+        url_hash, item, already_exists = create_mapping(store, original_url, expires_at)
+        STAGES["create"].observe(time.perf_counter() - stage_start)
+        OUTCOMES.inc("existing" if already_exists else "created")
+        if not already_exists:
+            notifier.announce([url_hash])
+        response_body = build_result(url_hash, original_url, item, already_exists)
+        if already_exists:
+            log("INFO", "Returning existing URL mapping", hot=True, hash=url_hash, click_count=response_body["click_count"])
+        else:
+            log("INFO", "URL mapping stored successfully", hot=True, hash=url_hash)
+        log("INFO", "Generated short URL", hot=True, short_url=response_body["short_url"], hash=url_hash)
         
-        return json.dumps({
-            "statusCode": 200,
-            "headers": cors_headers,
-            "body": json.dumps(response_body)
-        })
+        return 200, cors_headers, response_body
         
     except json.JSONDecodeError as e:
         log("ERROR", "JSON decode error", error=str(e), body=req[:100])
-        return json.dumps({
-            "statusCode": 400,
-            "headers": cors_headers,
-            "body": json.dumps({"error": "Invalid JSON input"})
-        })
+        return 400, cors_headers, {"error": "Invalid JSON input"}
     except Exception as e:
         log("ERROR", "Unexpected error", error=str(e), error_type=type(e).__name__)
-        return json.dumps({
-            "statusCode": 500,
-            "headers": cors_headers,
-            "body": json.dumps({"error": str(e)})
-        })
+        return 500, cors_headers, {"error": str(e)}
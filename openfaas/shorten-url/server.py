@@ -0,0 +1,87 @@
+from flask import Flask, Response, request, jsonify, make_response, stream_with_context
+import json
+from common import metrics
+from handler import log, respond, shorten_stream
+
+app = Flask(__name__)
+
+@app.route("/", methods=["GET", "POST", "PUT", "DELETE", "OPTIONS"])
+def main():
+    # Handle OPTIONS for CORS preflight
+    if request.method == "OPTIONS":
+        response = make_response("", 200)
+        response.headers["Access-Control-Allow-Origin"] = "*"
+        response.headers["Access-Control-Allow-Methods"] = "GET, POST, OPTIONS"
+        response.headers["Access-Control-Allow-Headers"] = "Content-Type, Authorization"
+        return response
+    
+    # NDJSON bulk requests are streamed in and out
+    if request.method == "POST" and request.mimetype == "application/x-ndjson":
+        return stream_ndjson()
+    
+    # Get request body
+    if request.method == "POST":
+        req_data = request.get_data(as_text=True)
+    else:
+        req_data = ""
+    
+    # Call handler; the structured result needs no JSON envelope round trip
+    status_code, headers, body = respond(req_data, method=request.method)
+    
+    # Create response
+    if body is not None:
+        response = make_response(jsonify(body), status_code)
+    else:
+        response = make_response("", status_code)
+    
+    # Add headers
+    for key, value in headers.items():
+        response.headers[key] = value
+    
+    # Ensure CORS headers are present
+    response.headers["Access-Control-Allow-Origin"] = "*"
+    response.headers["Access-Control-Allow-Methods"] = "GET, POST, OPTIONS"
+    response.headers["Access-Control-Allow-Headers"] = "Content-Type, Authorization"
+    
+    return response
+
+def parse_ndjson_line(line):
+    # Each line is a JSON string or {"url": ...} object, or a bare URL.
+    # Blank lines are skipped; malformed lines still get an error result so
+    # output lines stay aligned with input lines.
+    line = line.strip()
+    if line[:1] in ('"', '{'):
+        try:
+            return json.loads(line)
+        except ValueError:
+            return {}
+    return line or None
+
+def stream_ndjson():
+    entries = (parse_ndjson_line(line.decode("utf-8")) for line in request.stream)
+
+    def generate():
+        # Headers are already sent, so a failure can only be reported in the
+        # body; shorten_stream handles store errors chunk by chunk, this
+        # catches the rest (e.g. an unreadable request stream)
+        try:
+            for result in shorten_stream(entry for entry in entries if entry is not None):
+                yield json.dumps(result) + "\n"
+        except Exception as e:
+            log("ERROR", "Bulk shorten stream failed", error=str(e), error_type=type(e).__name__)
+            yield json.dumps({"error": str(e)}) + "\n"
+
+    response = Response(stream_with_context(generate()), mimetype="application/x-ndjson")
+    response.headers["Access-Control-Allow-Origin"] = "*"
+    response.headers["Access-Control-Allow-Methods"] = "GET, POST, OPTIONS"
+    response.headers["Access-Control-Allow-Headers"] = "Content-Type, Authorization"
+    return response
+
+@app.route("/metrics", methods=["GET"])
+def metrics_endpoint():
+    response = make_response(metrics.REGISTRY.render(), 200)
+    response.headers["Content-Type"] = metrics.CONTENT_TYPE
+    return response
+
+if __name__ == "__main__":
+    app.run(host="0.0.0.0", port=5000)
@@ -0,0 +1,18 @@
+#!/bin/bash
+# Copy the shared common/ package into each function directory.
+#
+# faas-cli builds every function with its own directory (stack.yml
+# "handler:") as the Docker build context, and the Dockerfiles COPY common/
+# from there. Run this before faas-cli build/up or a manual docker build;
+# the copies are ignored by git.
+set -e
+
+OPENFAAS_DIR="$(cd "$(dirname "${BASH_SOURCE[0]}")" && pwd)"
+
+for function_dir in "$OPENFAAS_DIR"/shorten-url "$OPENFAAS_DIR"/redirect-url "$OPENFAAS_DIR"/qrcode-wrapper; do
+  rm -rf "$function_dir/common"
+  cp -r "$OPENFAAS_DIR/common" "$function_dir/common"
+  find "$function_dir/common" -name '__pycache__' -type d -prune -exec rm -rf {} +
+done
+
+echo "Synced common/ into shorten-url, redirect-url and qrcode-wrapper"
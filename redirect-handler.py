@@ -5,14 +5,627 @@ Runs as a standalone web server that processes short URL redirects
 """
 
 from http.server import HTTPServer, BaseHTTPRequestHandler
+from concurrent.futures import ThreadPoolExecutor
+from collections import OrderedDict
 import requests
+from requests.adapters import HTTPAdapter
 import json
+import os
+import signal
 import sys
-from urllib.parse import urlparse
+import threading
+import time
+from datetime import datetime, timedelta
+from email.utils import parsedate_to_datetime
+from urllib.parse import parse_qs, urlparse
 
-OPENFAAS_GATEWAY = "http://localhost:8080"
+OPENFAAS_GATEWAY = os.getenv('OPENFAAS_GATEWAY', "http://localhost:8080")
 REDIRECT_FUNCTION = f"{OPENFAAS_GATEWAY}/function/redirect-url"
 
+# Serving mode: "threaded" dispatches requests to a bounded worker pool,
+# "single" keeps the original one-request-at-a-time HTTPServer
+SERVER_MODE = os.getenv('REDIRECT_SERVER_MODE', 'threaded').lower()
+WORKERS = int(os.getenv('REDIRECT_WORKERS', '16'))
+# Connections accepted but not yet finished (running or queued for a worker);
+# beyond this new connections get an immediate 503
+MAX_PENDING = int(os.getenv('REDIRECT_MAX_PENDING', str(WORKERS * 4)))
+
+# Keep-alive connection pool to the OpenFaaS gateway
+POOL_SIZE = int(os.getenv('REDIRECT_POOL_SIZE', str(WORKERS)))
+CONNECT_TIMEOUT = float(os.getenv('REDIRECT_CONNECT_TIMEOUT', '2'))
+READ_TIMEOUT = float(os.getenv('REDIRECT_READ_TIMEOUT', '10'))
+
+
+def build_session():
+    """Create a requests session that reuses connections to the gateway"""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=POOL_SIZE, pool_block=True)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+
+session = build_session()
+
+# In-process hash -> Location cache. Mappings never change once written,
+# so found entries can live long (but never past the link's own expiry);
+# 404s and 410s get a short TTL so new links appear.
+CACHE_SIZE = int(os.getenv('REDIRECT_CACHE_SIZE', '10000'))
+CACHE_TTL = float(os.getenv('REDIRECT_CACHE_TTL', '3600'))
+CACHE_NEGATIVE_TTL = float(os.getenv('REDIRECT_CACHE_NEGATIVE_TTL', '30'))
+
+
+# Cached answer for an expired link
+GONE = object()
+
+
+class RedirectCache:
+    """Thread-safe LRU cache with separate TTLs for found and not-found hashes"""
+
+    def __init__(self, max_size, ttl, negative_ttl):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.negative_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key):
+        """
+        Look up a hash. Returns (found, location, link_expires_at) where
+        location is None for a cached 404 and GONE for an expired link.
+        """
+        now = time.monotonic()
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return False, None, None
+            location, expires_at, link_expires_at = entry
+            if expires_at <= now:
+                del self.entries[key]
+                self.expirations += 1
+                self.misses += 1
+                return False, None, None
+            self.entries.move_to_end(key)
+            if link_expires_at is not None and link_expires_at <= time.time():
+                # The link itself has expired since it was cached
+                location, link_expires_at = GONE, None
+                self.entries[key] = (GONE, min(expires_at, now + self.negative_ttl), None)
+            if location is None or location is GONE:
+                self.negative_hits += 1
+            else:
+                self.hits += 1
+            return True, location, link_expires_at
+
+    def peek(self, key):
+        """
+        {"location": ..., "expires_at": ...} for a cached live link, without
+        touching LRU order or stats; None otherwise
+        """
+        entry = self.entries.get(key)
+        if entry is None or entry[0] is None or entry[0] is GONE:
+            return None
+        fields = {"location": entry[0]}
+        if entry[2] is not None:
+            fields["expires_at"] = entry[2]
+        return fields
+
+    def put(self, key, location, link_expires_at=None):
+        """
+        Cache a Location (until at most ``link_expires_at``, epoch seconds),
+        None to remember that the hash does not exist, or GONE
+        """
+        ttl = self.ttl if location is not None and location is not GONE else self.negative_ttl
+        if self.max_size <= 0 or ttl <= 0:
+            return
+        expires_at = time.monotonic() + ttl
+        with self.lock:
+            self.entries[key] = (location, expires_at, link_expires_at)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+
+    def stats(self):
+        with self.lock:
+            return {
+                "size": len(self.entries),
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "negative_hits": self.negative_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations
+            }
+
+
+cache = RedirectCache(CACHE_SIZE, CACHE_TTL, CACHE_NEGATIVE_TTL)
+
+# Lookup mode: "gateway" calls the redirect-url function, "direct" reads the
+# url_mappings store (STORAGE_BACKEND) itself and falls back to the gateway
+# on any store error
+LOOKUP_MODE = os.getenv('REDIRECT_LOOKUP_MODE', 'gateway').lower()
+
+# The shared function code (openfaas/common) is copied next to this script
+# on deploy; in a checkout it is found under openfaas/
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'openfaas'))
+
+from common import expiry, metrics, redirect_policy, singleflight
+
+STAGES = metrics.stage_timers(
+    "redirect_handler_stage_seconds",
+    "Time spent in each stage of a redirect-handler request",
+    ("cache", "direct_lookup", "gateway", "total")
+)
+RESPONSES = metrics.Counter("redirect_handler_responses_total", "redirect-handler responses by status code", label="status")
+LOOKUPS = metrics.Counter("redirect_handler_lookups_total", "Hash lookups by source and outcome", label="result")
+metrics.Gauge("redirect_handler_cache_entries", "Entries in the in-process redirect cache", lambda: len(cache.entries))
+
+
+def log_event(level, message, **kwargs):
+    details = ' '.join(f"{key}={value}" for key, value in kwargs.items())
+    print(f"{level} {message} {details}".rstrip(), file=sys.stderr)
+
+
+class DirectStore:
+    """Resolves hashes straight from the store; clicks are written behind"""
+
+    def __init__(self):
+        from common import clicks, storage
+        self.store = storage.get_store()
+        self.clicks = clicks.ClickCounter(log=log_event)
+
+    def lookup(self, hash_value):
+        """Return the item, or None if the hash does not exist"""
+        return self.store.get(hash_value)
+
+    def prewarm(self, hashes):
+        """
+        Resolve ``hashes`` with batch reads spread over POOL_SIZE threads,
+        which also opens that many pooled store connections, and cache the
+        results. Returns the number cached.
+        """
+        chunks = [hashes[start:start + 100] for start in range(0, len(hashes), 100)]
+        if not chunks:
+            return 0
+        warmed = 0
+        with ThreadPoolExecutor(max_workers=min(POOL_SIZE, len(chunks)), thread_name_prefix='prewarm') as executor:
+            for found in executor.map(self.store.batch_get, chunks):
+                for hash_value, item in found.items():
+                    if expiry.is_expired(item):
+                        continue
+                    cache.put(hash_value, item['original_url'], expiry.expires_at(item))
+                    warmed += 1
+        return warmed
+
+
+def load_direct_store():
+    if LOOKUP_MODE != 'direct':
+        return None
+    try:
+        return DirectStore()
+    except Exception as e:
+        print(f"Direct lookups unavailable, using the gateway: {e}", file=sys.stderr)
+        return None
+
+
+direct_store = load_direct_store()
+
+
+# Redirects answered without redirect-url (cache hits, edge cache hits) are
+# counted here and written behind. Gateway mode needs store access for this
+# too; without it found links are not cached, so redirect-url sees every click.
+def load_click_counter():
+    if direct_store is not None:
+        return direct_store.clicks
+    try:
+        from common import clicks, storage
+        # Store clients connect lazily; read a key that never exists to make
+        # sure clicks can actually be written before caching found links
+        storage.get_store().get('~click-counter-probe')
+        return clicks.ClickCounter(log=log_event)
+    except Exception as e:
+        print(f"Click counting unavailable, caching only missing links: {e}", file=sys.stderr)
+        return None
+
+
+click_counter = load_click_counter()
+if click_counter is None:
+    cache.ttl = 0
+
+
+def record_click(hash_value):
+    if click_counter is not None:
+        click_counter.increment(hash_value)
+
+# Existence filter: a Bloom filter of every hash in url_mappings, so scans of
+# the 8-hex keyspace are answered with a local 404 instead of a store lookup
+FILTER_ENABLED = os.getenv('REDIRECT_FILTER', 'off').lower() == 'on'
+FILTER_PATH = os.getenv('REDIRECT_FILTER_PATH', '/var/lib/redirect-handler/hashes.bloom')
+FILTER_CAPACITY = int(os.getenv('REDIRECT_FILTER_CAPACITY', '1000000'))
+FILTER_FP_RATE = float(os.getenv('REDIRECT_FILTER_FP_RATE', '0.01'))
+FILTER_MAX_BYTES = int(os.getenv('REDIRECT_FILTER_MAX_BYTES', str(16 * 1024 * 1024)))
+FILTER_SCAN_SEGMENTS = int(os.getenv('REDIRECT_FILTER_SCAN_SEGMENTS', '4'))
+FILTER_REFRESH_INTERVAL = float(os.getenv('REDIRECT_FILTER_REFRESH_INTERVAL', '300'))
+# Catch-up scans re-read items created this long before the watermark, to
+# cover writers whose created_at was stamped before a newer item committed
+FILTER_WATERMARK_SKEW = float(os.getenv('REDIRECT_FILTER_WATERMARK_SKEW', '300'))
+# Catch-up only sees items newer than the watermark, so items written with an
+# older created_at (imports, restores) need a full rebuild: one is run this
+# often (0: only on POST /_admin/filter/rebuild or when over capacity)
+FILTER_REBUILD_INTERVAL = float(os.getenv('REDIRECT_FILTER_REBUILD_INTERVAL', '86400'))
+
+
+class HashFilter:
+    """
+    Keeps the Bloom filter in step with url_mappings.
+
+    On start the filter saved at FILTER_PATH is mapped if present, otherwise
+    one is built from a parallel scan. Items created after the filter's
+    watermark are then picked up by a catch-up scan, repeated every
+    FILTER_REFRESH_INTERVAL seconds; shorten-url can also push new hashes to
+    POST /_admin/filter so they are visible immediately. Until the first
+    build or catch-up completes, every hash is passed through to the store.
+
+    Items whose created_at is older than the watermark are only found by a
+    full rebuild: every FILTER_REBUILD_INTERVAL seconds, or on request
+    (request_rebuild). The old filter keeps answering while the new one is
+    scanned, unless the request invalidates it, in which case every hash
+    goes to the store until the rebuild finishes.
+    """
+
+    def __init__(self):
+        from common import bloom, storage
+        self.bloom_module = bloom
+        self.store = storage.get_store()
+        self.bloom = None
+        self.ready = False
+        self.lock = threading.Lock()
+        self.last_refresh = None
+        self.refresh_errors = 0
+        self.last_rebuild = None
+        self.rebuilds = 0
+        self.rebuild_requested = False
+        # Hashes announced while a rebuild scan runs, replayed into the new filter
+        self.building = None
+        self.wakeup = threading.Event()
+
+    def start(self):
+        self.bloom = self.bloom_module.BloomFilter.load(FILTER_PATH)
+        if self.bloom is not None:
+            self.last_rebuild = time.monotonic()
+            print(f"Loaded hash filter from {FILTER_PATH} ({self.bloom.count} items)", file=sys.stderr)
+        threading.Thread(target=self._run, name='hash-filter', daemon=True).start()
+
+    def might_exist(self, hash_value):
+        """False only when the hash is definitely not in the table"""
+        bloom = self.bloom
+        return not self.ready or bloom is None or hash_value in bloom
+
+    def add(self, hashes):
+        with self.lock:
+            if self.bloom is not None:
+                self.bloom.update(hashes)
+            if self.building is not None:
+                self.building.extend(hashes)
+
+    def request_rebuild(self, invalidate=False):
+        """Schedule a full rebuild; ``invalidate`` stops using the current filter until it is done"""
+        self.rebuild_requested = True
+        if invalidate:
+            self.ready = False
+        self.wakeup.set()
+
+    def scan_into(self, bloom, created_since=None):
+        def on_page(items):
+            newest = max((item.get('created_at', '') for item in items), default='')
+            bloom.update((item['hash'] for item in items), watermark=newest)
+
+        return self.store.scan(
+            on_page,
+            segments=FILTER_SCAN_SEGMENTS,
+            created_since=created_since,
+            attributes=('created_at',)
+        )
+
+    def rebuild(self, capacity):
+        start = time.monotonic()
+        with self.lock:
+            self.building = []
+        try:
+            bloom = self.bloom_module.BloomFilter.create(capacity, FILTER_FP_RATE, FILTER_MAX_BYTES, path=FILTER_PATH)
+            scanned = self.scan_into(bloom)
+            with self.lock:
+                bloom.update(self.building)
+                self.bloom = bloom
+        finally:
+            with self.lock:
+                self.building = None
+        self.save(bloom)
+        self.last_rebuild = time.monotonic()
+        self.rebuilds += 1
+        print(f"Built hash filter: {scanned} items, {bloom.num_bits // 8} bytes, "
+              f"{time.monotonic() - start:.1f}s", file=sys.stderr)
+
+    def catch_up(self):
+        bloom = self.bloom
+        since = bloom.watermark
+        if since:
+            since = (datetime.fromisoformat(since) - timedelta(seconds=FILTER_WATERMARK_SKEW)).isoformat()
+        scanned = self.scan_into(bloom, created_since=since)
+        self.save(bloom)
+        return scanned
+
+    def save(self, bloom):
+        try:
+            bloom.save(FILTER_PATH)
+        except OSError as e:
+            print(f"Could not save hash filter to {FILTER_PATH}: {e}", file=sys.stderr)
+
+    def rebuild_due(self):
+        if self.rebuild_requested:
+            return True
+        return (FILTER_REBUILD_INTERVAL > 0 and self.last_rebuild is not None
+                and time.monotonic() - self.last_rebuild >= FILTER_REBUILD_INTERVAL)
+
+    def refresh(self):
+        bloom = self.bloom
+        if bloom is None:
+            self.rebuild_requested = False
+            self.rebuild(FILTER_CAPACITY)
+        elif bloom.count > bloom.capacity:
+            # Past capacity the false-positive rate climbs; rebuild larger
+            self.rebuild_requested = False
+            self.rebuild(bloom.capacity * 2)
+        elif self.rebuild_due():
+            self.rebuild_requested = False
+            self.rebuild(bloom.capacity)
+        else:
+            self.catch_up()
+        self.last_refresh = time.time()
+        # A rebuild requested (and invalidated) mid-scan keeps the filter off
+        if not self.rebuild_requested:
+            self.ready = True
+
+    def _run(self):
+        while True:
+            try:
+                self.refresh()
+            except Exception as e:
+                self.refresh_errors += 1
+                print(f"Hash filter refresh failed: {e}", file=sys.stderr)
+            else:
+                if self.rebuild_requested:
+                    continue
+            self.wakeup.wait(FILTER_REFRESH_INTERVAL if self.ready else min(FILTER_REFRESH_INTERVAL, 30))
+            self.wakeup.clear()
+
+    def stats(self):
+        data = self.bloom.stats() if self.bloom is not None else {}
+        data.update({
+            "ready": self.ready,
+            "last_refresh": self.last_refresh,
+            "refresh_errors": self.refresh_errors,
+            "rebuilds": self.rebuilds,
+            "rebuilding": self.building is not None,
+            "rebuild_requested": self.rebuild_requested,
+            "seconds_since_rebuild": time.monotonic() - self.last_rebuild if self.last_rebuild is not None else None
+        })
+        return data
+
+
+def load_hash_filter():
+    if not FILTER_ENABLED:
+        return None
+    try:
+        hash_filter = HashFilter()
+        hash_filter.start()
+        return hash_filter
+    except Exception as e:
+        print(f"Hash filter unavailable, all hashes go to the store: {e}", file=sys.stderr)
+        return None
+
+
+hash_filter = load_hash_filter()
+
+# Heavy hitters: a Space-Saving top-K of redirected hashes, snapshotted to
+# disk so the next process can pre-warm its cache and connection pools with
+# the links that were hot before a restart
+HOT_LINKS_ENABLED = os.getenv('REDIRECT_HOT_LINKS', 'on').lower() == 'on'
+HOT_LINKS_PATH = os.getenv('REDIRECT_HOT_LINKS_PATH', '/var/lib/redirect-handler/hot-links.json')
+PREWARM_LIMIT = int(os.getenv('REDIRECT_PREWARM_LIMIT', '1000'))
+
+
+def load_hot_links():
+    """The tracker, resumed from the last snapshot, and that snapshot's entries"""
+    if not HOT_LINKS_ENABLED:
+        return None, []
+    from common import hot_links as hot_links_module
+    hot_links = hot_links_module.HotLinks(path=HOT_LINKS_PATH, locate=cache.peek, log=log_event)
+    snapshot = hot_links.load()
+    hot_links.start()
+    return hot_links, snapshot
+
+
+hot_links, hot_snapshot = load_hot_links()
+
+
+# Edge clicks: redirects served from Caddy's response cache never reach this
+# process, so they are counted from Caddy's JSON access log instead
+EDGE_LOG_PATH = os.getenv('REDIRECT_EDGE_LOG', '')
+EDGE_LOG_STATE_PATH = os.getenv('REDIRECT_EDGE_LOG_STATE', '/var/lib/redirect-handler/edge-log.json')
+EDGE_CLICKS = metrics.Counter("redirect_handler_edge_clicks_total", "Clicks counted from the edge cache access log")
+
+
+def load_edge_tailer():
+    if not EDGE_LOG_PATH:
+        return None
+    if click_counter is None:
+        print("Edge click counting unavailable: no click counter", file=sys.stderr)
+        return None
+    try:
+        from common import edge_clicks
+    except Exception as e:
+        print(f"Edge click counting unavailable: {e}", file=sys.stderr)
+        return None
+
+    def on_hit(hash_value):
+        click_counter.increment(hash_value)
+        EDGE_CLICKS.inc()
+        # Keep cached links in the top-K so a restart still pre-warms them
+        if hot_links is not None:
+            hot_links.record(hash_value)
+
+    tailer = edge_clicks.AccessLogTailer(EDGE_LOG_PATH, on_hit, state_path=EDGE_LOG_STATE_PATH, log=log_event)
+    tailer.start()
+    return tailer
+
+
+edge_tailer = load_edge_tailer()
+
+
+# Expired links: a background sweeper deletes them from the store every
+# LINK_SWEEP_INTERVAL seconds (0: off; run common.storage.sweep instead)
+SWEEP_INTERVAL = float(os.getenv('LINK_SWEEP_INTERVAL', '0'))
+
+
+def load_sweeper():
+    if SWEEP_INTERVAL <= 0:
+        return None
+    try:
+        from common.storage import sweep
+        link_sweeper = sweep.Sweeper(log=log_event)
+        link_sweeper.start(SWEEP_INTERVAL)
+        return link_sweeper
+    except Exception as e:
+        print(f"Expired link sweeper unavailable: {e}", file=sys.stderr)
+        return None
+
+
+sweeper = load_sweeper()
+
+
+def warm_gateway_pool():
+    """Open POOL_SIZE keep-alive connections to the gateway (its health check counts no clicks)"""
+    def ping(_):
+        try:
+            session.get(f"{OPENFAAS_GATEWAY}/healthz", timeout=(CONNECT_TIMEOUT, READ_TIMEOUT)).close()
+            return True
+        except requests.RequestException:
+            return False
+
+    with ThreadPoolExecutor(max_workers=POOL_SIZE, thread_name_prefix='prewarm') as executor:
+        return sum(executor.map(ping, range(POOL_SIZE)))
+
+
+def prewarm():
+    """
+    Fill the cache with the hottest links from the last snapshot and open the
+    connection pool before serving, so a restart does not send every hot
+    link to the store at once.
+    """
+    if hot_links is None:
+        return
+    start = time.monotonic()
+    entries = hot_snapshot[:PREWARM_LIMIT]
+    cached = 0
+    if direct_store is not None:
+        try:
+            cached = direct_store.prewarm([entry['hash'] for entry in entries])
+        except Exception as e:
+            print(f"Store pre-warm failed: {e}", file=sys.stderr)
+    if not cached:
+        # Gateway mode, or the store is unreachable: trust the snapshot;
+        # a mapping never changes once written, but it may have expired since
+        for entry in entries:
+            if entry.get('location') and not expiry.is_expired(entry):
+                cache.put(entry['hash'], entry['location'], expiry.expires_at(entry))
+                cached += 1
+    connections = warm_gateway_pool() if direct_store is None else 0
+    print(f"Pre-warmed {cached}/{len(entries)} hot links, {connections} gateway connections, "
+          f"{time.monotonic() - start:.2f}s", file=sys.stderr)
+
+
+# Concurrent misses for one hash are coalesced into a single lookup; waiters
+# give up (504) once the in-flight lookup is older than this
+SINGLEFLIGHT_TIMEOUT = float(os.getenv('REDIRECT_SINGLEFLIGHT_TIMEOUT', str(CONNECT_TIMEOUT + READ_TIMEOUT)))
+COALESCING = metrics.Counter("redirect_handler_singleflight_total", "Backend lookups by single-flight role", label="outcome")
+flights = singleflight.SingleFlight(SINGLEFLIGHT_TIMEOUT, counter=COALESCING)
+
+
+def link_expiry(response):
+    """The link expiry redirect-url sent as an Expires header, or None"""
+    value = response.headers.get('Expires')
+    if not value:
+        return None
+    try:
+        return int(parsedate_to_datetime(value).timestamp())
+    except (TypeError, ValueError):
+        return None
+
+
+def lookup_hash(hash_value):
+    """
+    Resolve a cache miss from the store or the redirect-url function and
+    cache the answer. Returns (status, location or error message, source,
+    link expiry). Clicks are counted by redirect-url for gateway lookups,
+    so only direct lookups leave click recording to the caller.
+    """
+    # Direct-to-store fast path
+    if direct_store is not None:
+        stage_start = time.perf_counter()
+        try:
+            item = direct_store.lookup(hash_value)
+        except Exception as e:
+            LOOKUPS.inc("direct_error")
+            print(f"Direct lookup failed, falling back to gateway: {e}", file=sys.stderr)
+        else:
+            STAGES["direct_lookup"].observe(time.perf_counter() - stage_start)
+            LOOKUPS.inc("direct")
+            if item is None:
+                cache.put(hash_value, None)
+                return 404, "Short URL not found", 'direct', None
+            if expiry.is_expired(item):
+                cache.put(hash_value, GONE)
+                return 410, "Short URL has expired", 'direct', None
+            expires_at = expiry.expires_at(item)
+            cache.put(hash_value, item['original_url'], expires_at)
+            return redirect_policy.STATUS, item['original_url'], 'direct', expires_at
+
+    # Call the OpenFaaS redirect-url function
+    LOOKUPS.inc("gateway")
+    stage_start = time.perf_counter()
+    response = session.post(
+        REDIRECT_FUNCTION,
+        data=hash_value,
+        headers={'Content-Type': 'text/plain'},
+        allow_redirects=False,
+        timeout=(CONNECT_TIMEOUT, READ_TIMEOUT)
+    )
+    STAGES["gateway"].observe(time.perf_counter() - stage_start)
+
+    if response.status_code in redirect_policy.REDIRECT_STATUSES:
+        # Extract the Location header and redirect with our own policy
+        location = response.headers.get('Location')
+        if not location:
+            return 500, "No location header in redirect response", 'gateway', None
+        expires_at = link_expiry(response)
+        cache.put(hash_value, location, expires_at)
+        return redirect_policy.STATUS, location, 'gateway', expires_at
+    if response.status_code == 404:
+        cache.put(hash_value, None)
+        return 404, "Short URL not found", 'gateway', None
+    if response.status_code == 410:
+        cache.put(hash_value, GONE)
+        return 410, "Short URL has expired", 'gateway', None
+    return response.status_code, "Error from redirect function", 'gateway', None
+
+
 class RedirectHandler(BaseHTTPRequestHandler):
     def do_GET(self):
         # Extract the hash from the path
@@ -21,51 +634,239 @@ class RedirectHandler(BaseHTTPRequestHandler):
         # Remove query strings if any
         hash_value = path.split('?')[0]
         
+        # Local-only admin endpoints (Caddy only forwards 8-hex paths)
+        if hash_value == '_admin/cache':
+            self.send_json(200, {**cache.stats(), "singleflight": flights.stats()})
+            return
+        if hash_value == 'metrics':
+            self.send_metrics()
+            return
+        if hash_value == '_admin/filter':
+            self.send_json(200, hash_filter.stats() if hash_filter is not None else {"enabled": False})
+            return
+        if hash_value == '_admin/sweep':
+            self.send_json(200, sweeper.stats() if sweeper is not None else {"enabled": False})
+            return
+        if hash_value == '_admin/edge':
+            self.send_json(200, edge_tailer.stats() if edge_tailer is not None else {"enabled": False})
+            return
+        if hash_value == '_admin/hot':
+            limit = parse_qs(urlparse(self.path).query).get('limit', ['100'])[0]
+            if not limit.isdigit():
+                self.send_error(400, "limit must be a number")
+                return
+            self.send_json(200, hot_links.stats(int(limit)) if hot_links is not None else {"enabled": False})
+            return
+        
+        start = time.perf_counter()
+        self.status_code = None
+        try:
+            self.redirect(hash_value)
+        finally:
+            STAGES["total"].observe(time.perf_counter() - start)
+            RESPONSES.inc(self.status_code)
+    
+    def redirect(self, hash_value):
         # Validate hash format (8 character hex)
         if not hash_value or len(hash_value) != 8:
             self.send_error(400, "Invalid hash format")
             return
         
-        try:
-            # Call the OpenFaaS redirect-url function
-            response = requests.post(
-                REDIRECT_FUNCTION,
-                data=hash_value,
-                headers={'Content-Type': 'text/plain'},
-                allow_redirects=False
-            )
-            
-            if response.status_code == 301:
-                # Extract the Location header and redirect
-                location = response.headers.get('Location')
-                if location:
-                    self.send_response(301)
-                    self.send_header('Location', location)
-                    self.send_header('Cache-Control', 'no-cache')
-                    self.end_headers()
-                    print(f"Redirected {hash_value} -> {location}", file=sys.stderr)
-                else:
-                    self.send_error(500, "No location header in redirect response")
-            elif response.status_code == 404:
+        # Serve from the in-process cache when possible
+        stage_start = time.perf_counter()
+        found, location, expires_at = cache.get(hash_value)
+        STAGES["cache"].observe(time.perf_counter() - stage_start)
+        if found:
+            LOOKUPS.inc("cache_negative_hit" if location is None or location is GONE else "cache_hit")
+            if location is None:
                 self.send_error(404, "Short URL not found")
+            elif location is GONE:
+                self.send_error(410, "Short URL has expired")
             else:
-                self.send_error(response.status_code, f"Error from redirect function")
-                
+                record_click(hash_value)
+                self.send_redirect(hash_value, location, expires_at)
+            return
+        
+        # Definite misses never reach the store
+        if hash_filter is not None and not hash_filter.might_exist(hash_value):
+            LOOKUPS.inc("filter_miss")
+            self.send_error(404, "Short URL not found")
+            return
+        
+        # Concurrent misses for the same hash share one backend lookup
+        try:
+            (status, detail, source, expires_at), shared = flights.do_shared(hash_value, lambda: lookup_hash(hash_value))
+        except singleflight.FlightTimeout as e:
+            print(f"Error processing redirect: {e}", file=sys.stderr)
+            self.send_error(504, "Lookup timed out")
+            return
         except Exception as e:
             print(f"Error processing redirect: {e}", file=sys.stderr)
             self.send_error(500, str(e))
+            return
+        
+        if status in redirect_policy.REDIRECT_STATUSES:
+            # redirect-url counted the gateway leader's click; everyone else
+            # (direct lookups, waiters sharing the leader's answer) is counted here
+            if source == 'direct' or shared:
+                record_click(hash_value)
+            self.send_redirect(hash_value, detail, expires_at)
+        else:
+            self.send_error(status, detail)
+    
+    def do_POST(self):
+        # Local-only: shorten-url announces newly created hashes here, and
+        # imports/restores ask for a full filter rebuild
+        path = self.path.split('?')[0]
+        if path in ('/_admin/filter/rebuild', '/_admin/filter/invalidate'):
+            if hash_filter is None:
+                self.send_json(200, {"enabled": False})
+                return
+            invalidate = path.endswith('/invalidate')
+            hash_filter.request_rebuild(invalidate=invalidate)
+            self.send_json(202, {"rebuild": "scheduled", "invalidated": invalidate})
+            return
+        if path != '/_admin/filter':
+            self.send_error(404, "Not found")
+            return
+        length = int(self.headers.get('Content-Length') or 0)
+        hashes = [line.strip() for line in self.rfile.read(length).decode().splitlines() if line.strip()]
+        if hash_filter is not None:
+            hash_filter.add(hashes)
+        self.send_json(200, {"added": len(hashes) if hash_filter is not None else 0})
+    
+    def send_response(self, code, message=None):
+        self.status_code = code
+        super().send_response(code, message)
+    
+    def send_redirect(self, hash_value, location, expires_at=None):
+        if hot_links is not None:
+            hot_links.record(hash_value)
+        self.send_response(redirect_policy.STATUS)
+        self.send_header('Location', location)
+        for key, value in redirect_policy.headers(expires_at).items():
+            self.send_header(key, value)
+        self.end_headers()
+        print(f"Redirected {hash_value} -> {location}", file=sys.stderr)
+    
+    def end_headers(self):
+        # Errors must not be kept by the edge cache: a 404 would hide a
+        # link created a moment later
+        if self.status_code is not None and self.status_code >= 400:
+            self.send_header('Cache-Control', 'no-store')
+        super().end_headers()
+    
+    def send_json(self, status, data):
+        body = json.dumps(data).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+    
+    def send_metrics(self):
+        body = metrics.REGISTRY.render().encode()
+        self.send_response(200)
+        self.send_header('Content-Type', metrics.CONTENT_TYPE)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
     
     def log_message(self, format, *args):
         # Log to stderr
         sys.stderr.write(f"{self.address_string()} - {format % args}\n")
 
+SHED = metrics.Counter("redirect_handler_shed_connections_total", "Connections refused with 503 because the worker pool was saturated")
+metrics.Gauge("redirect_handler_pending_connections", "Connections running or queued for a worker", lambda: pending_connections())
+
+SHED_RESPONSE = (b"HTTP/1.1 503 Service Unavailable\r\n"
+                 b"Retry-After: 1\r\n"
+                 b"Cache-Control: no-store\r\n"
+                 b"Content-Length: 0\r\n"
+                 b"Connection: close\r\n\r\n")
+
+
+class PooledHTTPServer(HTTPServer):
+    """
+    HTTPServer that hands each connection to a fixed-size thread pool.
+    At most ``max_pending`` connections may be in flight; the rest are
+    answered 503 straight from the accept loop instead of piling up in the
+    executor's unbounded queue.
+    """
+
+    request_queue_size = 128
+
+    def __init__(self, server_address, handler_class, workers, max_pending=MAX_PENDING):
+        super().__init__(server_address, handler_class)
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='redirect')
+        self.max_pending = max(workers, max_pending)
+        self.slots = threading.BoundedSemaphore(self.max_pending)
+        self.pending = 0
+        self.pending_lock = threading.Lock()
+
+    def process_request(self, request, client_address):
+        if not self.slots.acquire(blocking=False):
+            SHED.inc()
+            try:
+                request.settimeout(1)
+                request.sendall(SHED_RESPONSE)
+            except OSError:
+                pass
+            self.shutdown_request(request)
+            return
+        with self.pending_lock:
+            self.pending += 1
+        try:
+            self.executor.submit(self.process_request_worker, request, client_address)
+        except RuntimeError:
+            # Executor already shut down
+            self.release_slot()
+            self.shutdown_request(request)
+
+    def process_request_worker(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+            self.release_slot()
+
+    def release_slot(self):
+        with self.pending_lock:
+            self.pending -= 1
+        self.slots.release()
+
+    def server_close(self):
+        super().server_close()
+        self.executor.shutdown(wait=True)
+
+httpd = None
+
+
+def pending_connections():
+    return getattr(httpd, 'pending', 0)
+
+
 def run_server(port=3001):
+    global httpd
+    prewarm()
     server_address = ('', port)
-    httpd = HTTPServer(server_address, RedirectHandler)
-    print(f"Redirect handler running on port {port}...", file=sys.stderr)
-    httpd.serve_forever()
+    if SERVER_MODE == 'single':
+        httpd = HTTPServer(server_address, RedirectHandler)
+    else:
+        httpd = PooledHTTPServer(server_address, RedirectHandler, WORKERS)
+    print(f"Redirect handler running on port {port} ({SERVER_MODE}, {WORKERS} workers, pool {POOL_SIZE}, "
+          f"{'direct' if direct_store is not None else 'gateway'} lookups)...", file=sys.stderr)
+    try:
+        httpd.serve_forever()
+    finally:
+        httpd.server_close()
 
 if __name__ == '__main__':
+    # systemd stops the service with SIGTERM; exit normally so pending
+    # write-behind clicks are flushed by their atexit hook
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
     port = 3001
     if len(sys.argv) > 1:
         port = int(sys.argv[1])
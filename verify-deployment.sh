@@ -54,7 +54,7 @@ echo ""
 echo "5. Testing redirect-url function..."
 if [ -n "$HASH" ]; then
     REDIRECT_RESULT=$(curl -s -i -X POST "$GATEWAY/function/redirect-url" -d "$HASH" 2>&1)
-    if echo "$REDIRECT_RESULT" | grep -q "301 Moved Permanently"; then
+    if echo "$REDIRECT_RESULT" | grep -qE "^HTTP/[0-9.]+ 30[1278]"; then
         echo -e "${GREEN}✓${NC} redirect-url function is working"
         LOCATION=$(echo "$REDIRECT_RESULT" | grep "Location:" | cut -d' ' -f2 | tr -d '\r')
         echo "   Redirects to: $LOCATION"
@@ -130,6 +130,7 @@ echo -e "${YELLOW}To deploy updates:${NC}"
 echo ""
 echo "1. Deploy OpenFaaS functions:"
 echo "   cd /Users/masondrake/gitwork/urlshortener"
+echo "   ./openfaas/sync-common.sh"
 echo "   faas-cli build -f stack.yml"
 echo "   faas-cli deploy -f stack.yml"
 echo ""